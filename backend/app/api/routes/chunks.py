@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import uuid
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.auth import CurrentUser, get_current_user
+from app.db import get_db
+from app.models import Material, MaterialChunk
+from app.schemas import ChunkBatchRequest, ChunkOut
+
+router = APIRouter()
+
+
+def _chunk_query():
+    return select(
+        MaterialChunk.id,
+        MaterialChunk.material_id,
+        Material.title.label("material_title"),
+        Material.course_id,
+        Material.category,
+        MaterialChunk.chunk_index,
+        MaterialChunk.text,
+        MaterialChunk.language,
+        MaterialChunk.symbol_name,
+        MaterialChunk.start_line,
+        MaterialChunk.end_line,
+        MaterialChunk.page_start,
+        MaterialChunk.page_end,
+    ).join(Material, Material.id == MaterialChunk.material_id)
+
+
+def _to_out(r) -> ChunkOut:
+    return ChunkOut(**r._mapping)
+
+
+@router.get("/{chunk_id}", response_model=ChunkOut)
+def get_chunk(
+    chunk_id: uuid.UUID,
+    db: Session = Depends(get_db),
+    user: Annotated[CurrentUser, Depends(get_current_user)] = None,
+):
+    """Full text of one chunk; search hits only carry an excerpt."""
+    _ = user
+    r = db.execute(_chunk_query().where(MaterialChunk.id == chunk_id)).one_or_none()
+    if r is None:
+        raise HTTPException(status_code=404, detail="Chunk not found")
+    return _to_out(r)
+
+
+@router.post("/batch", response_model=list[ChunkOut])
+def get_chunks(
+    req: ChunkBatchRequest,
+    db: Session = Depends(get_db),
+    user: Annotated[CurrentUser, Depends(get_current_user)] = None,
+):
+    """Full text of several chunks in request order; unknown ids are left out."""
+    _ = user
+    rows = {r.id: r for r in db.execute(_chunk_query().where(MaterialChunk.id.in_(set(req.ids))))}
+    return [_to_out(rows[cid]) for cid in dict.fromkeys(req.ids) if cid in rows]
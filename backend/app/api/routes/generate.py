@@ -61,7 +61,7 @@ def generate(req: GenerateRequest, db: Session = Depends(get_db)):
     if not gemini.is_configured():
         raise HTTPException(status_code=400, detail="GEMINI_API_KEY is not configured")
 
-    q_emb = gemini.embed([req.prompt])[0]
+    q_emb = gemini.embed_query(req.prompt)
     try:
         rows = run_search(
             db,
@@ -73,6 +73,7 @@ def generate(req: GenerateRequest, db: Session = Depends(get_db)):
             use_hybrid=True,
         )
     except Exception:
+        db.rollback()
         rows = run_search(
             db,
             query_embedding=q_emb,
@@ -1,5 +1,11 @@
 from fastapi import APIRouter
 
+from app.core.config import settings
+from app.services.embedding_cache import get_embedding_cache
+from app.services.gemini import query_embedding_cache
+from app.services.search_cache import search_result_cache
+from app.services.vector_index import get_vector_index
+
 router = APIRouter()
 
 
@@ -7,3 +13,12 @@ router = APIRouter()
 def health():
     return {"ok": True}
 
+
+@router.get("/health/caches")
+def cache_stats():
+    return {
+        "embedding_cache": get_embedding_cache().stats() if settings.embedding_cache_enabled else None,
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "search_result_cache": search_result_cache.stats(),
+        "vector_index": get_vector_index().stats() if settings.search_backend == "numpy" else None,
+    }
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import uuid
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.core.auth import CurrentUser, get_current_admin
+from app.db import get_db
+from app.models import IngestJob
+from app.schemas import IngestJobOut
+from app.services.ingest_jobs import cancel_job, retry_job
+
+router = APIRouter()
+
+
+def job_to_out(job: IngestJob) -> IngestJobOut:
+    return IngestJobOut(
+        id=job.id,
+        material_id=job.material_id,
+        status=job.status,
+        stage=job.stage,
+        pages_total=job.pages_total,
+        pages_extracted=job.pages_extracted,
+        chunks_total=job.chunks_total,
+        chunks_embedded=job.chunks_embedded,
+        rows_written=job.rows_written,
+        chunks_kept=job.chunks_kept,
+        chunks_added=job.chunks_added,
+        chunks_removed=job.chunks_removed,
+        duplicates_exact=job.duplicates_exact,
+        duplicates_near=job.duplicates_near,
+        duplicates_skipped=job.duplicates_skipped,
+        attempts=job.attempts,
+        error=job.error,
+        cancel_requested=job.cancel_requested,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
+def _get_job(db: Session, job_id: uuid.UUID) -> IngestJob:
+    job = db.get(IngestJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job
+
+
+@router.get("/jobs", response_model=list[IngestJobOut])
+def list_jobs(
+    db: Session = Depends(get_db),
+    user: Annotated[CurrentUser, Depends(get_current_admin)] = None,
+    material_id: uuid.UUID | None = Query(None),
+    status: str | None = Query(None, pattern="^(queued|running|succeeded|failed|cancelled)$"),
+    limit: int = Query(50, ge=1, le=500),
+):
+    _ = user
+    q = db.query(IngestJob).order_by(IngestJob.created_at.desc())
+    if material_id is not None:
+        q = q.filter(IngestJob.material_id == material_id)
+    if status is not None:
+        q = q.filter(IngestJob.status == status)
+    return [job_to_out(j) for j in q.limit(limit).all()]
+
+
+@router.get("/jobs/{job_id}", response_model=IngestJobOut)
+def get_job(
+    job_id: uuid.UUID,
+    db: Session = Depends(get_db),
+    user: Annotated[CurrentUser, Depends(get_current_admin)] = None,
+):
+    _ = user
+    return job_to_out(_get_job(db, job_id))
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=IngestJobOut)
+def cancel(
+    job_id: uuid.UUID,
+    db: Session = Depends(get_db),
+    user: Annotated[CurrentUser, Depends(get_current_admin)] = None,
+):
+    """Cancels a queued job, or asks a running one to stop at its next progress update."""
+    _ = user
+    job = _get_job(db, job_id)
+    if not cancel_job(db, job):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    return job_to_out(job)
+
+
+@router.post("/jobs/{job_id}/retry", response_model=IngestJobOut)
+def retry(
+    job_id: uuid.UUID,
+    db: Session = Depends(get_db),
+    user: Annotated[CurrentUser, Depends(get_current_admin)] = None,
+):
+    """
+    Requeues a failed or cancelled job, or returns the material's job that is
+    already queued or running. The pipeline runs again from the start; batches
+    embedded before the failure come back from the embedding cache.
+    """
+    _ = user
+    job = _get_job(db, job_id)
+    requeued = retry_job(db, job)
+    if requeued is None:
+        raise HTTPException(status_code=409, detail=f"Only failed or cancelled jobs can be retried (job is {job.status})")
+    return job_to_out(requeued)
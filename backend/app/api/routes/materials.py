@@ -5,20 +5,29 @@ import uuid
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
+from app.api.routes.ingest import job_to_out
 from app.core.auth import CurrentUser, get_current_admin, get_current_user
 from app.core.config import settings
 from app.db import get_db
 from app.models import Course, Material, MaterialChunk
-from app.schemas import MaterialLinkCreate, MaterialOut, MaterialUpdate
-from app.services.gemini import GeminiService
-from app.services.ingest import (
-    chunk_code_structure,
-    chunk_theory_improved,
-    extract_text_from_path,
-    is_code_material,
+from app.schemas import IngestJobOut, MaterialLinkCreate, MaterialOut, MaterialUpdate
+from app.services.blob_store import (
+    UploadTooLarge,
+    add_blob_ref,
+    blob_path,
+    discard_upload,
+    release_blob,
+    remove_blob,
+    stage_upload,
+    store_blob,
 )
+from app.services.gemini import GeminiService
+from app.services.ingest_jobs import enqueue_ingest
+from app.services.search_cache import bump_corpus_version
+from app.services.vector_index import get_vector_index
 
 router = APIRouter()
 
@@ -122,32 +131,36 @@ async def upload_material(
     if category not in {"theory", "lab"}:
         raise HTTPException(status_code=400, detail="category must be theory|lab")
 
-    storage_dir = _ensure_storage_dir()
-    material_id = uuid.uuid4()
-    filename = file.filename or "upload.bin"
-    safe_name = f"{material_id}_{filename}".replace("..", ".")
-    dest_path = os.path.join(storage_dir, safe_name)
-
-    content = await file.read()
-    with open(dest_path, "wb") as f:
-        f.write(content)
+    _ensure_storage_dir()
+    filename = os.path.basename(file.filename or "") or "upload.bin"
+    try:
+        staged = await run_in_threadpool(stage_upload, file.file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
     tag_list = [t.strip() for t in (tags or "").split(",") if t.strip()] or None
 
-    m = Material(
-        id=material_id,
-        course_id=course_uuid,
-        category=category,
-        title=title,
-        type=type,
-        storage_path=dest_path,
-        week=week,
-        topic=topic,
-        tags=tag_list,
-        created_by=user.user_id,
-    )
-    db.add(m)
-    db.commit()
+    try:
+        key = add_blob_ref(db, staged, filename)
+        m = Material(
+            course_id=course_uuid,
+            category=category,
+            title=title,
+            type=type,
+            storage_path=blob_path(key),
+            blob_key=key,
+            filename=filename,
+            week=week,
+            topic=topic,
+            tags=tag_list,
+            created_by=user.user_id,
+        )
+        db.add(m)
+        db.commit()
+    except BaseException:
+        discard_upload(staged)
+        raise
+    store_blob(staged, key)
     db.refresh(m)
 
     return _material_to_out(m)
@@ -196,6 +209,10 @@ def update_material(
         m.title = body.title
     if body.category is not None:
         m.category = body.category
+        # Chunks carry a copy of the category for join-free search filters.
+        db.query(MaterialChunk).filter(MaterialChunk.material_id == m.id).update(
+            {MaterialChunk.category: body.category}, synchronize_session=False
+        )
     if body.type is not None:
         m.type = body.type
     if body.week is not None:
@@ -206,6 +223,7 @@ def update_material(
         m.tags = body.tags
     if body.link_url is not None:
         m.link_url = body.link_url
+    bump_corpus_version(db, m.course_id)
     db.commit()
     db.refresh(m)
     return _material_to_out(m)
@@ -221,13 +239,22 @@ def delete_material(
     m = db.get(Material, material_id)
     if not m:
         raise HTTPException(status_code=404, detail="Material not found")
-    if m.storage_path and os.path.exists(m.storage_path):
+    # Files go only once the delete has committed, so a failure cannot orphan a row.
+    released = release_blob(db, m.blob_key) if m.blob_key else None
+    legacy_path = None if m.blob_key else m.storage_path
+    course_id = m.course_id
+    bump = bump_corpus_version(db, course_id)
+    db.delete(m)
+    db.commit()
+    if released:
+        remove_blob(db, released)
+    elif legacy_path and os.path.exists(legacy_path):
         try:
-            os.remove(m.storage_path)
+            os.remove(legacy_path)
         except OSError:
             pass
-    db.delete(m)
-    db.commit()
+    if settings.search_backend == "numpy":
+        get_vector_index().refresh_material(db, course_id, material_id, [bump])
     return {"ok": True}
 
 
@@ -247,70 +274,25 @@ def download_material(
     if not m.storage_path or not os.path.exists(m.storage_path):
         raise HTTPException(status_code=404, detail="File missing on server")
     from fastapi.responses import FileResponse
-    return FileResponse(path=m.storage_path, filename=os.path.basename(m.storage_path))
+    return FileResponse(path=m.storage_path, filename=m.filename or os.path.basename(m.storage_path))
 
 
-@router.post("/{material_id}/ingest")
+@router.post("/{material_id}/ingest", response_model=IngestJobOut, status_code=202)
 def ingest_material(
     material_id: uuid.UUID,
     db: Session = Depends(get_db),
     user: Annotated[CurrentUser, Depends(get_current_admin)] = None,
 ):
-    _ = user
+    """
+    Queues a background ingest (extract, chunk, embed, write) and returns its
+    job; poll GET /ingest/jobs/{id} for progress. A material that already has
+    a queued or running job gets that job back.
+    """
     m = db.get(Material, material_id)
     if not m:
         raise HTTPException(status_code=404, detail="Material not found")
     if not m.storage_path:
         raise HTTPException(status_code=400, detail="Link-only materials cannot be ingested")
-
-    extracted = extract_text_from_path(m.storage_path)
-    path = m.storage_path or ""
-    is_code = is_code_material(m.type or "", path)
-
-    if is_code:
-        code_chunks = chunk_code_structure(extracted.text, path)
-        texts = [c.text for c in code_chunks]
-    else:
-        raw = chunk_theory_improved(extracted.text, path)
-        texts = raw
-
-    if not texts:
-        raise HTTPException(status_code=400, detail="No extractable text found")
-
-    gemini = GeminiService()
-    if not gemini.is_configured():
+    if not GeminiService().is_configured():
         raise HTTPException(status_code=400, detail="GEMINI_API_KEY is not configured")
-
-    embeddings = gemini.embed(texts)
-
-    db.query(MaterialChunk).filter(MaterialChunk.material_id == m.id).delete()
-    db.commit()
-
-    if is_code:
-        for idx, (cc, emb) in enumerate(zip(code_chunks, embeddings, strict=False)):
-            db.add(
-                MaterialChunk(
-                    material_id=m.id,
-                    chunk_index=idx,
-                    text=cc.text,
-                    embedding=emb,
-                    language=cc.language,
-                    symbol_name=cc.symbol_name,
-                    start_line=cc.start_line,
-                    end_line=cc.end_line,
-                )
-            )
-    else:
-        for idx, (txt, emb) in enumerate(zip(texts, embeddings, strict=False)):
-            db.add(
-                MaterialChunk(
-                    material_id=m.id,
-                    chunk_index=idx,
-                    text=txt,
-                    embedding=emb,
-                )
-            )
-    db.commit()
-
-    return {"material_id": str(m.id), "chunks_added": len(texts)}
-
+    return job_to_out(enqueue_ingest(db, m, created_by=user.user_id))
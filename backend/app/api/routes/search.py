@@ -1,26 +1,34 @@
 from __future__ import annotations
 
 import logging
+import time
+import uuid
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
-from app.db import get_db
+from app.core.config import settings
+from app.db import get_db, pg_trgm_available
 from app.schemas import (
     SearchAskRequest,
     SearchAskResponse,
+    SearchBatchResponse,
+    SearchBatchResult,
     SearchRequest,
     SearchResponse,
     SearchHit,
 )
 from app.services.gemini import GeminiService
-from app.services.search import run_search
+from app.services.search import BatchQuery, build_symbol_lookup, run_batch_search, run_search
+from app.services.search_cache import corpus_version, search_cache_key, search_result_cache
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-def _rows_to_hits(rows, max_excerpt: int = 700) -> list[SearchHit]:
+def _rows_to_hits(rows, max_excerpt: int | None = None) -> list[SearchHit]:
+    # The search queries already cut the text to one character past the limit.
+    max_excerpt = max_excerpt or settings.search_excerpt_chars
     hits: list[SearchHit] = []
     for r in rows:
         excerpt = (r.text or "").strip()
@@ -49,10 +57,16 @@ def search(req: SearchRequest, db: Session = Depends(get_db)):
     if not gemini.is_configured():
         raise HTTPException(status_code=400, detail="GEMINI_API_KEY is not configured")
 
-    q_emb = gemini.embed([req.query])[0]
+    cache_key = search_cache_key(req, corpus_version(db, req.course_id))
+    cached = search_result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    q_emb = gemini.embed_query(req.query)
     use_hybrid = getattr(req, "use_hybrid", True)
     lang = getattr(req, "language", None)
     sym = getattr(req, "symbol", None)
+    fell_back = False
 
     try:
         rows = run_search(
@@ -65,10 +79,16 @@ def search(req: SearchRequest, db: Session = Depends(get_db)):
             language=lang,
             symbol=sym,
             use_hybrid=use_hybrid,
+            ef_search=req.ef_search,
+            fusion=req.fusion,
+            candidate_k=req.candidate_k,
+            excerpt_chars=settings.search_excerpt_chars,
         )
     except Exception as e:
         if use_hybrid:
             logger.warning("Hybrid search failed, falling back to vector-only: %s", e)
+            db.rollback()
+            fell_back = True
             rows = run_search(
                 db,
                 query_embedding=q_emb,
@@ -79,11 +99,135 @@ def search(req: SearchRequest, db: Session = Depends(get_db)):
                 language=lang,
                 symbol=sym,
                 use_hybrid=False,
+                ef_search=req.ef_search,
+                excerpt_chars=settings.search_excerpt_chars,
             )
         else:
             raise
 
-    return SearchResponse(hits=_rows_to_hits(rows))
+    resp = SearchResponse(hits=_rows_to_hits(rows))
+    if not fell_back:
+        search_result_cache.put(cache_key, resp)
+    return resp
+
+
+@router.post("/batch", response_model=SearchBatchResponse)
+def search_batch(reqs: list[SearchRequest], db: Session = Depends(get_db)):
+    """
+    Runs many searches in one round trip: cached results are returned as-is, the
+    remaining queries are embedded in one call, and vector / linear-hybrid
+    queries are answered by a single SQL statement. rrf/normalized fusion needs
+    two candidate lists per query and runs query by query. The statement uses
+    the largest ef_search requested in the batch.
+    """
+    gemini = GeminiService()
+    if not gemini.is_configured():
+        raise HTTPException(status_code=400, detail="GEMINI_API_KEY is not configured")
+    if len(reqs) > settings.search_batch_max_queries:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.search_batch_max_queries} queries per batch",
+        )
+
+    t0 = time.perf_counter()
+    versions = {cid: corpus_version(db, cid) for cid in {r.course_id for r in reqs}}
+    keys = [search_cache_key(r, versions[r.course_id]) for r in reqs]
+    results: list[SearchBatchResult | None] = []
+    for key in keys:
+        cached = search_result_cache.get(key)
+        results.append(None if cached is None else SearchBatchResult(hits=cached.hits, took_ms=0.0, cached=True))
+    pending = [i for i, r in enumerate(results) if r is None]
+
+    t_embed = time.perf_counter()
+    embeddings = dict(zip(pending, gemini.embed_queries([reqs[i].query for i in pending]), strict=True))
+    embed_ms = (time.perf_counter() - t_embed) * 1000
+
+    fused = {i for i in pending if reqs[i].use_hybrid and reqs[i].fusion != "linear" and reqs[i].query.strip()}
+    batched = [i for i in pending if i not in fused]
+    ef_search = max((reqs[i].ef_search or 0 for i in pending), default=0) or None
+
+    def _run_batched(use_hybrid: bool):
+        queries = [
+            BatchQuery(
+                query_embedding=embeddings[i],
+                query_text=reqs[i].query,
+                course_id=reqs[i].course_id,
+                category=reqs[i].category,
+                top_k=reqs[i].top_k,
+                language=reqs[i].language,
+                symbol=reqs[i].symbol,
+                use_hybrid=use_hybrid and reqs[i].use_hybrid,
+            )
+            for i in batched
+        ]
+        return run_batch_search(db, queries, ef_search=ef_search, excerpt_chars=settings.search_excerpt_chars)
+
+    fell_back = False
+    try:
+        batch_out = _run_batched(use_hybrid=True)
+    except Exception as e:
+        if not any(reqs[i].use_hybrid for i in batched):
+            raise
+        logger.warning("Hybrid batch search failed, falling back to vector-only: %s", e)
+        db.rollback()
+        fell_back = True
+        batch_out = _run_batched(use_hybrid=False)
+    for i, (rows, took_ms) in zip(batched, batch_out, strict=True):
+        results[i] = SearchBatchResult(hits=_rows_to_hits(rows), took_ms=round(took_ms, 3))
+
+    for i in fused:
+        r = reqs[i]
+        t_query = time.perf_counter()
+        rows = run_search(
+            db,
+            query_embedding=embeddings[i],
+            query_text=r.query,
+            course_id=r.course_id,
+            category=r.category,
+            top_k=r.top_k,
+            language=r.language,
+            symbol=r.symbol,
+            use_hybrid=True,
+            ef_search=r.ef_search,
+            fusion=r.fusion,
+            candidate_k=r.candidate_k,
+            excerpt_chars=settings.search_excerpt_chars,
+        )
+        results[i] = SearchBatchResult(hits=_rows_to_hits(rows), took_ms=round((time.perf_counter() - t_query) * 1000, 3))
+
+    for i in pending:
+        if not (fell_back and i in batched):
+            search_result_cache.put(keys[i], SearchResponse(hits=results[i].hits))
+
+    return SearchBatchResponse(
+        results=results,
+        embed_ms=round(embed_ms, 3),
+        took_ms=round((time.perf_counter() - t0) * 1000, 3),
+    )
+
+
+@router.get("/symbols", response_model=SearchResponse)
+def symbol_lookup(
+    q: str = Query(..., min_length=1, description="symbol name, e.g. BinaryHeap or BinaryHeap.push"),
+    mode: str = Query("prefix", pattern="^(exact|prefix|contains)$"),
+    language: str | None = Query(None),
+    course_id: uuid.UUID | None = Query(None),
+    category: str | None = Query(None, pattern="^(theory|lab)$"),
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db),
+):
+    """Jump-to-definition lookup on code chunk symbol names; no embedding or vector scoring."""
+    stmt = build_symbol_lookup(
+        symbol=q,
+        mode=mode,
+        language=language,
+        course_id=course_id,
+        category=category,
+        limit=limit,
+        excerpt_chars=settings.search_excerpt_chars,
+        trigram=pg_trgm_available(),
+    )
+    return SearchResponse(hits=_rows_to_hits(db.execute(stmt).all()))
 
 
 @router.post("/ask", response_model=SearchAskResponse)
@@ -93,7 +237,7 @@ def search_ask(req: SearchAskRequest, db: Session = Depends(get_db)):
     if not gemini.is_configured():
         raise HTTPException(status_code=400, detail="GEMINI_API_KEY is not configured")
 
-    q_emb = gemini.embed([req.query])[0]
+    q_emb = gemini.embed_query(req.query)
     rows = run_search(
         db,
         query_embedding=q_emb,
@@ -102,6 +246,7 @@ def search_ask(req: SearchAskRequest, db: Session = Depends(get_db)):
         category=req.category,
         top_k=req.top_k,
         use_hybrid=True,
+        excerpt_chars=settings.search_excerpt_chars,
     )
 
     hits = _rows_to_hits(rows)
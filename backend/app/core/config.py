@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -14,8 +16,98 @@ class Settings(BaseSettings):
     gemini_api_key: str | None = None
     gemini_text_model: str = "gemini-2.0-flash"
     gemini_embed_model: str = "gemini-embedding-001"
+    # Stored vector size; requested from the API via output_dimensionality.
+    # pgvector's HNSW index supports at most 2000 dimensions for `vector`.
+    embedding_dim: int = 768
+    # Embedding requests are batched; the API caps a batch at 100 inputs.
+    gemini_embed_batch_size: int = 100
+    gemini_embed_max_batch_chars: int = 200_000
+    # Shared embedding executor: worker pool, provider quota (<= 0 disables a limit) and retries
+    gemini_embed_max_workers: int = 4
+    gemini_embed_requests_per_min: float = 1500
+    gemini_embed_tokens_per_min: float = 1_000_000
+    gemini_embed_max_retries: int = 5
+    gemini_embed_backoff_base_s: float = 0.5
+    gemini_embed_backoff_max_s: float = 30.0
+    # Persistent content-addressed embedding cache (embedding_cache table). Ingest
+    # jobs use it regardless, as the checkpoint a retried job resumes embedding from
+    embedding_cache_enabled: bool = True
+    # In-process LRU/TTL cache for query embeddings (search, ask, generate); 0 disables
+    query_embedding_cache_size: int = 4096
+    query_embedding_cache_ttl_s: float = 3600.0
+
+    # HNSW index on material_chunks.embedding (rebuilt on startup when m/ef_construction change)
+    hnsw_m: int = 16
+    hnsw_ef_construction: int = 64
+    hnsw_ef_search: int = 40
+    # Also build a partial HNSW index per material category (category-filtered searches)
+    hnsw_partial_by_category: bool = True
+    # Coarse ANN pass on a compact copy of the embeddings, then exact cosine re-rank
+    # of top_k * quantized_rerank_factor candidates with the full vectors.
+    vector_quantization: Literal["none", "halfvec", "binary"] = "none"
+    quantized_rerank_factor: int = 4
+    # Two-stage (Matryoshka) search: shortlist on the first embedding_coarse_dim
+    # components, then re-score top_k * two_stage_rerank_factor at full dimension.
+    search_two_stage: bool = False
+    embedding_coarse_dim: int = 256
+    two_stage_rerank_factor: int = 8
+    # Per-list candidate depth for fused (rrf / normalized) hybrid search
+    search_candidate_k: int = 50
+    # Where course-scoped searches are scored: "pgvector" (SQL) or "numpy" (in-process
+    # per-course matrix, memory-mapped from VECTOR_INDEX_DIR, default <storage_dir>/vector_index)
+    search_backend: Literal["pgvector", "numpy"] = "pgvector"
+    vector_index_dir: str = ""
+    # In-process search result cache, keyed by request + per-course corpus version
+    # (bumped on every ingest/update/delete); 0 entries disables it.
+    search_cache_max_entries: int = 2048
+    search_cache_max_bytes: int = 64 * 2**20
+    search_cache_ttl_s: float = 600.0
+    # Upper bound on the number of queries in one POST /search/batch request
+    search_batch_max_queries: int = 100
+    # Characters of chunk text returned per hit, cut in SQL; hybrid queries get a
+    # ts_headline snippet around the matched terms instead of the chunk start
+    search_excerpt_chars: int = 700
+
+    # Full-text search configs for the stored material_chunks.text_tsv column:
+    # prose chunks are stemmed, code chunks (language set) keep identifiers verbatim.
+    fts_prose_config: str = "english"
+    fts_code_config: str = "simple"
+
+    # PDF text extraction: process pool size (0 = one per CPU core, 1 = serial) and the
+    # page count from which a document is split into page ranges extracted in parallel
+    pdf_extract_workers: int = 0
+    pdf_extract_min_pages: int = 32
+    # Python code is chunked per class / method / function (stdlib ast); bodies longer than
+    # this many characters are split at statement boundaries (embedding input is ~2048 tokens)
+    code_chunk_max_chars: int = 4000
+    # PDF / plain-text chunks: token budget (estimated, see estimate_tokens) built from whole
+    # sentences, and the tokens of trailing sentences repeated when a paragraph is split
+    prose_chunk_tokens: int = 450
+    prose_chunk_overlap_tokens: int = 50
+
+    # Background ingest jobs (ingest_jobs table): worker threads started with the API
+    # (0 = none; run `python -m scripts.ingest_worker` instead), idle poll interval, and
+    # how long a running job may go without a heartbeat before it is requeued.
+    ingest_workers: int = 2
+    ingest_poll_interval_s: float = 2.0
+    ingest_job_stale_s: float = 300.0
+    # Streaming ingest pipeline: chunks per embed + insert batch, and how many pages /
+    # batches a stage may run ahead of the next (bounds worker memory per job)
+    ingest_batch_size: int = 256
+    ingest_queue_size: int = 4
+    # Insert new chunk rows with binary COPY (psycopg 3); false = executemany INSERT
+    ingest_copy: bool = True
+    # New chunks repeating another material's chunk in the course (same text, or SimHash
+    # within ingest_dedup_max_distance bits): "reuse" its embedding, "skip" storing them, or "off"
+    ingest_dedup: Literal["off", "reuse", "skip"] = "reuse"
+    ingest_dedup_max_distance: int = 6
 
     storage_dir: str = "./storage"
+    # Uploads are copied to disk in upload_block_size blocks while hashed; larger ones are
+    # rejected with 413 from their Content-Length, or once max_upload_bytes (plus the form
+    # overhead) have been received, before the multipart body is spooled (0 = no limit)
+    max_upload_bytes: int = 200 * 1024 * 1024
+    upload_block_size: int = 1024 * 1024
     public_base_url: str = "http://localhost:8000"
 
     # JWT secret for our own token generation
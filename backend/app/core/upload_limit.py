@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+# Allowance on top of MAX_UPLOAD_BYTES for the other form fields and the multipart framing
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+def upload_body_limit() -> int:
+    """Largest request body accepted on an upload route; 0 = no limit (MAX_UPLOAD_BYTES <= 0)."""
+    if settings.max_upload_bytes <= 0:
+        return 0
+    return settings.max_upload_bytes + FORM_OVERHEAD_BYTES
+
+
+class UploadLimitMiddleware:
+    """
+    Enforces the upload size limit before the multipart body is parsed and
+    spooled: a request to one of `paths` announcing a larger Content-Length
+    is refused with 413 without reading its body, and a body that turns out
+    larger (chunked, or a lying header) is cut off with 413 as soon as the
+    limit is crossed. stage_upload() still checks the file part itself.
+    """
+
+    def __init__(self, app: ASGIApp, paths: tuple[str, ...]) -> None:
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = upload_body_limit()
+        if scope["type"] != "http" or scope["path"] not in self.paths or not limit:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Upload exceeds {settings.max_upload_bytes} bytes"
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            await JSONResponse({"detail": detail}, status_code=413, headers={"Connection": "close"})(
+                scope, receive, send
+            )
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside body parsing; FastAPI re-raises HTTPException as is.
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
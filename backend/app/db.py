@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import logging
+from collections.abc import Callable
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import Connection, Index, Table, create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateColumn
 
 from app.core.config import settings
 
@@ -21,6 +23,195 @@ def init_extensions() -> None:
     except Exception:
         # Some hosted DBs restrict CREATE EXTENSION; don't crash the app for MVP.
         logger.exception("Failed to ensure pgvector extension; search may not work.")
+    # pg_trgm: trigram index behind symbol substring search
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm;"))
+    except Exception:
+        logger.exception("Failed to ensure pg_trgm extension; symbol search will scan code chunks.")
+
+
+def _migrate(description: str, step: Callable[[Connection], None]) -> None:
+    """Runs one idempotent schema step in its own transaction; failures are logged, not raised."""
+    try:
+        with engine.begin() as conn:
+            step(conn)
+    except Exception:
+        logger.exception("Schema step failed: %s", description)
+
+
+def _add_missing_columns(conn: Connection, table: Table) -> None:
+    existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    for col in table.columns:
+        if col.name not in existing:
+            logger.info("Adding column %s.%s", table.name, col.name)
+            ddl = CreateColumn(col).compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS {ddl}"))
+
+
+def _hnsw_indexes(table: Table) -> list[Index]:
+    return [i for i in table.indexes if i.dialect_options["postgresql"]["using"] == "hnsw"]
+
+
+def _drop_stale_hnsw_indexes(conn: Connection, table: Table) -> None:
+    """Drops managed HNSW indexes no longer declared, e.g. after switching VECTOR_QUANTIZATION."""
+    wanted = {i.name for i in _hnsw_indexes(table)}
+    existing = conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :table AND indexname LIKE :pattern"),
+        {"table": table.name, "pattern": f"ix_{table.name}_%_hnsw"},
+    ).scalars()
+    for name in existing:
+        if name not in wanted:
+            logger.info("Dropping unused vector index %s", name)
+            conn.execute(text(f"DROP INDEX {name}"))
+
+
+def _backfill_chunk_filters(conn: Connection) -> None:
+    """Copies course_id / category from materials onto chunks that predate the denormalized columns."""
+    res = conn.execute(
+        text(
+            "UPDATE material_chunks c SET course_id = m.course_id, category = m.category "
+            "FROM materials m WHERE m.id = c.material_id AND (c.course_id IS NULL OR c.category IS NULL)"
+        )
+    )
+    if res.rowcount:
+        logger.info("Backfilled course_id/category on %d chunks", res.rowcount)
+
+
+def _backfill_chunk_hashes(conn: Connection) -> None:
+    """Fills content_hash (sha256 of the UTF-8 text, as ingest computes it) on chunks that predate it."""
+    res = conn.execute(
+        text(
+            "UPDATE material_chunks SET content_hash = encode(sha256(convert_to(text, 'UTF8')), 'hex') "
+            "WHERE content_hash IS NULL"
+        )
+    )
+    if res.rowcount:
+        logger.info("Backfilled content_hash on %d chunks", res.rowcount)
+
+
+def _ensure_vector_columns(conn: Connection, table: Table) -> None:
+    from app.models import CATEGORIES
+
+    dim = settings.embedding_dim
+    wanted = {
+        "embedding": f"vector({dim})",
+        "embedding_half": f"halfvec({dim})",
+        "embedding_bits": f"bit({dim})",
+        "embedding_coarse": f"vector({settings.embedding_coarse_dim})",
+    }
+    for column, coltype in wanted.items():
+        current = conn.execute(
+            text(
+                "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+                "WHERE attrelid = CAST(:table AS regclass) AND attname = :column"
+            ),
+            {"table": table.name, "column": column},
+        ).scalar()
+        if current is None or current == coltype:
+            continue
+        logger.info("Converting %s.%s from %s to %s", table.name, column, current, coltype)
+        for suffix in ("", *(f"_{c}" for c in CATEGORIES)):
+            conn.execute(text(f"DROP INDEX IF EXISTS ix_{table.name}_{column}{suffix}_hnsw"))
+        if column == "embedding":
+            # Fails when existing chunks were embedded at another dimension; re-ingest after clearing them.
+            conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN {column} TYPE {coltype}"))
+        else:
+            # Compact copies are derived data; clear them and let the backfill recompute.
+            conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN {column} TYPE {coltype} USING NULL"))
+
+
+def _ensure_hnsw_options(conn: Connection, table: Table) -> None:
+    wanted = {f"m={settings.hnsw_m}", f"ef_construction={settings.hnsw_ef_construction}"}
+    for index in _hnsw_indexes(table):
+        reloptions = conn.execute(
+            text("SELECT reloptions FROM pg_class WHERE relname = :name AND relkind = 'i'"),
+            {"name": index.name},
+        ).scalar()
+        if reloptions is not None and set(reloptions) != wanted:
+            logger.info("Rebuilding %s with %s", index.name, sorted(wanted))
+            conn.execute(text(f"DROP INDEX {index.name}"))
+
+
+def _create_missing_indexes(conn: Connection, table: Table) -> None:
+    for index in table.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+
+def _supersede_duplicate_jobs(conn: Connection) -> None:
+    """Cancels queued ingest jobs of materials with another active job, so the one-active-job index can be built."""
+    res = conn.execute(
+        text(
+            "UPDATE ingest_jobs j SET status = 'cancelled', finished_at = now(), "
+            "error = 'Superseded by another job for this material' "
+            "WHERE j.status = 'queued' AND EXISTS (SELECT 1 FROM ingest_jobs o WHERE o.material_id = j.material_id "
+            "AND o.id <> j.id AND (o.status = 'running' OR (o.status = 'queued' AND o.created_at > j.created_at)))"
+        )
+    )
+    if res.rowcount:
+        logger.info("Cancelled %d duplicate queued ingest jobs", res.rowcount)
+
+
+def _has_extension(conn: Connection, name: str) -> bool:
+    return conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = :name"), {"name": name}).first() is not None
+
+
+_pg_trgm: bool | None = None
+
+
+def pg_trgm_available() -> bool:
+    """Whether pg_trgm is installed; checked once per process (unknown while the database is unreachable)."""
+    global _pg_trgm
+    if _pg_trgm is None:
+        try:
+            with engine.connect() as conn:
+                _pg_trgm = _has_extension(conn, "pg_trgm")
+        except Exception:
+            logger.exception("Failed to check for the pg_trgm extension")
+            return False
+    return _pg_trgm
+
+
+def create_trigram_index(conn: Connection) -> None:
+    """
+    Trigram GIN index behind symbol substring filters. Not declared on the
+    model, so create_all() works without pg_trgm; skipped when it is missing.
+    """
+    if not _has_extension(conn, "pg_trgm"):
+        logger.warning("pg_trgm is not installed; symbol substring search will scan code chunks.")
+        return
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_material_chunks_symbol_name_trgm "
+            "ON material_chunks USING gin (symbol_name gin_trgm_ops)"
+        )
+    )
+
+
+def init_search_schema() -> None:
+    """
+    Brings the schema up to date on existing databases (create_all() only
+    covers new tables): adds new columns to every table, fills the chunk filter
+    columns copied from materials and the chunk content hashes, pins the
+    vector columns to EMBEDDING_DIM, keeps the HNSW indexes on the column the
+    first ANN stage scans and rebuilds them when HNSW_M / HNSW_EF_CONSTRUCTION
+    change, and creates any missing indexes (the trigram one only with pg_trgm,
+    the one-active-job-per-material one after cancelling duplicate queued jobs).
+    """
+    from app.models import Base, IngestJob, MaterialChunk
+
+    for t in Base.metadata.sorted_tables:
+        _migrate(f"add {t.name} columns", lambda conn, t=t: _add_missing_columns(conn, t))
+    _migrate("backfill chunk filter columns", _backfill_chunk_filters)
+    _migrate("backfill chunk content hashes", _backfill_chunk_hashes)
+    table = MaterialChunk.__table__
+    _migrate("pin embedding dimension", lambda conn: _ensure_vector_columns(conn, table))
+    _migrate("drop unused vector indexes", lambda conn: _drop_stale_hnsw_indexes(conn, table))
+    _migrate("check HNSW options", lambda conn: _ensure_hnsw_options(conn, table))
+    _migrate("create material_chunks indexes", lambda conn: _create_missing_indexes(conn, table))
+    _migrate("create symbol trigram index", create_trigram_index)
+    _migrate("cancel duplicate ingest jobs", _supersede_duplicate_jobs)
+    _migrate("create ingest_jobs indexes", lambda conn: _create_missing_indexes(conn, IngestJob.__table__))
 
 
 def get_db():
@@ -7,8 +7,11 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.router import api_router
 from app.core.config import settings
-from app.db import engine, init_extensions
+from app.core.upload_limit import UploadLimitMiddleware
+from app.db import engine, init_extensions, init_search_schema
 from app.models import Base
+from app.services.ingest import shutdown_pdf_pools
+from app.services.ingest_jobs import get_ingest_workers
 
 
 def _ensure_storage_dir() -> None:
@@ -21,6 +24,8 @@ def create_app() -> FastAPI:
         redirect_slashes=False,  # Disable auto-redirect from /path to /path/
     )
 
+    # Added first so CORS wraps its 413 responses
+    app.add_middleware(UploadLimitMiddleware, paths=("/materials/upload",))
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -34,6 +39,13 @@ def create_app() -> FastAPI:
         _ensure_storage_dir()
         init_extensions()
         Base.metadata.create_all(bind=engine)
+        init_search_schema()
+        get_ingest_workers().start(settings.ingest_workers)
+
+    @app.on_event("shutdown")
+    def _shutdown() -> None:
+        get_ingest_workers().stop(timeout=5.0)
+        shutdown_pdf_pools()
 
     app.include_router(api_router)
     return app
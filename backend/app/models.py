@@ -3,16 +3,22 @@ from __future__ import annotations
 import datetime as dt
 import uuid
 
-from pgvector.sqlalchemy import Vector
-from sqlalchemy import DateTime, ForeignKey, String, Text
-from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector
+from sqlalchemy import BigInteger, Boolean, Computed, DateTime, ForeignKey, Index, Integer, Sequence, String, Text
+from sqlalchemy import text as sql_text
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR, UUID
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
+from app.core.config import settings
+
 
 class Base(DeclarativeBase):
     pass
 
 
+corpus_version_seq = Sequence("corpus_version_seq", metadata=Base.metadata)
+
+
 class Profile(Base):
     __tablename__ = "profiles"
 
@@ -32,6 +38,8 @@ class Course(Base):
     title: Mapped[str] = mapped_column(String(255))
     code: Mapped[str | None] = mapped_column(String(64), nullable=True)
     term: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # Bumped from corpus_version_seq whenever the course's searchable chunks change (see search_cache)
+    corpus_version: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
     created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
 
     materials: Mapped[list["Material"]] = relationship(back_populates="course")
@@ -47,6 +55,10 @@ class Material(Base):
     title: Mapped[str] = mapped_column(String(255))
     type: Mapped[str] = mapped_column(String(32))  # pdf | slides | code | note | link
     storage_path: Mapped[str | None] = mapped_column(Text, nullable=True)  # local path; null for type=link
+    # Content-addressed upload (storage_blobs.key; storage_path is then the blob's path); null for
+    # links and files stored before blobs, which the material owns outright
+    blob_key: Mapped[str | None] = mapped_column(String(96), nullable=True)
+    filename: Mapped[str | None] = mapped_column(String(255), nullable=True)  # as uploaded
     link_url: Mapped[str | None] = mapped_column(Text, nullable=True)  # for type=link
 
     week: Mapped[int | None] = mapped_column(nullable=True)
@@ -60,28 +72,201 @@ class Material(Base):
     chunks: Mapped[list["MaterialChunk"]] = relationship(back_populates="material", cascade="all, delete-orphan")
 
 
+# Column and operator class the HNSW index is built on, per VECTOR_QUANTIZATION mode.
+ANN_INDEX_COLUMNS: dict[str, tuple[str, str]] = {
+    "none": ("embedding", "vector_cosine_ops"),
+    "halfvec": ("embedding_half", "halfvec_cosine_ops"),
+    "binary": ("embedding_bits", "bit_hamming_ops"),
+}
+
+
+# Material categories; each gets a partial ANN index so category-filtered searches stay index-served.
+CATEGORIES = ("theory", "lab")
+
+
+def _ann_indexes() -> list[Index]:
+    """
+    HNSW indexes on the column the first ANN stage scans (two-stage search takes
+    precedence over quantization): one over all rows plus, with
+    HNSW_PARTIAL_BY_CATEGORY, one partial index per category.
+    """
+    if settings.search_two_stage:
+        column, opclass = "embedding_coarse", "vector_cosine_ops"
+    else:
+        column, opclass = ANN_INDEX_COLUMNS[settings.vector_quantization]
+    indexes = [_hnsw_index(column, opclass)]
+    if settings.hnsw_partial_by_category:
+        indexes += [_hnsw_index(column, opclass, category=c) for c in CATEGORIES]
+    return indexes
+
+
+def _hnsw_index(column: str, opclass: str, category: str | None = None) -> Index:
+    name = f"ix_material_chunks_{column}_{category}_hnsw" if category else f"ix_material_chunks_{column}_hnsw"
+    return Index(
+        name,
+        column,
+        postgresql_using="hnsw",
+        postgresql_with={"m": settings.hnsw_m, "ef_construction": settings.hnsw_ef_construction},
+        postgresql_ops={column: opclass},
+        postgresql_where=sql_text(f"category = '{category}'") if category else None,
+    )
+
+
 class MaterialChunk(Base):
     __tablename__ = "material_chunks"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     material_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("materials.id", ondelete="CASCADE"))
+    # Copied from the material so searches filter without joining materials
+    # (set at ingest, kept in sync by update_material)
+    course_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+    category: Mapped[str | None] = mapped_column(String(16), nullable=True)
 
     chunk_index: Mapped[int] = mapped_column()
     text: Mapped[str] = mapped_column(Text)
+    # sha256 (hex) of `text`; re-ingest keeps rows whose text is unchanged (see ingest_jobs)
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # 64-bit SimHash of `text` (signed); near-duplicate detection at ingest (see dedup)
+    simhash: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
 
     # For lab/code materials
     language: Mapped[str | None] = mapped_column(String(32), nullable=True)
     symbol_name: Mapped[str | None] = mapped_column(String(255), nullable=True)
     start_line: Mapped[int | None] = mapped_column(nullable=True)
     end_line: Mapped[int | None] = mapped_column(nullable=True)
-
-    # Vector embedding (dimension left unspecified to avoid model-mismatch issues)
-    embedding: Mapped[list[float] | None] = mapped_column(Vector(), nullable=True)
+    # For PDFs: 1-based pages the chunk's text comes from
+    page_start: Mapped[int | None] = mapped_column(nullable=True)
+    page_end: Mapped[int | None] = mapped_column(nullable=True)
+
+    # Stored full-text vector (GIN-indexed); code chunks use the code config, prose the prose config
+    text_tsv: Mapped[str | None] = mapped_column(
+        TSVECTOR,
+        Computed(
+            f"to_tsvector(CASE WHEN language IS NULL THEN '{settings.fts_prose_config}'::regconfig "
+            f"ELSE '{settings.fts_code_config}'::regconfig END, text)",
+            persisted=True,
+        ),
+        nullable=True,
+    )
+
+    # Vector embedding; fixed dimension so pgvector can serve it from the HNSW index
+    embedding: Mapped[list[float] | None] = mapped_column(Vector(settings.embedding_dim), nullable=True)
+    # Compact copies for the coarse ANN pass when VECTOR_QUANTIZATION is halfvec/binary
+    # (filled by app.services.quantization; `embedding` is kept for exact re-ranking)
+    embedding_half: Mapped[list[float] | None] = mapped_column(HALFVEC(settings.embedding_dim), nullable=True)
+    embedding_bits: Mapped[str | None] = mapped_column(BIT(settings.embedding_dim), nullable=True)
+    # Leading EMBEDDING_COARSE_DIM components (Matryoshka truncation) for two-stage search
+    embedding_coarse: Mapped[list[float] | None] = mapped_column(Vector(settings.embedding_coarse_dim), nullable=True)
 
     created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
 
     material: Mapped["Material"] = relationship(back_populates="chunks")
 
+    __table_args__ = (
+        *_ann_indexes(),
+        Index("ix_material_chunks_text_tsv", "text_tsv", postgresql_using="gin"),
+        Index("ix_material_chunks_material_id", "material_id"),
+        # Symbol lookup: pattern b-tree for exact/prefix. The trigram GIN index for substring
+        # (ILIKE) filters needs pg_trgm, so init_search_schema creates it when that is installed.
+        Index(
+            "ix_material_chunks_symbol_name_language",
+            "symbol_name",
+            "language",
+            postgresql_ops={"symbol_name": "text_pattern_ops"},
+            postgresql_where=sql_text("symbol_name IS NOT NULL"),
+        ),
+        # Filtered searches that are not served by an ANN index (hybrid scoring, selective courses)
+        Index(
+            "ix_material_chunks_course_category",
+            "course_id",
+            "category",
+            postgresql_where=sql_text("embedding IS NOT NULL"),
+        ),
+    )
+
+
+# Ingest job stages, in order. They overlap (the pipeline streams); a job's `stage` is
+# the earliest one still running, or the one it stopped in.
+INGEST_STAGES = ("extract", "embed", "write")
+
+
+class IngestJob(Base):
+    """
+    One ingest of a material, run by the worker pool in app.services.ingest_jobs.
+    status: queued | running | succeeded | failed | cancelled.
+    """
+
+    __tablename__ = "ingest_jobs"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    material_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("materials.id", ondelete="CASCADE"))
+    status: Mapped[str] = mapped_column(String(16), default="queued")
+    stage: Mapped[str] = mapped_column(String(16), default="extract")
+
+    # Progress per stage
+    pages_total: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    pages_extracted: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    chunks_total: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    chunks_embedded: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    rows_written: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    # Outcome of the diff against the material's previous chunks
+    chunks_kept: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    chunks_added: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    chunks_removed: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    # New chunks matching another material's chunk in the course, and those not stored (INGEST_DEDUP)
+    duplicates_exact: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    duplicates_near: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    duplicates_skipped: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false")
+    worker: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    created_by: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+    started_at: Mapped[dt.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    heartbeat_at: Mapped[dt.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[dt.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_ingest_jobs_material_id", "material_id"),
+        # Workers claim the oldest queued job
+        Index("ix_ingest_jobs_queued", "created_at", postgresql_where=sql_text("status = 'queued'")),
+        # At most one queued or running job per material
+        Index(
+            "ix_ingest_jobs_active_material",
+            "material_id",
+            unique=True,
+            postgresql_where=sql_text("status IN ('queued', 'running')"),
+        ),
+    )
+
+
+class StorageBlob(Base):
+    """
+    An uploaded file stored once under STORAGE_DIR/blobs/<key>, shared by every
+    material with the same bytes; the file is removed when refcount reaches 0.
+    """
+
+    __tablename__ = "storage_blobs"
+
+    key: Mapped[str] = mapped_column(String(96), primary_key=True)  # <sha256[:2]>/<sha256><ext>
+    sha256: Mapped[str] = mapped_column(String(64))
+    size_bytes: Mapped[int] = mapped_column(BigInteger)
+    refcount: Mapped[int] = mapped_column(Integer, default=1)
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+
+
+class EmbeddingCache(Base):
+    """Content-addressed embeddings: one row per (embedding model, sha256 of normalized text)."""
+
+    __tablename__ = "embedding_cache"
+
+    model: Mapped[str] = mapped_column(String(128), primary_key=True)
+    text_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    embedding: Mapped[list[float]] = mapped_column(Vector())
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+
 
 class ChatThread(Base):
     __tablename__ = "chat_threads"
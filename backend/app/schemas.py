@@ -68,6 +68,30 @@ class MaterialLinkCreate(BaseModel):
     tags: list[str] | None = None
 
 
+class IngestJobOut(BaseModel):
+    id: uuid.UUID
+    material_id: uuid.UUID
+    status: str  # queued | running | succeeded | failed | cancelled
+    stage: str  # extract | embed | write: earliest stage still running, or the one it stopped in
+    pages_total: int
+    pages_extracted: int
+    chunks_total: int
+    chunks_embedded: int
+    rows_written: int
+    chunks_kept: int
+    chunks_added: int
+    chunks_removed: int
+    duplicates_exact: int
+    duplicates_near: int
+    duplicates_skipped: int
+    attempts: int
+    error: str | None = None
+    cancel_requested: bool = False
+    created_at: dt.datetime
+    started_at: dt.datetime | None = None
+    finished_at: dt.datetime | None = None
+
+
 class SearchRequest(BaseModel):
     course_id: uuid.UUID | None = None
     query: str
@@ -76,6 +100,9 @@ class SearchRequest(BaseModel):
     language: str | None = None  # filter code chunks by language, e.g. python, javascript
     symbol: str | None = None  # filter by symbol_name (substring match)
     use_hybrid: bool = True  # combine semantic + full-text search
+    ef_search: int | None = Field(default=None, ge=1, le=1000)  # HNSW candidate list size; higher = better recall
+    fusion: str = Field(default="linear", pattern="^(linear|rrf|normalized)$")  # how hybrid scores are combined
+    candidate_k: int | None = Field(default=None, ge=1, le=1000)  # per-list depth for rrf/normalized fusion
 
 
 class SearchHit(BaseModel):
@@ -95,6 +122,38 @@ class SearchResponse(BaseModel):
     hits: list[SearchHit]
 
 
+class SearchBatchResult(BaseModel):
+    hits: list[SearchHit]
+    took_ms: float  # server time spent on this query (0 when served from the result cache)
+    cached: bool = False
+
+
+class SearchBatchResponse(BaseModel):
+    results: list[SearchBatchResult]  # in request order
+    embed_ms: float  # the one embedding call shared by all uncached queries
+    took_ms: float
+
+
+class ChunkOut(BaseModel):
+    id: uuid.UUID
+    material_id: uuid.UUID
+    material_title: str
+    course_id: uuid.UUID
+    category: str
+    chunk_index: int
+    text: str  # full chunk text (search hits carry a bounded excerpt)
+    language: str | None = None
+    symbol_name: str | None = None
+    start_line: int | None = None
+    end_line: int | None = None
+    page_start: int | None = None  # PDF pages the text comes from
+    page_end: int | None = None
+
+
+class ChunkBatchRequest(BaseModel):
+    ids: list[uuid.UUID] = Field(min_length=1, max_length=200)
+
+
 class SearchAskRequest(BaseModel):
     course_id: uuid.UUID | None = None
     query: str
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import uuid
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models import StorageBlob
+
+logger = logging.getLogger(__name__)
+
+_EXT_RE = re.compile(r"\.[a-z0-9]{1,15}")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+@dataclass
+class StagedUpload:
+    """An upload copied to a temporary file under STORAGE_DIR/blobs, not yet committed."""
+
+    tmp_path: str
+    sha256: str
+    size: int
+
+
+def blobs_dir() -> str:
+    return os.path.join(settings.storage_dir, "blobs")
+
+
+def blob_key(sha256: str, filename: str) -> str:
+    """
+    `<sha256[:2]>/<sha256><ext>`: identical bytes share a blob, but the file
+    extension is kept because extraction and chunking dispatch on it.
+    """
+    ext = os.path.splitext(filename or "")[1].lower()
+    return f"{sha256[:2]}/{sha256}{ext if _EXT_RE.fullmatch(ext) else ''}"
+
+
+def blob_path(key: str) -> str:
+    return os.path.join(blobs_dir(), key)
+
+
+def stage_upload(src: BinaryIO, *, max_bytes: int | None = None, block_size: int | None = None) -> StagedUpload:
+    """
+    Copies `src` to a temporary file in fixed-size blocks (UPLOAD_BLOCK_SIZE),
+    hashing as it goes, so memory use does not depend on the upload size.
+    Raises UploadTooLarge, and removes the partial copy, as soon as more than
+    max_bytes (MAX_UPLOAD_BYTES; <= 0 = no limit) have been read.
+    """
+    max_bytes = settings.max_upload_bytes if max_bytes is None else max_bytes
+    block_size = block_size or settings.upload_block_size
+    os.makedirs(blobs_dir(), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".upload-", dir=blobs_dir())
+    sha, size = hashlib.sha256(), 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while block := src.read(block_size):
+                size += len(block)
+                if 0 < max_bytes < size:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                sha.update(block)
+                out.write(block)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return StagedUpload(tmp_path=tmp_path, sha256=sha.hexdigest(), size=size)
+
+
+def add_blob_ref(db: Session, staged: StagedUpload, filename: str) -> str:
+    """
+    Takes a reference on the blob for `staged` in the caller's transaction and
+    returns its key. The file is only put in place by store_blob() once that
+    transaction has committed; if it fails, discard_upload() drops the copy.
+    """
+    key = blob_key(staged.sha256, filename)
+    stmt = insert(StorageBlob).values(key=key, sha256=staged.sha256, size_bytes=staged.size, refcount=1)
+    db.execute(stmt.on_conflict_do_update(index_elements=[StorageBlob.key], set_={"refcount": StorageBlob.refcount + 1}))
+    return key
+
+
+def store_blob(staged: StagedUpload, key: str) -> None:
+    """
+    Moves a committed upload into place. Done for every upload, not just a
+    blob's first: the bytes are the same, and a removal racing with this
+    upload (see remove_blob) can then never leave a referenced key without
+    its file.
+    """
+    path = blob_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(staged.tmp_path, path)
+
+
+def discard_upload(staged: StagedUpload) -> None:
+    try:
+        os.remove(staged.tmp_path)
+    except FileNotFoundError:
+        pass
+
+
+def release_blob(db: Session, key: str) -> str | None:
+    """
+    Drops one reference in the caller's transaction. The last one deletes the
+    blob row and returns the key, whose file the caller removes with
+    remove_blob() after committing (a rollback then leaves the file in place).
+    """
+    refcount = db.execute(
+        update(StorageBlob)
+        .where(StorageBlob.key == key)
+        .values(refcount=StorageBlob.refcount - 1)
+        .returning(StorageBlob.refcount)
+    ).scalar_one_or_none()
+    if refcount is None or refcount > 0:
+        return None
+    db.execute(delete(StorageBlob).where(StorageBlob.key == key))
+    return key
+
+
+def remove_blob(db: Session, key: str) -> None:
+    """
+    Removes the file of a blob whose row was deleted and committed. An upload
+    of the same bytes may commit a new row meanwhile, so the file is first
+    moved aside and only unlinked if no row came back; otherwise it is moved
+    back (a content-addressed file at that path always holds the same bytes).
+    """
+    path = blob_path(key)
+    aside = f"{path}.removing-{uuid.uuid4().hex}"
+    try:
+        os.replace(path, aside)
+    except FileNotFoundError:
+        return
+    try:
+        revived = db.execute(select(StorageBlob.key).where(StorageBlob.key == key)).first() is not None
+        db.commit()
+    except Exception:
+        revived = True  # unknown: keep the file
+        logger.exception("Failed to recheck blob %s", key)
+    try:
+        if revived:
+            os.replace(aside, path)
+        else:
+            os.remove(aside)
+    except OSError:
+        logger.exception("Failed to remove blob %s", key)
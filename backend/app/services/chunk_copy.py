@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import datetime as dt
+import uuid
+
+import psycopg
+from pgvector.psycopg import register_vector
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models import MaterialChunk
+
+# Columns written by insert_chunks and their PostgreSQL types for binary COPY
+# (text is binary-compatible with the varchar columns). Everything else is
+# either generated (text_tsv) or computed from `embedding` by
+# quantize_material() in the same transaction (the compact embedding copies).
+COPY_COLUMNS: tuple[tuple[str, str], ...] = (
+    ("id", "uuid"),
+    ("material_id", "uuid"),
+    ("course_id", "uuid"),
+    ("category", "text"),
+    ("chunk_index", "int4"),
+    ("text", "text"),
+    ("content_hash", "text"),
+    ("simhash", "int8"),
+    ("language", "text"),
+    ("symbol_name", "text"),
+    ("start_line", "int4"),
+    ("end_line", "int4"),
+    ("page_start", "int4"),
+    ("page_end", "int4"),
+    ("embedding", "vector"),
+    ("created_at", "timestamptz"),
+)
+
+
+def build_copy_sql() -> str:
+    columns = ", ".join(name for name, _ in COPY_COLUMNS)
+    return f"COPY {MaterialChunk.__tablename__} ({columns}) FROM STDIN (FORMAT BINARY)"
+
+
+def copy_rows(rows: list[dict]) -> list[tuple]:
+    """
+    MaterialChunk column values as COPY tuples, filling the defaults COPY
+    does not apply (the Python-side id and created_at).
+    """
+    now = dt.datetime.now(dt.timezone.utc)
+    return [
+        tuple({"id": uuid.uuid4(), "created_at": now, **row}.get(name) for name, _ in COPY_COLUMNS)
+        for row in rows
+    ]
+
+
+def _psycopg_connection(db: Session):
+    """The session's psycopg 3 connection (same transaction), or None on another driver."""
+    conn = db.connection().connection.driver_connection
+    return conn if isinstance(conn, psycopg.Connection) else None
+
+
+def insert_chunks(db: Session, rows: list[dict]) -> None:
+    """
+    Inserts MaterialChunk rows inside the session's transaction: with binary
+    COPY (embeddings sent as packed float4, no text formatting or per-row
+    statements) when INGEST_COPY is on and the driver is psycopg 3, otherwise
+    as one executemany INSERT.
+    """
+    if not rows:
+        return
+    unknown = rows[0].keys() - {name for name, _ in COPY_COLUMNS}
+    if unknown:
+        raise ValueError(f"Columns not in COPY_COLUMNS: {sorted(unknown)}")
+    conn = _psycopg_connection(db) if settings.ingest_copy else None
+    if conn is None:
+        db.execute(insert(MaterialChunk), rows)
+        return
+    if conn.adapters.types.get("vector") is None:
+        register_vector(conn)
+    with conn.cursor() as cur, cur.copy(build_copy_sql()) as copy:
+        copy.set_types([type_name for _, type_name in COPY_COLUMNS])
+        for row in copy_rows(rows):
+            copy.write_row(row)
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import uuid
+from collections import defaultdict
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.models import MaterialChunk
+
+_WORD_RE = re.compile(r"\w+")
+_SHINGLE = 3  # words per shingle
+# Near-duplicate matching needs some text to be meaningful; shorter chunks only match exactly.
+_NEAR_MIN_WORDS = 8
+_M64 = (1 << 64) - 1
+
+
+@lru_cache(maxsize=1 << 16)
+def _word_hash(word: str) -> int:
+    return int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _rotl(a: np.ndarray, bits: int) -> np.ndarray:
+    return (a << np.uint64(bits)) | (a >> np.uint64(64 - bits))
+
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, so each shingle hash has independent-looking bits."""
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def _to_signed(value: int) -> int:
+    # Stored in a BIGINT column
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def simhash(text: str) -> int | None:
+    """
+    64-bit SimHash of the text's lowercased 3-word shingles (signed, as
+    stored in material_chunks.simhash); None for text without words. Texts
+    differing in a few words are a few bits apart.
+    """
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return None
+    h = np.fromiter((_word_hash(w) for w in words), dtype=np.uint64, count=len(words))
+    if len(h) >= _SHINGLE:
+        h = h[: len(h) - 2] ^ _rotl(h[1 : len(h) - 1], 21) ^ _rotl(h[2:], 42)
+    with np.errstate(over="ignore"):
+        h = _mix(h)
+    bits = np.unpackbits(h.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little").sum(
+        axis=0, dtype=np.int64
+    )
+    value = int(np.packbits(bits * 2 > len(h), bitorder="little").view("<u8")[0])
+    return _to_signed(value)
+
+
+def hamming(a: int, b: int) -> int:
+    return ((a ^ b) & _M64).bit_count()
+
+
+class DuplicateMatch(NamedTuple):
+    chunk_id: uuid.UUID
+    kind: str  # "exact" (same content_hash) | "near" (SimHash within max_distance)
+
+
+class FingerprintIndex:
+    """
+    Fingerprints of one course's chunks: content_hash for exact duplicates and
+    SimHash for near duplicates. SimHashes are bucketed by more equal bands
+    than max_distance (at most 15), so any fingerprint within max_distance
+    equals a candidate in at least one band and only those are compared.
+    """
+
+    def __init__(self, max_distance: int = 6) -> None:
+        self.max_distance = max_distance
+        self._band_count = next(n for n in (2, 4, 8, 16) if n > max_distance or n == 16)
+        self._band_bits = 64 // self._band_count
+        self._exact: dict[str, uuid.UUID] = {}
+        self._bands: list[dict[int, list[tuple[int, uuid.UUID]]]] = [
+            defaultdict(list) for _ in range(self._band_count)
+        ]
+        self.size = 0
+
+    def add(self, chunk_id: uuid.UUID, content_hash: str | None, fingerprint: int | None) -> None:
+        self.size += 1
+        if content_hash:
+            self._exact.setdefault(content_hash, chunk_id)
+        if fingerprint is not None:
+            for band, key in enumerate(self._band_keys(fingerprint)):
+                self._bands[band][key].append((fingerprint, chunk_id))
+
+    def _band_keys(self, fingerprint: int) -> list[int]:
+        mask = (1 << self._band_bits) - 1
+        return [(fingerprint >> (i * self._band_bits)) & mask for i in range(self._band_count)]
+
+    def match(self, content_hash: str, fingerprint: int | None, words: int) -> DuplicateMatch | None:
+        chunk_id = self._exact.get(content_hash)
+        if chunk_id is not None:
+            return DuplicateMatch(chunk_id, "exact")
+        if fingerprint is None or words < _NEAR_MIN_WORDS or self.max_distance < 0:
+            return None
+        best: tuple[int, uuid.UUID] | None = None
+        for band, key in enumerate(self._band_keys(fingerprint)):
+            for other, other_id in self._bands[band].get(key, ()):
+                d = hamming(fingerprint, other)
+                if d <= self.max_distance and (best is None or d < best[0]):
+                    best = (d, other_id)
+        return DuplicateMatch(best[1], "near") if best else None
+
+
+def word_count(text: str) -> int:
+    return len(_WORD_RE.findall(text))
+
+
+def load_course_fingerprints(
+    db: Session,
+    course_id: uuid.UUID,
+    *,
+    exclude_material_id: uuid.UUID | None = None,
+    max_distance: int = 6,
+    batch_size: int = 1000,
+) -> FingerprintIndex:
+    """
+    The FingerprintIndex of a course's chunks (minus one material's).
+    Embedded rows only, since a match's embedding is reused. Rows stored
+    before fingerprints existed get theirs computed and saved here, once.
+    """
+    index = FingerprintIndex(max_distance)
+    conditions = [MaterialChunk.course_id == course_id, MaterialChunk.embedding.is_not(None)]
+    if exclude_material_id is not None:
+        conditions.append(MaterialChunk.material_id != exclude_material_id)
+
+    missing = db.execute(
+        select(MaterialChunk.id, MaterialChunk.text).where(*conditions, MaterialChunk.simhash.is_(None))
+    ).all()
+    for start in range(0, len(missing), batch_size):
+        rows = missing[start : start + batch_size]
+        db.execute(update(MaterialChunk), [{"id": r.id, "simhash": simhash(r.text)} for r in rows])
+        db.commit()
+
+    rows = db.execute(
+        select(MaterialChunk.id, MaterialChunk.content_hash, MaterialChunk.simhash)
+        .where(*conditions)
+        .order_by(MaterialChunk.created_at)
+    )
+    for r in rows:
+        index.add(r.id, r.content_hash, r.simhash)
+    return index
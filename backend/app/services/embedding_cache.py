@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.db import SessionLocal
+from app.models import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+_WS_RE = re.compile(r"\s+")
+_WRITE_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """NFC-normalizes, trims and collapses whitespace runs so trivially different copies share a key."""
+    return _WS_RE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def embedding_model_key() -> str:
+    """Identifies the vectors the current settings produce: model name plus output dimension."""
+    return f"{settings.gemini_embed_model}@{settings.embedding_dim}"
+
+
+class EmbeddingCacheStore:
+    """
+    Persistent embedding cache backed by the `embedding_cache` table.
+
+    Rows for models other than the configured embedding model are purged on
+    first use, so switching GEMINI_EMBED_MODEL or EMBEDDING_DIM invalidates the cache. Database
+    errors are logged and treated as misses; the cache never fails an embed call.
+    """
+
+    def __init__(self, model: str) -> None:
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._purged = False
+
+    def _purge_stale_models(self) -> None:
+        if self._purged:
+            return
+        with self._lock:
+            if self._purged:
+                return
+            self._purged = True
+        with SessionLocal() as db:
+            res = db.execute(delete(EmbeddingCache).where(EmbeddingCache.model != self.model))
+            db.commit()
+        if res.rowcount:
+            logger.info("Invalidated %d cached embeddings from other models", res.rowcount)
+
+    def get_many(self, hashes: list[str]) -> dict[str, list[float]]:
+        """Returns cached embeddings for the given hashes (missing keys are absent)."""
+        if not hashes:
+            return {}
+        found: dict[str, list[float]] = {}
+        try:
+            self._purge_stale_models()
+            with SessionLocal() as db:
+                rows = db.execute(
+                    select(EmbeddingCache.text_hash, EmbeddingCache.embedding).where(
+                        EmbeddingCache.model == self.model,
+                        EmbeddingCache.text_hash.in_(set(hashes)),
+                    )
+                ).all()
+            found = {h: [float(x) for x in emb] for h, emb in rows}
+        except Exception:
+            logger.exception("Embedding cache lookup failed; embedding without cache.")
+        hit = sum(1 for h in hashes if h in found)
+        with self._lock:
+            self.hits += hit
+            self.misses += len(hashes) - hit
+        return found
+
+    def put_many(self, items: dict[str, list[float]]) -> None:
+        if not items:
+            return
+        rows = [{"model": self.model, "text_hash": h, "embedding": e} for h, e in items.items()]
+        try:
+            with SessionLocal() as db:
+                for i in range(0, len(rows), _WRITE_BATCH):
+                    db.execute(
+                        insert(EmbeddingCache)
+                        .values(rows[i : i + _WRITE_BATCH])
+                        .on_conflict_do_nothing(index_elements=["model", "text_hash"])
+                    )
+                db.commit()
+        except Exception:
+            logger.exception("Embedding cache write failed.")
+
+    def stats(self) -> dict[str, float | int | str]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "model": self.model,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+_cache: EmbeddingCacheStore | None = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCacheStore:
+    global _cache
+    model = embedding_model_key()
+    if _cache is None or _cache.model != model:
+        with _cache_lock:
+            if _cache is None or _cache.model != model:
+                _cache = EmbeddingCacheStore(model)
+    return _cache
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from typing import TypeVar
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# HTTP status codes worth retrying: quota exhaustion and transient server errors.
+_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `rate_per_min` tokens refill continuously up to
+    `capacity`; acquire() blocks until enough tokens are available.
+    A non-positive rate disables the bucket.
+    """
+
+    def __init__(self, rate_per_min: float, capacity: float | None = None) -> None:
+        self.rate_per_s = rate_per_min / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_min
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """Blocks until `amount` tokens are taken; returns seconds spent waiting."""
+        if self.rate_per_s <= 0:
+            return 0.0
+        # A request larger than the bucket could never be served; clamp it to a full bucket.
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                delay = (amount - self._tokens) / self.rate_per_s
+            time.sleep(delay)
+            waited += delay
+
+
+class RateLimiter:
+    """Requests/min and tokens/min limits applied together."""
+
+    def __init__(self, requests_per_min: float, tokens_per_min: float) -> None:
+        self.requests = TokenBucket(requests_per_min)
+        self.tokens = TokenBucket(tokens_per_min)
+
+    def acquire(self, tokens: int) -> float:
+        return self.requests.acquire(1) + self.tokens.acquire(tokens)
+
+
+def estimate_tokens(texts: Sequence[str]) -> int:
+    """Cheap token estimate (~4 characters per token) used for tokens/min accounting."""
+    return sum(len(t) for t in texts) // 4 + len(texts)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if isinstance(code, int):
+        return code in _RETRYABLE_STATUS
+    return isinstance(exc, (TimeoutError, ConnectionError)) or type(exc).__name__ in {
+        "ConnectError",
+        "ReadTimeout",
+        "WriteTimeout",
+        "ConnectTimeout",
+        "PoolTimeout",
+        "RemoteProtocolError",
+    }
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))."""
+    return random.uniform(0.0, min(cap, base * (2**attempt)))
+
+
+class EmbeddingExecutor:
+    """
+    Runs embedding batches on a bounded worker pool under a shared rate limit,
+    retrying transient failures with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_workers: int,
+        requests_per_min: float,
+        tokens_per_min: float,
+        max_retries: int,
+        backoff_base_s: float,
+        backoff_max_s: float,
+    ) -> None:
+        self.max_workers = max(1, max_workers)
+        self.limiter = RateLimiter(requests_per_min, tokens_per_min)
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="embed")
+
+    def call(self, fn: Callable[[], T], *, tokens: int) -> T:
+        """Runs one rate-limited request, retrying retryable errors."""
+        attempt = 0
+        while True:
+            self.limiter.acquire(tokens)
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base_s, self.backoff_max_s)
+                logger.warning("Embedding request failed (%s); retry %d in %.2fs", e, attempt + 1, delay)
+                time.sleep(delay)
+                attempt += 1
+
+    def map_batches(
+        self,
+        fn: Callable[[int], T],
+        count: int,
+        on_done: Callable[[int, T], None] | None = None,
+    ) -> list[T]:
+        """
+        Runs fn(batch_index) for batch_index in range(count) on the worker pool and
+        returns results in batch order. `on_done(batch_index, result)` fires as each
+        batch completes. The first error cancels batches that have not started and
+        is re-raised.
+        """
+        if count == 0:
+            return []
+        if count == 1 or self.max_workers == 1:
+            results: list[T] = []
+            for i in range(count):
+                r = fn(i)
+                if on_done:
+                    on_done(i, r)
+                results.append(r)
+            return results
+
+        futures: dict[Future, int] = {self._pool.submit(fn, i): i for i in range(count)}
+        out: list[T | None] = [None] * count
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_EXCEPTION)
+                for f in done:
+                    i = futures[f]
+                    out[i] = f.result()
+                    if on_done:
+                        on_done(i, out[i])
+        except BaseException:
+            for f in pending:
+                f.cancel()
+            raise
+        return out  # type: ignore[return-value]
+
+
+_executor: EmbeddingExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def get_embedding_executor() -> EmbeddingExecutor:
+    """Process-wide executor so ingest, search and validation share one provider quota."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = EmbeddingExecutor(
+                    max_workers=settings.gemini_embed_max_workers,
+                    requests_per_min=settings.gemini_embed_requests_per_min,
+                    tokens_per_min=settings.gemini_embed_tokens_per_min,
+                    max_retries=settings.gemini_embed_max_retries,
+                    backoff_base_s=settings.gemini_embed_backoff_base_s,
+                    backoff_max_s=settings.gemini_embed_backoff_max_s,
+                )
+    return _executor
@@ -1,13 +1,74 @@
 from __future__ import annotations
 
+import threading
+from collections.abc import Callable
+
 from google import genai
+from google.genai import types
 
 from app.core.config import settings
+from app.services.embedding_cache import (
+    EmbeddingCacheStore,
+    embedding_model_key,
+    get_embedding_cache,
+    normalize_text,
+    text_hash,
+)
+from app.services.embedding_executor import estimate_tokens, get_embedding_executor
+from app.services.lru_cache import LRUTTLCache
+
+# Query embeddings repeat a lot across students; shared by every GeminiService instance.
+query_embedding_cache: LRUTTLCache[list[float]] = LRUTTLCache(
+    settings.query_embedding_cache_size,
+    settings.query_embedding_cache_ttl_s,
+)
+
+
+class EmbeddingBatchError(RuntimeError):
+    """Raised when one batch of an embed() call fails; carries the batch position."""
+
+    def __init__(self, batch_index: int, start: int, end: int, cause: Exception) -> None:
+        super().__init__(f"Embedding batch {batch_index} (texts {start}..{end - 1}) failed: {cause}")
+        self.batch_index = batch_index
+        self.start = start
+        self.end = end
+        self.cause = cause
+
+
+def plan_embed_batches(texts: list[str], max_items: int, max_chars: int) -> list[tuple[int, int]]:
+    """
+    Splits texts into contiguous [start, end) ranges holding at most max_items texts
+    and at most max_chars characters. A single oversized text gets a batch of its own.
+    """
+    max_items = max(1, max_items)
+    batches: list[tuple[int, int]] = []
+    start = 0
+    chars = 0
+    for i, t in enumerate(texts):
+        n = len(t)
+        if i > start and (i - start >= max_items or chars + n > max_chars):
+            batches.append((start, i))
+            start = i
+            chars = 0
+        chars += n
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def _embedding_values(emb) -> list[float]:
+    # google-genai returns ContentEmbedding objects with `.values`; normalize to python list[float]
+    return list(emb.values if hasattr(emb, "values") else emb)
 
 
 class GeminiService:
-    def __init__(self) -> None:
-        if not settings.gemini_api_key:
+    def __init__(self, client: genai.Client | None = None, cache: EmbeddingCacheStore | None = None) -> None:
+        if cache is None and settings.embedding_cache_enabled:
+            cache = get_embedding_cache()
+        self._cache = cache
+        if client is not None:
+            self._client = client
+        elif not settings.gemini_api_key:
             self._client = None
         else:
             self._client = genai.Client(api_key=settings.gemini_api_key)
@@ -15,25 +76,108 @@ class GeminiService:
     def is_configured(self) -> bool:
         return self._client is not None
 
-    def embed(self, texts: list[str]) -> list[list[float]]:
+    def embed(
+        self,
+        texts: list[str],
+        on_progress: Callable[[int, int], None] | None = None,
+    ) -> list[list[float]]:
         """
-        Returns one embedding per input text.
+        Returns one embedding per input text, in input order.
+
+        Texts already in the embedding cache are served from it; only the unique
+        misses are sent to the API and written back in bulk. Misses go out in
+        batches bounded by `gemini_embed_batch_size` and `gemini_embed_max_batch_chars`,
+        run concurrently on the shared embedding executor (rate limited, with
+        retries). `on_progress(done, total)` is called with the number of texts
+        sent to the API so far; a failing batch raises EmbeddingBatchError.
         """
         if not self._client:
             raise RuntimeError("GEMINI_API_KEY is not configured")
+        if self._cache is None or not texts:
+            return self._embed_uncached(texts, on_progress)
+
+        hashes = [text_hash(t) for t in texts]
+        cached = self._cache.get_many(hashes)
+        miss_index: dict[str, int] = {}
+        for i, h in enumerate(hashes):
+            if h not in cached and h not in miss_index:
+                miss_index[h] = i
+        if miss_index:
+            fresh = self._embed_uncached([texts[i] for i in miss_index.values()], on_progress)
+            new_items = dict(zip(miss_index, fresh, strict=True))
+            self._cache.put_many(new_items)
+            cached.update(new_items)
+        elif on_progress:
+            on_progress(len(texts), len(texts))
+        return [cached[h] for h in hashes]
+
+    def embed_query(self, query: str) -> list[float]:
+        """
+        Embeds a search/generation query, served from the in-process query cache
+        when the same normalized query was embedded recently with the same model.
+        """
+        return self.embed_queries([query])[0]
+
+    def embed_queries(self, queries: list[str]) -> list[list[float]]:
+        """embed_query() for many queries: all query-cache misses go out in one embed() call."""
+        model_key = embedding_model_key()
+        keys = [(model_key, normalize_text(q).casefold()) for q in queries]
+        out = [query_embedding_cache.get(k) for k in keys]
+        misses = [i for i, emb in enumerate(out) if emb is None]
+        if misses:
+            fresh = self.embed([queries[i] for i in misses])
+            for i, emb in zip(misses, fresh, strict=True):
+                out[i] = emb
+                query_embedding_cache.put(keys[i], emb)
+        return out
+
+    def _embed_uncached(
+        self,
+        texts: list[str],
+        on_progress: Callable[[int, int], None] | None = None,
+    ) -> list[list[float]]:
+        batches = plan_embed_batches(
+            texts,
+            settings.gemini_embed_batch_size,
+            settings.gemini_embed_max_batch_chars,
+        )
+        executor = get_embedding_executor()
+
+        def run(batch_index: int) -> list[list[float]]:
+            start, end = batches[batch_index]
+            batch = texts[start:end]
+            try:
+                return executor.call(lambda: self._embed_batch(batch), tokens=estimate_tokens(batch))
+            except Exception as e:
+                raise EmbeddingBatchError(batch_index, start, end, e) from e
+
+        done = 0
+        progress_lock = threading.Lock()
+
+        def report(batch_index: int, _result: list[list[float]]) -> None:
+            nonlocal done
+            start, end = batches[batch_index]
+            with progress_lock:
+                done += end - start
+                if on_progress:
+                    on_progress(done, len(texts))
 
         out: list[list[float]] = []
-        for t in texts:
-            res = self._client.models.embed_content(
-                model=settings.gemini_embed_model,
-                contents=t,
-            )
-            # google-genai returns a list-like embeddings field; normalize to python list[float]
-            # docs show `result.embeddings`
-            emb = res.embeddings[0].values if hasattr(res.embeddings[0], "values") else res.embeddings[0]
-            out.append(list(emb))
+        for embeddings in executor.map_batches(run, len(batches), on_done=report):
+            out.extend(embeddings)
         return out
 
+    def _embed_batch(self, batch: list[str]) -> list[list[float]]:
+        res = self._client.models.embed_content(
+            model=settings.gemini_embed_model,
+            contents=batch,
+            config=types.EmbedContentConfig(output_dimensionality=settings.embedding_dim),
+        )
+        embeddings = [_embedding_values(e) for e in (res.embeddings or [])]
+        if len(embeddings) != len(batch):
+            raise ValueError(f"expected {len(batch)} embeddings, got {len(embeddings)}")
+        return embeddings
+
     def generate_markdown(self, system: str, user: str) -> str:
         if not self._client:
             raise RuntimeError("GEMINI_API_KEY is not configured")
@@ -1,10 +1,21 @@
 from __future__ import annotations
 
+import ast
+import bisect
+import multiprocessing
 import os
 import re
-from dataclasses import dataclass
+import threading
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import NamedTuple
 
 import fitz  # pymupdf
+import numpy as np
+
+from app.core.config import settings
 
 # ---------------------------------------------------------------------------
 # Extraction
@@ -15,20 +26,156 @@ import fitz  # pymupdf
 class ExtractedDoc:
     text: str
     detected_type: str | None = None
+    # Start offset in `text` of each page (PDFs; pages are joined with PAGE_SEPARATOR)
+    page_offsets: list[int] = field(default_factory=list)
+
+
+PAGE_SEPARATOR = "\n\n"
+
+
+def pdf_page_ranges(page_count: int, parts: int) -> list[tuple[int, int]]:
+    """Splits pages [0, page_count) into at most `parts` contiguous [start, end) ranges of near-equal size."""
+    parts = max(1, min(parts, page_count))
+    size, extra = divmod(page_count, parts)
+    ranges, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _extract_pdf_range(path: str, start: int, end: int) -> list[str]:
+    """Text of pages [start, end); runs in the extraction process pool, so it opens the file itself."""
+    with fitz.open(path) as doc:
+        return [doc[i].get_text("text") for i in range(start, end)]
+
+
+_pdf_pools: dict[int, ProcessPoolExecutor] = {}
+_pdf_pool_lock = threading.Lock()
+
+
+def pdf_extract_workers() -> int:
+    return settings.pdf_extract_workers or os.cpu_count() or 1
+
+
+def get_pdf_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool of `workers` processes for page-range extraction (PyMuPDF
+    holds the GIL), one per size, created on first use. Workers are spawned,
+    not forked, so they never inherit the API's threads and locks.
+    """
+    with _pdf_pool_lock:
+        pool = _pdf_pools.get(workers)
+        if pool is None:
+            pool = _pdf_pools[workers] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return pool
+
+
+def shutdown_pdf_pools() -> None:
+    """Stops the extraction processes (app shutdown); a later extraction starts new ones."""
+    with _pdf_pool_lock:
+        pools = list(_pdf_pools.values())
+        _pdf_pools.clear()
+    for pool in pools:
+        pool.shutdown(cancel_futures=True)
 
 
-def extract_text_from_path(path: str) -> ExtractedDoc:
+def iter_pdf_pages(
+    path: str,
+    *,
+    workers: int | None = None,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> Iterator[str]:
+    """
+    Text of every page, in page order, as pages become available. Documents of
+    at least PDF_EXTRACT_MIN_PAGES pages are split into page ranges (a few per
+    worker, to even out slow pages) extracted in parallel on the process pool,
+    with at most two ranges per worker in flight so memory stays bounded;
+    `workers` (default PDF_EXTRACT_WORKERS) of 1 extracts serially in this thread.
+    """
+    workers = workers or pdf_extract_workers()
+    with fitz.open(path) as doc:
+        page_count = doc.page_count
+        if workers <= 1 or page_count < settings.pdf_extract_min_pages:
+            for i, p in enumerate(doc):
+                text = p.get_text("text")
+                if on_progress:
+                    on_progress(i + 1, page_count)
+                yield text
+            return
+
+    ranges = iter(pdf_page_ranges(page_count, workers * 4))
+    pool = get_pdf_pool(workers)
+    in_flight: deque[Future] = deque()
+    done = 0
+    try:
+        # Consumed in range order, so page order holds however the ranges finish.
+        while True:
+            while len(in_flight) < workers * 2 and (r := next(ranges, None)) is not None:
+                in_flight.append(pool.submit(_extract_pdf_range, path, *r))
+            if not in_flight:
+                return
+            pages = in_flight.popleft().result()
+            done += len(pages)
+            if on_progress:
+                on_progress(done, page_count)
+            yield from pages
+    finally:
+        for f in in_flight:
+            f.cancel()
+
+
+def extract_pdf_pages(
+    path: str,
+    *,
+    workers: int | None = None,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> list[str]:
+    """All pages of iter_pdf_pages() as a list."""
+    return list(iter_pdf_pages(path, workers=workers, on_progress=on_progress))
+
+
+def iter_document_pages(path: str, on_progress: Callable[[int, int], None] | None = None) -> Iterator[str]:
+    """Pages of a PDF as they are extracted; any other file is one page."""
+    if os.path.splitext(path)[1].lower() == ".pdf":
+        yield from iter_pdf_pages(path, on_progress=on_progress)
+        return
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        text = f.read()
+    if on_progress:
+        on_progress(1, 1)
+    yield text
+
+
+def join_pages(pages: list[str]) -> tuple[str, list[int]]:
+    """Pages joined with PAGE_SEPARATOR, and the start offset of each page in the result."""
+    offsets, pos = [], 0
+    for page in pages:
+        offsets.append(pos)
+        pos += len(page) + len(PAGE_SEPARATOR)
+    return PAGE_SEPARATOR.join(pages), offsets
+
+
+def extract_text_from_path(
+    path: str,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> ExtractedDoc:
+    """`on_progress(pages_done, pages_total)` fires as PDF pages are extracted (once for text files)."""
     ext = os.path.splitext(path)[1].lower()
 
     if ext in {".pdf"}:
-        doc = fitz.open(path)
-        pages = []
-        for p in doc:
-            pages.append(p.get_text("text"))
-        return ExtractedDoc(text="\n\n".join(pages), detected_type="pdf")
+        text, offsets = join_pages(extract_pdf_pages(path, on_progress=on_progress))
+        return ExtractedDoc(text=text, detected_type="pdf", page_offsets=offsets)
 
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        return ExtractedDoc(text=f.read(), detected_type="text")
+        text = f.read()
+    if on_progress:
+        on_progress(1, 1)
+    return ExtractedDoc(text=text, detected_type="text")
 
 
 # ---------------------------------------------------------------------------
@@ -38,11 +185,15 @@ def extract_text_from_path(path: str) -> ExtractedDoc:
 
 def _line_to_offset(text: str) -> list[int]:
     """Maps line index (0-based) -> start character offset."""
-    out: list[int] = [0]
-    for i, c in enumerate(text):
-        if c == "\n":
-            out.append(i + 1)
-    return out
+    # Newlines are found in one vectorized pass over the code points (UTF-32
+    # gives one fixed-width unit per character, so positions are str offsets).
+    codes = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    return [0, *(np.flatnonzero(codes == 0x0A) + 1).tolist()]
+
+
+def _offset_to_line(line_starts: list[int], offset: int) -> int:
+    """0-based line containing `offset`, given _line_to_offset() of the text."""
+    return max(0, bisect.bisect_right(line_starts, offset) - 1)
 
 
 def simple_chunk(text: str, max_chars: int = 1800, overlap: int = 200) -> list[str]:
@@ -66,6 +217,168 @@ def simple_chunk(text: str, max_chars: int = 1800, overlap: int = 200) -> list[s
     return chunks
 
 
+_NON_SPACE_RE = re.compile(r"\S")
+
+
+def is_markdown(path: str) -> bool:
+    return os.path.splitext(path or "")[1].lower() in {".md", ".markdown"}
+
+
+def iter_simple_chunks(pages: Iterable[str], max_chars: int = 1800, overlap: int = 200) -> Iterator[str]:
+    """
+    simple_chunk() over pages joined with PAGE_SEPARATOR, computed as pages
+    arrive: only the text from the current chunk start on is buffered, so
+    memory is bounded by max_chars plus one page, not by the document.
+    """
+    buf, first, started = "", True, False
+    for page in pages:
+        buf += page if first else PAGE_SEPARATOR + page
+        first = False
+        if not started:
+            # Leading whitespace of the document is stripped, as in simple_chunk().
+            buf = buf.lstrip()
+            started = bool(buf)
+        pos = 0
+        # A chunk is final once non-space text continues past its end.
+        while _NON_SPACE_RE.search(buf, pos + max_chars):
+            chunk = buf[pos : pos + max_chars].strip()
+            if chunk:
+                yield chunk
+            pos += max_chars - overlap
+        buf = buf[pos:]
+
+    # The rest of simple_chunk()'s loop, on the whitespace-stripped document end.
+    buf = buf.rstrip()
+    i = 0
+    while i < len(buf):
+        j = min(len(buf), i + max_chars)
+        chunk = buf[i:j].strip()
+        if chunk:
+            yield chunk
+        if j >= len(buf):
+            break
+        i = max(0, j - overlap)
+
+
+@dataclass
+class ProseChunk:
+    text: str
+    page_start: int  # 1-based pages of the document the chunk's text comes from
+    page_end: int
+
+
+class _ProseUnit(NamedTuple):
+    text: str
+    tokens: int
+    page: int
+    paragraph_start: bool
+
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+# A token per punctuation mark and per started 6-character run of a word
+_TOKEN_RE = re.compile(r"\w{1,6}|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Fast approximation of the embedding model's token count (within ~10% of
+    SentencePiece counts on English prose; errs high on long or rare words).
+    """
+    return len(_TOKEN_RE.findall(text))
+
+
+def _split_sentence(sentence: str, max_tokens: int) -> Iterator[str]:
+    """Pieces of an over-budget sentence, cut between words (inside a word only when it alone is over budget)."""
+    piece: list[str] = []
+    size = 0
+    for word in sentence.split():
+        n = estimate_tokens(word)
+        if piece and size + n > max_tokens:
+            yield " ".join(piece)
+            piece, size = [], 0
+        if n > max_tokens:
+            start = 0
+            ends = [m.end() for m in _TOKEN_RE.finditer(word)][max_tokens - 1 :: max_tokens]
+            for end in [*ends, len(word)]:
+                if end > start:
+                    yield word[start:end]
+                start = end
+            continue
+        piece.append(word)
+        size += n
+    if piece:
+        yield " ".join(piece)
+
+
+def _prose_units(pages: Iterable[str], max_tokens: int) -> Iterator[_ProseUnit]:
+    """Sentences (or pieces of over-budget ones) with their token estimate and page, in order."""
+    for page_no, page in enumerate(pages, start=1):
+        for paragraph in _PARAGRAPH_RE.split(page):
+            first = True
+            for sentence in _SENTENCE_END_RE.split(paragraph.strip()):
+                if not sentence:
+                    continue
+                tokens = estimate_tokens(sentence)
+                pieces = [sentence] if tokens <= max_tokens else list(_split_sentence(sentence, max_tokens))
+                for piece in pieces:
+                    yield _ProseUnit(piece, tokens if len(pieces) == 1 else estimate_tokens(piece), page_no, first)
+                    first = False
+
+
+def _join_units(units: list[_ProseUnit]) -> ProseChunk:
+    parts = [units[0].text]
+    for u in units[1:]:
+        parts.append("\n\n" if u.paragraph_start else " ")
+        parts.append(u.text)
+    return ProseChunk(text="".join(parts), page_start=units[0].page, page_end=units[-1].page)
+
+
+def iter_prose_chunks(
+    pages: Iterable[str],
+    max_tokens: int | None = None,
+    overlap_tokens: int | None = None,
+) -> Iterator[ProseChunk]:
+    """
+    Prose chunks of at most max_tokens (estimate_tokens; default
+    PROSE_CHUNK_TOKENS) made of whole sentences, computed as pages arrive.
+    A full chunk ends at its last paragraph break when that keeps at least
+    half the budget, else at a sentence boundary; in the latter case the next
+    chunk repeats up to overlap_tokens of trailing sentences. Paragraphs and
+    sentences within a paragraph are rejoined with a blank line and a space.
+    """
+    max_tokens = max_tokens or settings.prose_chunk_tokens
+    overlap_tokens = settings.prose_chunk_overlap_tokens if overlap_tokens is None else overlap_tokens
+    buf: list[_ProseUnit] = []
+    size = carried = 0
+    for unit in _prose_units(pages, max_tokens):
+        while buf and size + unit.tokens > max_tokens:
+            cut, acc = len(buf), 0
+            for i, u in enumerate(buf):
+                if i and u.paragraph_start and acc * 2 >= max_tokens:
+                    cut = i
+                acc += u.tokens
+            yield _join_units(buf[:cut])
+            carry: list[_ProseUnit] = []
+            if cut == len(buf) and not unit.paragraph_start:
+                budget = min(overlap_tokens, max_tokens - unit.tokens)
+                for u in reversed(buf[1:]):
+                    if u.tokens > budget:
+                        break
+                    carry.insert(0, u)
+                    budget -= u.tokens
+            buf = carry + buf[cut:]
+            size = sum(u.tokens for u in buf)
+            carried = len(carry)
+        buf.append(unit)
+        size += unit.tokens
+    if len(buf) > carried:
+        yield _join_units(buf)
+
+
+_MD_SECTION_RE = re.compile(r"#{2,3}\s")
+
+
 def chunk_theory_improved(text: str, path: str = "") -> list[str]:
     """
     Heading-aware for Markdown (split by ## or ###); otherwise simple_chunk.
@@ -74,13 +387,12 @@ def chunk_theory_improved(text: str, path: str = "") -> list[str]:
     if not t:
         return []
 
-    ext = os.path.splitext(path)[1].lower() if path else ""
-    if ext in {".md", ".markdown"}:
+    if is_markdown(path):
         # Split by ## or ###, keep header with following content
         parts: list[str] = []
         current: list[str] = []
         for line in t.split("\n"):
-            if re.match(r"^#{2,3}\s", line):
+            if _MD_SECTION_RE.match(line):
                 if current:
                     parts.append("\n".join(current))
                 current = [line]
@@ -122,43 +434,49 @@ class CodeChunk:
 
 
 # Patterns: (regex for boundary, group index for symbol name, or None)
-_CODE_PATTERNS: dict[str, list[tuple[str, int | None]]] = {
+# Repeated classes match within a line ([ \t], not \s): one spanning newlines rescans the
+# rest of the file from every line that does not start a definition (quadratic on comments).
+_CODE_PATTERNS: dict[str, list[tuple[re.Pattern[str], int | None]]] = {
     "python": [
-        (r"(?:^|\n)(async\s+)?def\s+(\w+)\s*\(", 2),
-        (r"(?:^|\n)class\s+(\w+)\s*[:(]", 1),
+        (re.compile(r"(?:^|\n)(async\s+)?def\s+(\w+)\s*\("), 2),
+        (re.compile(r"(?:^|\n)class\s+(\w+)\s*[:(]"), 1),
     ],
     "javascript": [
-        (r"\nfunction\s+(\w+)\s*\(", 1),
-        (r"\nclass\s+(\w+)\s*[\s{]", 1),
-        (r"\n(const|let|var)\s+(\w+)\s*=\s*(?:async\s+)?function", 2),
+        (re.compile(r"\nfunction\s+(\w+)\s*\("), 1),
+        (re.compile(r"\nclass\s+(\w+)\s*[\s{]"), 1),
+        (re.compile(r"\n(const|let|var)\s+(\w+)\s*=\s*(?:async\s+)?function"), 2),
     ],
     "typescript": [
-        (r"\nfunction\s+(\w+)\s*\(", 1),
-        (r"\nclass\s+(\w+)\s*[\s{]", 1),
-        (r"\n(const|let|var)\s+(\w+)\s*=\s*(?:async\s+)?function", 2),
-        (r"\n(?:export\s+)?(?:async\s+)?function\s+(\w+)\s*\(", 1),
+        (re.compile(r"\nfunction\s+(\w+)\s*\("), 1),
+        (re.compile(r"\nclass\s+(\w+)\s*[\s{]"), 1),
+        (re.compile(r"\n(const|let|var)\s+(\w+)\s*=\s*(?:async\s+)?function"), 2),
+        (re.compile(r"\n(?:export\s+)?(?:async\s+)?function\s+(\w+)\s*\("), 1),
     ],
     "java": [
-        (r"\n(?:public|private|protected)?\s*(?:static\s+)?[\w<>\[\],\s]+\s+(\w+)\s*\(", 1),
-        (r"\n(?:public\s+)?class\s+(\w+)\s*[\s{]", 1),
+        (re.compile(r"\n[ \t]*(?:(?:public|private|protected)[ \t]+)?(?:static[ \t]+)?[\w<>\[\], \t]+[ \t](\w+)[ \t]*\("), 1),
+        (re.compile(r"\n(?:public\s+)?class\s+(\w+)\s*[\s{]"), 1),
     ],
     "c": [
-        (r"\n(?:static\s+)?[\w\s\*]+\s+(\w+)\s*\(", 1),
+        # The return type may sit on the line above the name (GNU style)
+        (re.compile(r"\n(?:static[ \t]+)?[\w \t\*]+(?:[ \t]|[ \t\*]*\n)(\w+)[ \t]*\("), 1),
     ],
     "cpp": [
-        (r"\n(?:[\w:\s]+)\s+(\w+)\s*\(", 1),
-        (r"\nclass\s+(\w+)\s*[\s{]", 1),
+        (re.compile(r"\n[\w: \t]+[ \t](\w+)[ \t]*\("), 1),
+        (re.compile(r"\nclass\s+(\w+)\s*[\s{]"), 1),
     ],
     "go": [
-        (r"\nfunc\s+(?:\([^)]+\)\s+)?(\w+)\s*\(", 1),
+        (re.compile(r"\nfunc\s+(?:\([^)]+\)\s+)?(\w+)\s*\("), 1),
     ],
     "rust": [
-        (r"\n(?:pub\s+)?fn\s+(\w+)\s*\(", 1),
-        (r"\n(?:pub\s+)?struct\s+(\w+)\s*[\s{]", 1),
-        (r"\n(?:pub\s+)?impl\s+(\w+)\s*[\s{]", 1),
+        (re.compile(r"\n(?:pub\s+)?fn\s+(\w+)\s*\("), 1),
+        (re.compile(r"\n(?:pub\s+)?struct\s+(\w+)\s*[\s{]"), 1),
+        (re.compile(r"\n(?:pub\s+)?impl\s+(\w+)\s*[\s{]"), 1),
     ],
 }
 
+# Captured "symbols" that are really modifiers or keywords
+_NOT_SYMBOLS = frozenset({"async", "const", "let", "var", "export", "pub", "static", "public", "private", "protected"})
+
 _EXT_TO_LANG: dict[str, str] = {
     ".py": "python",
     ".js": "javascript",
@@ -193,14 +511,14 @@ def _code_boundaries(text: str, language: str) -> list[tuple[int, int, str | Non
 
     by_start: dict[int, str | None] = {}
     for pat, grp in patterns:
-        for m in re.finditer(pat, text):
+        for m in pat.finditer(text):
             sym = None
             if grp is not None and m.lastindex is not None and grp <= m.lastindex:
                 try:
                     sym = m.group(grp)
                 except IndexError:
                     pass
-            if sym and re.match(r"^(async|const|let|var|export|pub|static|public|private|protected)$", sym):
+            if sym in _NOT_SYMBOLS:
                 sym = None
             s = m.start()
             if s not in by_start:
@@ -222,32 +540,142 @@ def _code_boundaries(text: str, language: str) -> list[tuple[int, int, str | Non
     return out
 
 
+_PY_DEFS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+def _py_first_line(node: ast.stmt) -> int:
+    decorators = getattr(node, "decorator_list", [])
+    return min([node.lineno, *(d.lineno for d in decorators)])
+
+
+def _py_spans(body: list[ast.stmt], scope: str | None) -> Iterator[tuple[int, int, str | None, list[ast.stmt]]]:
+    """
+    (first_line, end_line, symbol_name, statements) in source order: one per
+    function / method, one per class header (class line up to its first
+    definition) and one per run of other statements, named after `scope`.
+    Classes containing definitions are descended into (`Class.method`).
+    """
+    run: list[ast.stmt] = []
+    for node in body:
+        if not isinstance(node, _PY_DEFS):
+            run.append(node)
+            continue
+        if run:
+            yield run[0].lineno, run[-1].end_lineno or run[-1].lineno, scope, run
+            run = []
+        name = f"{scope}.{node.name}" if scope else node.name
+        if isinstance(node, ast.ClassDef) and any(isinstance(c, _PY_DEFS) for c in node.body):
+            inner = list(_py_spans(node.body, name))
+            first, end, symbol, stmts = inner[0]
+            if symbol == name:
+                # Docstring and attributes before the first method join the class line.
+                inner[0] = (_py_first_line(node), end, name, stmts)
+            elif first > _py_first_line(node):
+                inner.insert(0, (_py_first_line(node), first - 1, name, []))
+            yield from inner
+        else:
+            yield _py_first_line(node), node.end_lineno or node.lineno, name, [node]
+    if run:
+        yield run[0].lineno, run[-1].end_lineno or run[-1].lineno, scope, run
+
+
+def _split_lines(lines: list[str], start: int, end: int, breaks: list[int], max_chars: int) -> list[tuple[int, int]]:
+    """
+    Splits 1-based lines start..end into ranges of at most max_chars, cutting
+    at the `breaks` (statement first lines) and only within a statement when
+    it alone is over budget.
+    """
+    bounds = sorted({b for b in breaks if start < b <= end})
+    pieces: list[tuple[int, int]] = []
+    piece_start, size = start, 0
+    for s, e in zip([start, *bounds], [b - 1 for b in bounds] + [end]):
+        seg = sum(len(lines[i]) + 1 for i in range(s - 1, e))
+        if size and size + seg > max_chars:
+            pieces.append((piece_start, s - 1))
+            piece_start, size = s, 0
+        if seg <= max_chars:
+            size += seg
+            continue
+        for i in range(s, e + 1):
+            n = len(lines[i - 1]) + 1
+            if size and size + n > max_chars:
+                pieces.append((piece_start, i - 1))
+                piece_start, size = i, 0
+            size += n
+    pieces.append((piece_start, end))
+    return pieces
+
+
+def chunk_python_ast(text: str, max_chars: int | None = None) -> list[CodeChunk] | None:
+    """
+    Python chunking on the stdlib ast: a chunk per function, method
+    (`Class.method`) and class header, plus chunks for the module-level code
+    between them, with exact 1-based line ranges. Comments and blank lines
+    above a definition belong to it. Chunks over max_chars (default
+    CODE_CHUNK_MAX_CHARS) are split at statement boundaries and keep their
+    symbol_name. Returns None when the source does not parse.
+    """
+    max_chars = max_chars or settings.code_chunk_max_chars
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError, RecursionError):
+        return None
+    spans = list(_py_spans(tree.body, None))
+    if not spans:
+        return None
+
+    lines = text.split("\n")
+    chunks: list[CodeChunk] = []
+    prev_end = 0
+    for i, (_, end, symbol, stmts) in enumerate(spans):
+        # Spans tile the file, so lines between statements are never dropped.
+        start = prev_end + 1
+        if i == len(spans) - 1:
+            end = len(lines)
+        prev_end = end
+        while start <= end and not lines[start - 1].strip():
+            start += 1
+        while end >= start and not lines[end - 1].strip():
+            end -= 1
+        if start > end:
+            continue
+        pieces = [(start, end)]
+        if sum(len(line) + 1 for line in lines[start - 1 : end]) > max_chars:
+            breaks = [n.lineno for stmt in stmts for n in ast.walk(stmt) if isinstance(n, ast.stmt)]
+            pieces = _split_lines(lines, start, end, breaks, max_chars)
+        for s, e in pieces:
+            segment = "\n".join(lines[s - 1 : e]).rstrip()
+            if not segment.strip() or (len(segment.strip()) < 15 and symbol is None):
+                continue
+            chunks.append(CodeChunk(text=segment, language="python", symbol_name=symbol, start_line=s, end_line=e))
+    return chunks or None
+
+
 def chunk_code_structure(text: str, path: str) -> list[CodeChunk]:
     """
     Structure-aware chunking for code. Splits by def/class/function (etc.),
-    extracts symbol names, computes line ranges.
+    extracts symbol names, computes line ranges. Python goes through
+    chunk_python_ast and falls back to the patterns if it does not parse.
     """
     t = (text or "").strip()
     if not t:
         return []
 
     lang = _infer_language(path)
+    if lang == "python":
+        ast_chunks = chunk_python_ast(text)
+        if ast_chunks is not None:
+            return ast_chunks
     lines = _line_to_offset(t)
 
-    def offset_to_line(offset: int) -> int:
-        for i, o in enumerate(lines):
-            if o > offset:
-                return max(0, i - 1)
-        return max(0, len(lines) - 1)
-
     boundaries = _code_boundaries(t, lang)
     chunks: list[CodeChunk] = []
     for start, end, sym in boundaries:
         segment = t[start:end].strip()
         if not segment or (len(segment) < 15 and sym is None):
             continue
-        sl = offset_to_line(start)
-        el = offset_to_line(end - 1) if end <= len(t) else offset_to_line(len(t) - 1)
+        sl = _offset_to_line(lines, start)
+        el = _offset_to_line(lines, min(end, len(t)) - 1)
         chunks.append(
             CodeChunk(
                 text=segment,
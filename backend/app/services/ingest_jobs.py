@@ -0,0 +1,683 @@
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import asdict, dataclass
+from typing import NamedTuple
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import SessionLocal
+from app.models import IngestJob, Material, MaterialChunk
+from app.services.chunk_copy import insert_chunks
+from app.services.dedup import FingerprintIndex, load_course_fingerprints, simhash, word_count
+from app.services.embedding_cache import get_embedding_cache
+from app.services.gemini import GeminiService
+from app.services.ingest import (
+    PAGE_SEPARATOR,
+    chunk_code_structure,
+    chunk_theory_improved,
+    is_code_material,
+    is_markdown,
+    iter_document_pages,
+    iter_prose_chunks,
+)
+from app.services.pipeline import batched, prefetch
+from app.services.quantization import quantize_material
+from app.services.search_cache import bump_corpus_version
+from app.services.vector_index import get_vector_index
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+# Minimum seconds between progress writes within a stage (stage changes are always written)
+_PROGRESS_INTERVAL_S = 0.5
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once cancellation was requested."""
+
+
+class JobSuperseded(Exception):
+    """
+    Raised inside a running job whose row no longer belongs to it: it was
+    requeued as stale (and maybe claimed again), or deleted. The runner stops
+    without writing anything.
+    """
+
+
+class ClaimedJob(NamedTuple):
+    id: uuid.UUID
+    attempt: int  # IngestJob.attempts at claim time; fences out earlier runners
+
+
+def _now() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+# ---------------------------------------------------------------------------
+# Queue operations (called from request handlers and workers)
+# ---------------------------------------------------------------------------
+
+
+def _active_job(db: Session, material_id: uuid.UUID) -> IngestJob | None:
+    return db.execute(
+        select(IngestJob)
+        .where(IngestJob.material_id == material_id, IngestJob.status.in_(ACTIVE_STATUSES))
+        .order_by(IngestJob.created_at.desc())
+        .limit(1)
+    ).scalar_one_or_none()
+
+
+def enqueue_ingest(db: Session, material: Material, created_by: str | None = None) -> IngestJob:
+    """
+    Queues an ingest of `material`, or returns its job that is already queued
+    or running. ix_ingest_jobs_active_material allows one such job per
+    material, so a concurrent request that queued one first wins.
+    """
+    active = _active_job(db, material.id)
+    if active is not None:
+        return active
+    job = IngestJob(material_id=material.id, created_by=created_by)
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        active = _active_job(db, material.id)
+        if active is None:
+            raise
+        return active
+    db.refresh(job)
+    get_ingest_workers().notify()
+    return job
+
+
+def cancel_job(db: Session, job: IngestJob) -> bool:
+    """
+    A queued job is cancelled at once; a running one is flagged and stops at its
+    next progress check. Returns False when the job has already finished.
+    """
+    if job.status == "queued":
+        job.status, job.finished_at = "cancelled", _now()
+    elif job.status == "running":
+        job.cancel_requested = True
+    else:
+        return False
+    db.commit()
+    db.refresh(job)
+    return True
+
+
+def retry_job(db: Session, job: IngestJob) -> IngestJob | None:
+    """
+    Requeues a failed or cancelled job and returns it, or returns the
+    material's job that is already queued or running instead (two jobs for one
+    material would both insert its new chunks). None when `job` has not
+    stopped. The retry resumes the embed stage where the failed attempt
+    stopped: run_job checkpoints every embedded batch in the embedding cache,
+    so only extraction (local) is replayed. Nothing was written (the write
+    stage commits once, at the end).
+    """
+    if job.status not in ("failed", "cancelled"):
+        return None
+    active = _active_job(db, job.material_id)
+    if active is not None:
+        return active
+    job.status, job.error, job.cancel_requested, job.finished_at = "queued", None, False, None
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        active = _active_job(db, job.material_id)
+        if active is None:
+            raise
+        return active
+    db.refresh(job)
+    get_ingest_workers().notify()
+    return job
+
+
+def build_claim_query():
+    """The oldest queued job, row-locked so concurrent workers (threads or processes) skip it."""
+    return (
+        select(IngestJob)
+        .where(IngestJob.status == "queued")
+        .order_by(IngestJob.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def build_fence_query(job_id: uuid.UUID, attempt: int):
+    """The job's row if `attempt` still owns it (running, not claimed again), row-locked."""
+    return (
+        select(IngestJob.id)
+        .where(IngestJob.id == job_id, IngestJob.attempts == attempt, IngestJob.status == "running")
+        .with_for_update()
+    )
+
+
+def claim_next_job(db: Session, worker: str) -> ClaimedJob | None:
+    """
+    Marks the oldest queued job as running on `worker` and returns it with its
+    attempt number. Running jobs whose heartbeat is older than
+    INGEST_JOB_STALE_S (their worker died or stalled) are put back in the
+    queue first; claiming bumps `attempts`, so a stalled runner that wakes up
+    fails its next fenced write (JobProgress) and stops.
+    """
+    stale_before = _now() - dt.timedelta(seconds=settings.ingest_job_stale_s)
+    db.execute(
+        update(IngestJob)
+        .where(IngestJob.status == "running", IngestJob.heartbeat_at < stale_before)
+        .values(status="queued", worker=None)
+    )
+    job = db.execute(build_claim_query()).scalar_one_or_none()
+    if job is None:
+        db.commit()
+        return None
+    now = _now()
+    job.status, job.worker, job.started_at, job.heartbeat_at = "running", worker, now, now
+    job.attempts += 1
+    db.commit()
+    return ClaimedJob(job.id, job.attempts)
+
+
+# ---------------------------------------------------------------------------
+# Running a job
+# ---------------------------------------------------------------------------
+
+
+class JobProgress:
+    """
+    Writes a running job's progress (and heartbeat) in short transactions of
+    its own, at most every _PROGRESS_INTERVAL_S unless forced, and raises
+    JobCancelled when cancellation has been requested. Every write is fenced
+    on the attempt number: once the row was requeued or claimed again, it
+    raises JobSuperseded instead.
+    """
+
+    def __init__(self, job_id: uuid.UUID, attempt: int) -> None:
+        self.job_id = job_id
+        self.attempt = attempt
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, force: bool = False, **values) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last < _PROGRESS_INTERVAL_S:
+                return
+            self._last = now
+            with SessionLocal() as db:
+                cancel = db.execute(
+                    update(IngestJob)
+                    .where(
+                        IngestJob.id == self.job_id,
+                        IngestJob.attempts == self.attempt,
+                        IngestJob.status == "running",
+                    )
+                    .values(heartbeat_at=_now(), **values)
+                    .returning(IngestJob.cancel_requested)
+                ).scalar_one_or_none()
+                db.commit()
+        if cancel is None:
+            raise JobSuperseded()
+        if cancel:
+            raise JobCancelled()
+
+    def check(self) -> None:
+        self.update(force=True)
+
+    def fence(self, db: Session) -> None:
+        """
+        Locks the job's row in `db`'s transaction, or raises JobSuperseded. The
+        lock holds off a stale requeue until that transaction ends, so the
+        attempt still owns the job when its writes commit.
+        """
+        if db.execute(build_fence_query(self.job_id, self.attempt)).first() is None:
+            raise JobSuperseded()
+
+
+def _finish(job: ClaimedJob, status: str, **values) -> None:
+    with SessionLocal() as db:
+        db.execute(
+            update(IngestJob)
+            .where(IngestJob.id == job.id, IngestJob.attempts == job.attempt, IngestJob.status == "running")
+            .values(status=status, finished_at=_now(), heartbeat_at=_now(), **values)
+        )
+        db.commit()
+
+
+def iter_chunks(material: Material, progress: JobProgress) -> Iterator[dict]:
+    """
+    Extract stage: chunks (as MaterialChunk column values) as pages come out of
+    extraction, which runs ahead on its own thread by up to INGEST_QUEUE_SIZE
+    pages. PDFs (with page numbers) and plain text are chunked incrementally;
+    Markdown and code are chunked whole, since their chunkers need the full
+    file.
+    """
+    path = material.storage_path or ""
+    pages = prefetch(
+        iter_document_pages(path, on_progress=lambda done, total: progress.update(pages_extracted=done, pages_total=total)),
+        settings.ingest_queue_size,
+        name="ingest-extract",
+    )
+    if is_code_material(material.type or "", path):
+        yield from (asdict(c) for c in chunk_code_structure(PAGE_SEPARATOR.join(pages), path))
+    elif is_markdown(path):
+        yield from ({"text": t} for t in chunk_theory_improved(PAGE_SEPARATOR.join(pages), path))
+    elif os.path.splitext(path)[1].lower() == ".pdf":
+        yield from (asdict(c) for c in iter_prose_chunks(pages))
+    else:
+        yield from ({"text": c.text} for c in iter_prose_chunks(pages))
+    progress.update(force=True, stage="embed")
+
+
+def chunk_hash(text: str) -> str:
+    """content_hash of a chunk: sha256 of its exact text (whitespace edits count as changes)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# Where a chunk sits in its material, besides chunk_index; updated in place on kept rows
+_POSITION_COLUMNS = ("start_line", "end_line", "page_start", "page_end")
+
+
+class ExistingChunk(NamedTuple):
+    id: uuid.UUID
+    chunk_index: int
+    start_line: int | None
+    end_line: int | None
+    page_start: int | None
+    page_end: int | None
+
+
+def load_existing_chunks(db: Session, material_id: uuid.UUID) -> dict[str, deque[ExistingChunk]]:
+    """The material's current rows by content_hash (in chunk order; repeated texts share a hash)."""
+    rows = db.execute(
+        select(
+            MaterialChunk.content_hash,
+            MaterialChunk.id,
+            MaterialChunk.chunk_index,
+            MaterialChunk.start_line,
+            MaterialChunk.end_line,
+            MaterialChunk.page_start,
+            MaterialChunk.page_end,
+        )
+        .where(MaterialChunk.material_id == material_id)
+        .order_by(MaterialChunk.chunk_index)
+    ).all()
+    existing: dict[str, deque[ExistingChunk]] = defaultdict(deque)
+    for r in rows:
+        existing[r.content_hash].append(
+            ExistingChunk(r.id, r.chunk_index, r.start_line, r.end_line, r.page_start, r.page_end)
+        )
+    return existing
+
+
+@dataclass
+class PlannedChunk:
+    """One chunk of the new chunk list and what the write stage does with it."""
+
+    index: int
+    values: dict  # MaterialChunk column values from the chunker, plus content_hash / simhash
+    existing_id: uuid.UUID | None = None  # unchanged text: this row is kept and not re-embedded
+    moved: bool = False  # kept row whose chunk_index, line or page range changes
+    # New chunk repeating another material's chunk: "exact" | "near" (mark_duplicates)
+    duplicate: str | None = None
+    duplicate_of: uuid.UUID | None = None  # that chunk, whose embedding is reused
+    skip: bool = False  # duplicate that is not stored (INGEST_DEDUP=skip)
+
+    @property
+    def is_new(self) -> bool:
+        """Inserted by the write stage."""
+        return self.existing_id is None and not self.skip
+
+
+def plan_chunks(chunks: Iterable[dict], existing: dict[str, deque[ExistingChunk]]) -> Iterator[PlannedChunk]:
+    """
+    Diffs the new chunk list against the material's rows: a chunk whose text
+    matches a row not yet claimed keeps that row. Rows left in `existing`
+    afterwards are no longer part of the material.
+    """
+    for index, values in enumerate(chunks):
+        values = {**values, "content_hash": chunk_hash(values["text"])}
+        rows = existing.get(values["content_hash"])
+        if not rows:
+            values["simhash"] = simhash(values["text"])
+            yield PlannedChunk(index, values)
+            continue
+        row = rows.popleft()
+        moved = tuple(row[1:]) != (index, *(values.get(c) for c in _POSITION_COLUMNS))
+        yield PlannedChunk(index, values, existing_id=row.id, moved=moved)
+
+
+def mark_duplicates(
+    planned: Iterable[PlannedChunk], index: FingerprintIndex | None, policy: str
+) -> Iterator[PlannedChunk]:
+    """
+    Flags new chunks that repeat another chunk of the course (same
+    content_hash, or SimHash within INGEST_DEDUP_MAX_DISTANCE): with policy
+    "reuse" they are stored with its embedding, with "skip" not at all.
+    `index` holds the other materials' chunks; every chunk this material keeps
+    or stores is added to it as the job goes, so repeats within the material
+    are caught too. New chunks get their row id here for that. A repeat of a
+    chunk this job inserts is embedded all the same (its source is not
+    committed yet), which the embedding cache makes free for exact repeats.
+    """
+    for p in planned:
+        if index is None:
+            yield p
+            continue
+        if p.existing_id is None:
+            match = index.match(p.values["content_hash"], p.values.get("simhash"), word_count(p.values["text"]))
+            if match is not None:
+                p.duplicate_of, p.duplicate = match
+                p.skip = policy == "skip"
+        if p.existing_id is not None:
+            index.add(p.existing_id, p.values["content_hash"], simhash(p.values["text"]))
+        elif not p.skip:
+            p.values.setdefault("id", uuid.uuid4())
+            index.add(p.values["id"], p.values["content_hash"], p.values.get("simhash"))
+        yield p
+
+
+def _load_embeddings(ids: list[uuid.UUID]) -> dict[uuid.UUID, list[float]]:
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(MaterialChunk.id, MaterialChunk.embedding).where(
+                MaterialChunk.id.in_(ids), MaterialChunk.embedding.is_not(None)
+            )
+        )
+        return {r.id: r.embedding for r in rows}
+
+
+def embed_batches(
+    gemini: GeminiService,
+    batches: Iterable[list[PlannedChunk]],
+    progress: JobProgress,
+    load_embeddings: Callable[[list[uuid.UUID]], dict] | None = None,
+) -> Iterator[tuple[list[PlannedChunk], list[list[float]]]]:
+    """
+    Embed stage: each batch with the embeddings of the chunks it inserts
+    (PlannedChunk.is_new, in order). Duplicates take the embedding of the
+    chunk they repeat (via `load_embeddings`, ids -> embedding) unless it is
+    gone; the rest are embedded. Every batch lands in the embedding cache as
+    it finishes, so a retried job does not re-embed it.
+    """
+    seen = embedded = 0
+    for batch in batches:
+        seen += len(batch)
+        progress.update(force=True, chunks_total=seen)
+        new = [p for p in batch if p.is_new]
+        source_ids = [p.duplicate_of for p in new if p.duplicate_of is not None]
+        reused = load_embeddings(source_ids) if source_ids and load_embeddings else {}
+        texts = [p.values["text"] for p in new if p.duplicate_of not in reused]
+        fresh = iter(
+            gemini.embed(
+                texts, on_progress=lambda n, _total, base=embedded: progress.update(chunks_embedded=base + n)
+            )
+            if texts
+            else []
+        )
+        embedded += len(texts)
+        yield batch, [reused[p.duplicate_of] if p.duplicate_of in reused else next(fresh) for p in new]
+    progress.update(force=True, stage="write", chunks_embedded=embedded)
+
+
+class IngestCounts(NamedTuple):
+    kept: int
+    added: int
+    removed: int
+    duplicates_exact: int = 0
+    duplicates_near: int = 0
+    duplicates_skipped: int = 0
+
+
+def write_batches(
+    db: Session,
+    material: Material,
+    batches: Iterable[tuple[list[PlannedChunk], list[list[float]]]],
+    existing: dict[str, deque[ExistingChunk]],
+    progress: JobProgress,
+) -> IngestCounts:
+    """
+    Write stage: applies the diff as batches arrive, in one transaction
+    (searches see the old chunk set until it commits): new chunks are
+    inserted (binary COPY, see insert_chunks), moved ones get their new
+    chunk_index / line and page range, and rows left unclaimed in `existing`
+    once the stream ends are deleted. The commit is fenced on the job's
+    attempt (JobProgress.fence). Then refreshes the derived search data if
+    anything changed.
+    """
+    kept = added = written = exact = near = skipped = 0
+    for batch, embeddings in batches:
+        new = [p for p in batch if p.is_new]
+        moved = [p for p in batch if p.moved]
+        if new:
+            insert_chunks(
+                db,
+                [
+                    dict(
+                        material_id=material.id,
+                        course_id=material.course_id,
+                        category=material.category,
+                        chunk_index=p.index,
+                        embedding=emb,
+                        **p.values,
+                    )
+                    for p, emb in zip(new, embeddings, strict=True)
+                ],
+            )
+        if moved:
+            db.execute(
+                update(MaterialChunk),
+                [
+                    dict(id=p.existing_id, chunk_index=p.index, **{c: p.values.get(c) for c in _POSITION_COLUMNS})
+                    for p in moved
+                ],
+            )
+        kept += sum(p.existing_id is not None for p in batch)
+        added += len(new)
+        written += len(new) + len(moved)
+        exact += sum(p.duplicate == "exact" for p in batch)
+        near += sum(p.duplicate == "near" for p in batch)
+        skipped += sum(p.skip for p in batch)
+        progress.update(
+            rows_written=written,
+            chunks_kept=kept,
+            chunks_added=added,
+            duplicates_exact=exact,
+            duplicates_near=near,
+            duplicates_skipped=skipped,
+        )
+    if not kept + added + skipped:
+        raise ValueError("No extractable text found")
+
+    removed = [row.id for rows in existing.values() for row in rows]
+    for ids in batched(removed, 1000):
+        db.query(MaterialChunk).filter(MaterialChunk.id.in_(ids)).delete(synchronize_session=False)
+    counts = IngestCounts(kept, added, len(removed), exact, near, skipped)
+    if not written and not removed:
+        db.rollback()
+        return counts
+    progress.fence(db)
+    # Compact copies in the same transaction, so the coarse ANN stage reaches the new chunks on commit.
+    quantize_material(db, material.id)
+    bumps = [bump_corpus_version(db, material.course_id)]
+    db.commit()
+    if settings.search_backend == "numpy":
+        get_vector_index().refresh_material(db, material.course_id, material.id, bumps)
+    return counts
+
+
+def run_job(claimed: ClaimedJob) -> None:
+    """
+    Runs a claimed job as a streaming pipeline: extraction, chunking plus
+    embedding, and writing each run on their own thread, connected by queues of
+    INGEST_QUEUE_SIZE pages / batches of INGEST_BATCH_SIZE chunks, so memory is
+    bounded by the batch size rather than the document size. Chunks whose text
+    the material already has keep their rows and embeddings (plan_chunks);
+    duplicates of other materials' chunks are handled per INGEST_DEDUP.
+    Embedded batches are always checkpointed in the embedding cache, which is
+    what lets a retry (retry_job) resume the embed stage.
+    """
+    job_id = claimed.id
+    progress = JobProgress(job_id, claimed.attempt)
+    with SessionLocal() as db:
+        job = db.get(IngestJob, job_id)
+        material = db.get(Material, job.material_id) if job is not None else None
+        if job is None or material is None:
+            return
+        try:
+            if not material.storage_path:
+                raise ValueError("Link-only materials cannot be ingested")
+            gemini = GeminiService(cache=get_embedding_cache())
+            if not gemini.is_configured():
+                raise ValueError("GEMINI_API_KEY is not configured")
+
+            progress.update(
+                force=True,
+                stage="extract",
+                pages_extracted=0,
+                chunks_embedded=0,
+                rows_written=0,
+                chunks_kept=0,
+                chunks_added=0,
+                chunks_removed=0,
+                duplicates_exact=0,
+                duplicates_near=0,
+                duplicates_skipped=0,
+            )
+            existing = load_existing_chunks(db, material.id)
+            fingerprints = None
+            if settings.ingest_dedup != "off":
+                fingerprints = load_course_fingerprints(
+                    db,
+                    material.course_id,
+                    exclude_material_id=material.id,
+                    max_distance=settings.ingest_dedup_max_distance,
+                )
+            planned = mark_duplicates(
+                plan_chunks(iter_chunks(material, progress), existing), fingerprints, settings.ingest_dedup
+            )
+            embedded = prefetch(
+                embed_batches(gemini, batched(planned, settings.ingest_batch_size), progress, _load_embeddings),
+                settings.ingest_queue_size,
+                name="ingest-embed",
+            )
+            counts = write_batches(db, material, embedded, existing, progress)
+            _finish(
+                claimed,
+                "succeeded",
+                chunks_kept=counts.kept,
+                chunks_added=counts.added,
+                chunks_removed=counts.removed,
+                duplicates_exact=counts.duplicates_exact,
+                duplicates_near=counts.duplicates_near,
+                duplicates_skipped=counts.duplicates_skipped,
+                error=None,
+            )
+            logger.info(
+                "Ingest job %s: material %s kept %d, added %d, removed %d chunks "
+                "(duplicates: %d exact, %d near, %d skipped)",
+                job_id,
+                material.id,
+                *counts,
+            )
+        except JobSuperseded:
+            db.rollback()
+            logger.warning("Ingest job %s: attempt %d superseded, stopping", job_id, claimed.attempt)
+        except JobCancelled:
+            db.rollback()
+            _finish(claimed, "cancelled")
+            logger.info("Ingest job %s cancelled", job_id)
+        except Exception as e:
+            db.rollback()
+            logger.exception("Ingest job %s failed", job_id)
+            _finish(claimed, "failed", error=str(e) or type(e).__name__)
+
+
+# ---------------------------------------------------------------------------
+# Worker pool
+# ---------------------------------------------------------------------------
+
+
+class IngestWorkerPool:
+    """
+    Worker threads that claim queued jobs from the ingest_jobs table and run
+    them. Idle workers poll every INGEST_POLL_INTERVAL_S, or sooner when a job
+    is queued in this process. Any number of pools (API processes or
+    `python -m scripts.ingest_worker`) can share one database.
+    """
+
+    def __init__(self) -> None:
+        self._threads: list[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self, workers: int) -> None:
+        with self._lock:
+            if self.running or workers <= 0:
+                return
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._loop, args=(f"{self.name}/{i}",), name=f"ingest-{i}", daemon=True)
+                for i in range(workers)
+            ]
+            for t in self._threads:
+                t.start()
+        logger.info("Started %d ingest workers", workers)
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Stops after the jobs in progress finish (or `timeout` passes)."""
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def _loop(self, worker: str) -> None:
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                with SessionLocal() as db:
+                    claimed = claim_next_job(db, worker)
+                if claimed is not None:
+                    run_job(claimed)
+                    continue
+            except Exception:
+                logger.exception("Ingest worker %s: job queue unavailable", worker)
+            self._wake.wait(settings.ingest_poll_interval_s)
+
+
+_pool: IngestWorkerPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_ingest_workers() -> IngestWorkerPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = IngestWorkerPool()
+    return _pool
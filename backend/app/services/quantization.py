@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import uuid
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models import MaterialChunk
+
+# Compact copy written for each VECTOR_QUANTIZATION mode.
+MODE_COLUMNS: dict[str, list[str]] = {
+    "none": [],
+    "halfvec": ["embedding_half"],
+    "binary": ["embedding_bits"],
+}
+
+
+def compact_columns() -> list[str]:
+    """Compact copies the first ANN stage scans; two-stage search takes precedence over quantization."""
+    if settings.search_two_stage:
+        return ["embedding_coarse"]
+    return list(MODE_COLUMNS[settings.vector_quantization])
+
+
+def quantize_bits(embedding: list[float]) -> str:
+    """Python twin of pgvector's binary_quantize(): 1 for positive components, else 0."""
+    return "".join("1" if x > 0 else "0" for x in embedding)
+
+
+def _compact_values(columns: list[str]) -> tuple[dict, list]:
+    """SET expressions computing `columns` from the full vectors, and the conditions for rows missing one."""
+    values = {}
+    missing = []
+    if "embedding_half" in columns:
+        values["embedding_half"] = MaterialChunk.embedding.cast(MaterialChunk.embedding_half.type)
+        missing.append(MaterialChunk.embedding_half.is_(None))
+    if "embedding_bits" in columns:
+        values["embedding_bits"] = func.binary_quantize(MaterialChunk.embedding).cast(MaterialChunk.embedding_bits.type)
+        missing.append(MaterialChunk.embedding_bits.is_(None))
+    if "embedding_coarse" in columns:
+        values["embedding_coarse"] = func.subvector(MaterialChunk.embedding, 1, settings.embedding_coarse_dim).cast(
+            MaterialChunk.embedding_coarse.type
+        )
+        missing.append(MaterialChunk.embedding_coarse.is_(None))
+    return values, missing
+
+
+def quantize_material(db: Session, material_id: uuid.UUID) -> int:
+    """
+    Fills the compact copies (compact_columns()) of one material's chunks in a
+    single UPDATE inside the caller's transaction, so they commit together with
+    the chunks. Returns the number of rows updated.
+    """
+    values, missing = _compact_values(compact_columns())
+    if not values:
+        return 0
+    res = db.execute(
+        update(MaterialChunk)
+        .where(MaterialChunk.material_id == material_id, MaterialChunk.embedding.is_not(None), or_(*missing))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return res.rowcount or 0
+
+
+def fill_quantized(
+    db: Session,
+    *,
+    columns: list[str] | None = None,
+    material_id: uuid.UUID | None = None,
+    batch_size: int = 1000,
+) -> int:
+    """
+    Computes compact embedding copies (default: compact_columns()) from the full
+    vectors, in batches of `batch_size` rows committed one at a time. Only rows
+    still missing a copy are touched. Returns the number of rows updated.
+    """
+    columns = compact_columns() if columns is None else columns
+    if not columns:
+        return 0
+    values, missing = _compact_values(columns)
+
+    total = 0
+    while True:
+        todo = select(MaterialChunk.id).where(MaterialChunk.embedding.is_not(None), or_(*missing))
+        if material_id is not None:
+            todo = todo.where(MaterialChunk.material_id == material_id)
+        res = db.execute(
+            update(MaterialChunk)
+            .where(MaterialChunk.id.in_(todo.limit(batch_size).scalar_subquery()))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        total += res.rowcount or 0
+        if (res.rowcount or 0) < batch_size:
+            return total
@@ -1,11 +1,131 @@
 from __future__ import annotations
 
 import uuid
+from typing import NamedTuple
 
-from sqlalchemy import func, select
+from sqlalchemy import (
+    Boolean,
+    Float,
+    Integer,
+    String,
+    Text,
+    Uuid,
+    case,
+    cast,
+    column,
+    func,
+    literal,
+    or_,
+    select,
+    true,
+    union_all,
+    values,
+)
+from sqlalchemy.dialects.postgresql import REGCONFIG
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
 from app.models import Material, MaterialChunk
+from app.services.quantization import quantize_bits
+from app.services.vector_index import CourseIndex, get_vector_index
+
+# Weights of the linear hybrid score and of normalized-score fusion.
+VEC_WEIGHT = 0.7
+FTS_WEIGHT = 0.3
+# Standard reciprocal rank fusion constant (Cormack et al.).
+RRF_K = 60
+# ts_headline snippet for hybrid-mode excerpts: a few fragments, no highlight markup.
+HEADLINE_OPTIONS = 'MaxFragments=3, MinWords=12, MaxWords=35, FragmentDelimiter=" … ", StartSel="", StopSel=""'
+
+
+def fts_query(query_text):
+    """
+    tsquery matching both prose (stemmed) and code (verbatim) rows of the stored
+    text_tsv column, which is built with a different config per chunk kind.
+    `query_text` is a string or a text-valued SQL expression.
+    """
+    q = query_text.strip() if isinstance(query_text, str) else query_text
+    return func.plainto_tsquery(settings.fts_prose_config, q).op("||")(
+        func.plainto_tsquery(settings.fts_code_config, q)
+    )
+
+
+def _chunk_columns() -> list:
+    """SearchRow columns available on material_chunks alone (all but material_title and score)."""
+    return [
+        MaterialChunk.id.label("chunk_id"),
+        MaterialChunk.material_id.label("material_id"),
+        MaterialChunk.category.label("category"),
+        MaterialChunk.text.label("text"),
+        MaterialChunk.language.label("language"),
+        MaterialChunk.symbol_name.label("symbol_name"),
+        MaterialChunk.start_line.label("start_line"),
+        MaterialChunk.end_line.label("end_line"),
+    ]
+
+
+def excerpt_column(text_col, language_col, *, excerpt_chars: int | None, headline_query=None):
+    """
+    The `text` returned with a hit: the full chunk text when `excerpt_chars` is
+    None, else at most excerpt_chars + 1 characters (one more than shown, so the
+    caller can tell it was cut). With `headline_query` (hybrid mode) the excerpt
+    is a ts_headline snippet around the matched terms instead of the chunk start.
+    """
+    if excerpt_chars is None:
+        return text_col
+    body = func.btrim(text_col)
+    if headline_query is not None:
+        config = case(
+            (language_col.is_(None), literal(settings.fts_prose_config)),
+            else_=literal(settings.fts_code_config),
+        )
+        body = func.ts_headline(cast(config, REGCONFIG), text_col, fts_query(headline_query), HEADLINE_OPTIONS)
+    return func.left(body, excerpt_chars + 1)
+
+
+def _with_titles(ranked, *, excerpt_chars: int | None = None, headline_query=None):
+    """
+    SearchRow columns for the ranked chunks of subquery `ranked`, best first.
+    Materials are joined only here, after the top-k is cut, for the titles, and
+    excerpts (see excerpt_column) are computed only for the surviving rows.
+    """
+    cols = {name: ranked.c[name] for name in SearchRow._fields if name != "material_title"}
+    cols["material_title"] = Material.title
+    cols["text"] = excerpt_column(
+        ranked.c.text, ranked.c.language, excerpt_chars=excerpt_chars, headline_query=headline_query
+    )
+    cols = [cols[name].label(name) for name in SearchRow._fields]
+    return (
+        select(*cols)
+        .select_from(ranked)
+        .join(Material, Material.id == ranked.c.material_id)
+        .order_by(ranked.c.score.desc())
+    )
+
+
+def like_escape(value: str) -> str:
+    """Escapes LIKE wildcards so `value` matches literally (underscores are common in identifiers)."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _apply_filters(
+    stmt,
+    *,
+    course_id: uuid.UUID | None,
+    category: str | None,
+    language: str | None,
+    symbol: str | None,
+):
+    if course_id is not None:
+        stmt = stmt.where(MaterialChunk.course_id == course_id)
+    if category is not None:
+        stmt = stmt.where(MaterialChunk.category == category)
+    if language is not None and language.strip():
+        stmt = stmt.where(MaterialChunk.language == language.strip().lower())
+    if symbol is not None and symbol.strip():
+        # Substring match, served by the pg_trgm index on symbol_name
+        stmt = stmt.where(MaterialChunk.symbol_name.ilike(f"%{like_escape(symbol.strip())}%", escape="\\"))
+    return stmt
 
 
 def build_search_query(
@@ -18,55 +138,318 @@ def build_search_query(
     language: str | None = None,
     symbol: str | None = None,
     use_hybrid: bool = True,
+    two_stage: bool = False,
+    excerpt_chars: int | None = None,
 ):
-    vec_score = 1.0 - MaterialChunk.embedding.cosine_distance(query_embedding)
-    cols = [
-        MaterialChunk.id.label("chunk_id"),
-        MaterialChunk.material_id.label("material_id"),
-        Material.title.label("material_title"),
-        Material.category.label("category"),
-        MaterialChunk.text.label("text"),
-        MaterialChunk.language.label("language"),
-        MaterialChunk.symbol_name.label("symbol_name"),
-        MaterialChunk.start_line.label("start_line"),
-        MaterialChunk.end_line.label("end_line"),
-    ]
+    vec_distance = MaterialChunk.embedding.cosine_distance(query_embedding)
+    vec_score = 1.0 - vec_distance
+    cols = _chunk_columns()
 
     use_fts = use_hybrid and bool((query_text or "").strip())
     if use_fts:
-        fts_raw = func.coalesce(
-            func.ts_rank_cd(
-                func.to_tsvector("english", MaterialChunk.text),
-                func.plainto_tsquery("english", query_text.strip()),
-            ),
-            0.0,
-        )
-        fts_norm = func.least(1.0, fts_raw * 5.0)
-        combined = vec_score * 0.7 + fts_norm * 0.3
+        combined = _linear_score(vec_score, query_text)
         cols.append(combined.label("score"))
         order_expr = combined.desc()
     else:
         cols.append(vec_score.label("score"))
-        order_expr = vec_score.desc()
+        # Order by the raw distance so the HNSW index can serve the query.
+        order_expr = vec_distance.asc()
 
+    stmt = select(*cols).where(MaterialChunk.embedding.is_not(None)).order_by(order_expr).limit(top_k)
+    filters = {"course_id": course_id, "category": category, "language": language, "symbol": symbol}
+    coarse = coarse_stage(two_stage)
+    if not use_fts and coarse is not None:
+        # Exact re-rank of the shortlist from the compact index.
+        shortlist = _coarse_candidates(query_embedding, top_k * coarse[1], filters, coarse[0])
+        stmt = stmt.where(MaterialChunk.id.in_(shortlist.scalar_subquery()))
+    else:
+        stmt = _apply_filters(stmt, **filters)
+    # Rank and filter on material_chunks alone so its indexes serve the query.
+    return _with_titles(
+        stmt.subquery("ranked"),
+        excerpt_chars=excerpt_chars,
+        headline_query=query_text if use_fts else None,
+    )
+
+
+def _linear_score(vec_score, query_text):
+    """Weighted cosine similarity + ts_rank_cd (scaled and capped at 1) of the linear hybrid mode."""
+    fts_raw = func.coalesce(func.ts_rank_cd(MaterialChunk.text_tsv, fts_query(query_text)), 0.0)
+    return vec_score * VEC_WEIGHT + func.least(1.0, fts_raw * 5.0) * FTS_WEIGHT
+
+
+def coarse_stage(two_stage: bool) -> tuple[str, int] | None:
+    """
+    The compact representation used to shortlist ANN candidates, with its
+    shortlist factor: the truncated-dimension column when two-stage search is
+    on, else the VECTOR_QUANTIZATION copy, else None (search the full vectors).
+
+    Only the columns compact_columns() maintains are used: while
+    SEARCH_TWO_STAGE is off, embedding_coarse is neither filled nor indexed,
+    so two_stage=True is ignored; while it is on, the quantized copies are
+    not maintained, so two_stage=False searches the full vectors.
+    """
+    if settings.search_two_stage:
+        return ("coarse", settings.two_stage_rerank_factor) if two_stage else None
+    if settings.vector_quantization != "none":
+        return settings.vector_quantization, settings.quantized_rerank_factor
+    return None
+
+
+def _coarse_distance(kind: str, query_embedding):
+    """
+    Distance on the compact column `kind`, served by its HNSW index. The query is
+    a list of floats or a full-dimension vector-valued SQL expression.
+    """
+    literal = isinstance(query_embedding, list)
+    if kind == "coarse":
+        column_ = MaterialChunk.embedding_coarse
+        if literal:
+            q = query_embedding[: settings.embedding_coarse_dim]
+        else:
+            q = func.subvector(query_embedding, 1, settings.embedding_coarse_dim).cast(column_.type)
+        return column_, column_.cosine_distance(q)
+    if kind == "binary":
+        column_ = MaterialChunk.embedding_bits
+        q = quantize_bits(query_embedding) if literal else func.binary_quantize(query_embedding).cast(column_.type)
+        return column_, column_.hamming_distance(q)
+    column_ = MaterialChunk.embedding_half
+    return column_, column_.cosine_distance(query_embedding if literal else query_embedding.cast(column_.type))
+
+
+def _coarse_candidates(query_embedding: list[float], limit: int, filters: dict, kind: str):
+    """Top-`limit` chunk ids by distance on the compact column `kind`, served by its HNSW index."""
+    column_, order_expr = _coarse_distance(kind, query_embedding)
+    stmt = select(MaterialChunk.id).where(column_.is_not(None)).order_by(order_expr).limit(limit)
+    return _apply_filters(stmt, **filters)
+
+
+# ---------------------------------------------------------------------------
+# Fused hybrid retrieval: two index-served candidate queries merged in Python
+# ---------------------------------------------------------------------------
+
+
+class SearchRow(NamedTuple):
+    chunk_id: uuid.UUID
+    material_id: uuid.UUID
+    material_title: str
+    category: str
+    text: str
+    language: str | None
+    symbol_name: str | None
+    start_line: int | None
+    end_line: int | None
+    score: float
+
+
+def build_vector_candidates(
+    *,
+    query_embedding: list[float],
+    limit: int,
+    course_id: uuid.UUID | None = None,
+    category: str | None = None,
+    language: str | None = None,
+    symbol: str | None = None,
+    two_stage: bool = False,
+):
+    """
+    Top-`limit` chunk ids by cosine distance (served by the HNSW index). With
+    two-stage search or VECTOR_QUANTIZATION, a compact-index shortlist is re-ranked exactly.
+    """
+    filters = {"course_id": course_id, "category": category, "language": language, "symbol": symbol}
     stmt = (
-        select(*cols)
-        .join(Material, Material.id == MaterialChunk.material_id)
+        select(MaterialChunk.id)
         .where(MaterialChunk.embedding.is_not(None))
-        .order_by(order_expr)
-        .limit(top_k)
+        .order_by(MaterialChunk.embedding.cosine_distance(query_embedding))
+        .limit(limit)
     )
+    coarse = coarse_stage(two_stage)
+    if coarse is not None:
+        shortlist = _coarse_candidates(query_embedding, limit * coarse[1], filters, coarse[0])
+        return stmt.where(MaterialChunk.id.in_(shortlist.scalar_subquery()))
+    return _apply_filters(stmt, **filters)
 
-    if course_id is not None:
-        stmt = stmt.where(Material.course_id == course_id)
-    if category is not None:
-        stmt = stmt.where(Material.category == category)
-    if language is not None and language.strip():
-        stmt = stmt.where(MaterialChunk.language == language.strip().lower())
-    if symbol is not None and symbol.strip():
-        stmt = stmt.where(MaterialChunk.symbol_name.ilike(f"%{symbol.strip()}%"))
 
-    return stmt
+def build_fts_candidates(
+    *,
+    query_text: str,
+    limit: int,
+    course_id: uuid.UUID | None = None,
+    category: str | None = None,
+    language: str | None = None,
+    symbol: str | None = None,
+):
+    """Top-`limit` (chunk id, rank) among rows matching the tsquery (served by the GIN index)."""
+    q = fts_query(query_text)
+    rank = func.ts_rank_cd(MaterialChunk.text_tsv, q)
+    stmt = (
+        select(MaterialChunk.id, rank.label("rank"))
+        .where(MaterialChunk.text_tsv.op("@@")(q), MaterialChunk.embedding.is_not(None))
+        .order_by(rank.desc())
+        .limit(limit)
+    )
+    return _apply_filters(stmt, course_id=course_id, category=category, language=language, symbol=symbol)
+
+
+def reciprocal_rank_fusion(ranked_lists: list[list[uuid.UUID]], k: int = RRF_K) -> dict[uuid.UUID, float]:
+    """score(d) = sum over lists of 1 / (k + rank of d), ranks starting at 1."""
+    scores: dict[uuid.UUID, float] = {}
+    for ranked in ranked_lists:
+        for rank, chunk_id in enumerate(ranked, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+def normalized_score_fusion(
+    vec_scores: dict[uuid.UUID, float],
+    fts_ranks: dict[uuid.UUID, float],
+) -> dict[uuid.UUID, float]:
+    """Weighted sum of cosine similarity and ts_rank_cd scaled to [0, 1] by the best candidate."""
+    max_rank = max(fts_ranks.values(), default=0.0) or 1.0
+    return {
+        chunk_id: VEC_WEIGHT * vec + FTS_WEIGHT * (fts_ranks.get(chunk_id, 0.0) / max_rank)
+        for chunk_id, vec in vec_scores.items()
+    }
+
+
+def run_fused_search(
+    db: Session,
+    *,
+    query_embedding: list[float],
+    query_text: str,
+    top_k: int,
+    fusion: str,
+    candidate_k: int,
+    course_id: uuid.UUID | None = None,
+    category: str | None = None,
+    language: str | None = None,
+    symbol: str | None = None,
+    two_stage: bool = False,
+    excerpt_chars: int | None = None,
+) -> list[SearchRow]:
+    filters = {"course_id": course_id, "category": category, "language": language, "symbol": symbol}
+    candidate_k = max(candidate_k, top_k)
+
+    vec_stmt = build_vector_candidates(
+        query_embedding=query_embedding, limit=candidate_k, two_stage=two_stage, **filters
+    )
+    vec_ids = list(db.execute(vec_stmt).scalars())
+    fts_rows = db.execute(build_fts_candidates(query_text=query_text, limit=candidate_k, **filters)).all()
+    fts_ranks = {r.id: float(r.rank or 0.0) for r in fts_rows}
+    candidate_ids = set(vec_ids) | set(fts_ranks)
+    if not candidate_ids:
+        return []
+
+    if fusion == "rrf":
+        scores = reciprocal_rank_fusion([vec_ids, [r.id for r in fts_rows]])
+    else:
+        # Exact cosine similarity of every candidate, by primary key.
+        vec_score = 1.0 - MaterialChunk.embedding.cosine_distance(query_embedding)
+        vec_scores = dict(db.execute(select(MaterialChunk.id, vec_score).where(MaterialChunk.id.in_(candidate_ids))).all())
+        scores = normalized_score_fusion({cid: float(v or 0.0) for cid, v in vec_scores.items()}, fts_ranks)
+    return _fetch_ranked(db, scores, top_k, excerpt_chars=excerpt_chars, headline_query=query_text)
+
+
+def build_details_query(
+    chunk_ids: list[uuid.UUID], *, excerpt_chars: int | None = None, headline_query: str | None = None
+):
+    """
+    SearchRow columns of the given chunks by primary key, minus the score, with
+    only the excerpt (see excerpt_column) in place of the chunk text.
+    """
+    columns = [c for c in _chunk_columns() if c.name != "text"]
+    excerpt = excerpt_column(
+        MaterialChunk.text, MaterialChunk.language, excerpt_chars=excerpt_chars, headline_query=headline_query
+    )
+    return (
+        select(*columns, Material.title.label("material_title"), excerpt.label("excerpt"))
+        .join(Material, Material.id == MaterialChunk.material_id)
+        .where(MaterialChunk.id.in_(chunk_ids))
+    )
+
+
+def _fetch_ranked(
+    db: Session,
+    scores: dict[uuid.UUID, float],
+    top_k: int,
+    *,
+    excerpt_chars: int | None = None,
+    headline_query: str | None = None,
+) -> list[SearchRow]:
+    """SearchRows of the `top_k` best-scored chunks, fetched by primary key (text per excerpt_column)."""
+    top = sorted(scores, key=scores.__getitem__, reverse=True)[:top_k]
+    if not top:
+        return []
+    stmt = build_details_query(top, excerpt_chars=excerpt_chars, headline_query=headline_query)
+    details = {r.chunk_id: r for r in db.execute(stmt).all()}
+    return [
+        SearchRow(
+            **{name: getattr(details[cid], name) for name in SearchRow._fields if name not in ("text", "score")},
+            text=details[cid].excerpt,
+            score=scores[cid],
+        )
+        for cid in top
+        if cid in details
+    ]
+
+
+def run_numpy_search(
+    db: Session,
+    *,
+    query_embedding: list[float],
+    query_text: str,
+    course_id: uuid.UUID,
+    top_k: int,
+    category: str | None = None,
+    language: str | None = None,
+    symbol: str | None = None,
+    use_hybrid: bool = True,
+    fusion: str = "linear",
+    candidate_k: int | None = None,
+    excerpt_chars: int | None = None,
+) -> list[SearchRow]:
+    """
+    SEARCH_BACKEND=numpy: exact cosine scores for every chunk of the course from
+    its in-process matrix, top-k by argpartition. Hybrid modes take full-text
+    ranks from the GIN-served candidate query; in "linear" mode chunks outside
+    the top `candidate_k` full-text matches score as vector-only.
+    """
+    index = get_vector_index().get(db, course_id)
+    vec = index.scores(query_embedding, category=category, language=language, symbol=symbol)
+    candidate_k = max(candidate_k or settings.search_candidate_k, top_k)
+
+    use_fts = use_hybrid and bool((query_text or "").strip())
+    fts_rows = []
+    if use_fts:
+        filters = {"course_id": course_id, "category": category, "language": language, "symbol": symbol}
+        fts_rows = db.execute(build_fts_candidates(query_text=query_text, limit=candidate_k, **filters)).all()
+    fts_ranks = {r.id: float(r.rank or 0.0) for r in fts_rows}
+
+    if not use_fts:
+        scores = {index.chunk_id(i): float(vec[i]) for i in CourseIndex.top(vec, top_k)}
+    elif fusion == "linear":
+        combined = vec * VEC_WEIGHT
+        for cid, rank in fts_ranks.items():
+            pos = index.position(cid)
+            if pos is not None:
+                combined[pos] += FTS_WEIGHT * min(1.0, rank * 5.0)
+        scores = {index.chunk_id(i): float(combined[i]) for i in CourseIndex.top(combined, top_k)}
+    else:
+        vec_ids = [index.chunk_id(i) for i in CourseIndex.top(vec, candidate_k)]
+        if fusion == "rrf":
+            scores = reciprocal_rank_fusion([vec_ids, [r.id for r in fts_rows]])
+        else:
+            candidates = {cid: index.position(cid) for cid in {*vec_ids, *fts_ranks}}
+            vec_scores = {cid: float(vec[pos]) for cid, pos in candidates.items() if pos is not None}
+            scores = normalized_score_fusion(vec_scores, fts_ranks)
+    return _fetch_ranked(
+        db, scores, top_k, excerpt_chars=excerpt_chars, headline_query=query_text if use_fts else None
+    )
+
+
+def set_ef_search(db: Session, ef_search: int) -> None:
+    """Sets hnsw.ef_search for the current transaction only (SET LOCAL semantics)."""
+    db.execute(select(func.set_config("hnsw.ef_search", str(int(ef_search)), True)))
 
 
 def run_search(
@@ -80,7 +463,65 @@ def run_search(
     language: str | None = None,
     symbol: str | None = None,
     use_hybrid: bool = True,
+    ef_search: int | None = None,
+    fusion: str = "linear",
+    candidate_k: int | None = None,
+    two_stage: bool | None = None,
+    backend: str | None = None,
+    excerpt_chars: int | None = None,
 ):
+    """
+    fusion="linear" scores every row with the weighted vector + full-text
+    expression; "rrf" and "normalized" merge separate ANN and full-text
+    top-`candidate_k` lists, each served by its own index.
+
+    two_stage (default SEARCH_TWO_STAGE) shortlists vector candidates on the
+    truncated-dimension embedding_coarse column and re-scores them at full
+    dimension; it only takes effect while SEARCH_TWO_STAGE is on (see coarse_stage).
+
+    backend (default SEARCH_BACKEND) "numpy" serves course-scoped searches from
+    the in-process vector index instead (see run_numpy_search).
+
+    excerpt_chars bounds the returned text (see excerpt_column); None returns
+    the full chunk text.
+    """
+    if (backend or settings.search_backend) == "numpy" and course_id is not None:
+        return run_numpy_search(
+            db,
+            query_embedding=query_embedding,
+            query_text=query_text,
+            course_id=course_id,
+            top_k=top_k,
+            category=category,
+            language=language,
+            symbol=symbol,
+            use_hybrid=use_hybrid,
+            fusion=fusion,
+            candidate_k=candidate_k,
+            excerpt_chars=excerpt_chars,
+        )
+    if two_stage is None:
+        two_stage = settings.search_two_stage
+    ann_depth = max(top_k, candidate_k or 0)
+    coarse = coarse_stage(two_stage)
+    if coarse is not None:
+        ann_depth *= coarse[1]
+    set_ef_search(db, max(ef_search or settings.hnsw_ef_search, ann_depth))
+    if use_hybrid and fusion in ("rrf", "normalized") and (query_text or "").strip():
+        return run_fused_search(
+            db,
+            query_embedding=query_embedding,
+            query_text=query_text,
+            top_k=top_k,
+            fusion=fusion,
+            candidate_k=candidate_k or settings.search_candidate_k,
+            course_id=course_id,
+            category=category,
+            language=language,
+            symbol=symbol,
+            two_stage=two_stage,
+            excerpt_chars=excerpt_chars,
+        )
     stmt = build_search_query(
         query_embedding=query_embedding,
         query_text=query_text,
@@ -90,5 +531,216 @@ def run_search(
         language=language,
         symbol=symbol,
         use_hybrid=use_hybrid,
+        two_stage=two_stage,
+        excerpt_chars=excerpt_chars,
     )
     return db.execute(stmt).all()
+
+
+# ---------------------------------------------------------------------------
+# Batch retrieval: many queries in one statement, a LATERAL top-k per query
+# ---------------------------------------------------------------------------
+
+
+class BatchQuery(NamedTuple):
+    query_embedding: list[float]
+    query_text: str = ""
+    course_id: uuid.UUID | None = None
+    category: str | None = None
+    top_k: int = 12
+    language: str | None = None
+    symbol: str | None = None
+    use_hybrid: bool = True
+
+
+def _batch_filters(q) -> list:
+    """_apply_filters() with the filter values taken per row from the query list `q` (NULL = no filter)."""
+    return [
+        or_(q.c.course_id.is_(None), MaterialChunk.course_id == q.c.course_id),
+        or_(q.c.category.is_(None), MaterialChunk.category == q.c.category),
+        or_(q.c.language.is_(None), MaterialChunk.language == q.c.language),
+        or_(q.c.symbol.is_(None), MaterialChunk.symbol_name.ilike("%" + q.c.symbol + "%", escape="\\")),
+    ]
+
+
+def _batch_branch(q, *, use_fts: bool, two_stage: bool, excerpt_chars: int | None):
+    """
+    One row per (query, hit) for the queries of `q` in the given scoring mode:
+    the per-query statement of build_search_query() as a LATERAL subquery, so an
+    ANN index scan runs once per query vector. Queries without hits keep one
+    all-NULL row, so every query reports when it finished.
+    """
+    vec_distance = MaterialChunk.embedding.cosine_distance(q.c.embedding)
+    vec_score = 1.0 - vec_distance
+    if use_fts:
+        score = _linear_score(vec_score, q.c.query_text)
+        order_expr = score.desc()
+    else:
+        score = vec_score
+        order_expr = vec_distance.asc()
+    hits = (
+        select(*_chunk_columns(), score.label("score"))
+        .where(MaterialChunk.embedding.is_not(None))
+        .order_by(order_expr)
+        .limit(q.c.top_k)
+    )
+    coarse = coarse_stage(two_stage)
+    if not use_fts and coarse is not None:
+        column_, coarse_distance = _coarse_distance(coarse[0], q.c.embedding)
+        shortlist = (
+            select(MaterialChunk.id)
+            .where(column_.is_not(None), *_batch_filters(q))
+            .order_by(coarse_distance)
+            .limit(q.c.top_k * coarse[1])
+            .correlate(q)
+        )
+        hits = hits.where(MaterialChunk.id.in_(shortlist.scalar_subquery()))
+    else:
+        hits = hits.where(*_batch_filters(q))
+    hit = hits.lateral("hit")
+    cols = {name: hit.c[name] for name in SearchRow._fields if name != "material_title"}
+    cols["material_title"] = Material.title
+    cols["text"] = excerpt_column(
+        hit.c.text, hit.c.language, excerpt_chars=excerpt_chars, headline_query=q.c.query_text if use_fts else None
+    )
+    return (
+        select(
+            q.c.ord,
+            *(cols[name].label(name) for name in SearchRow._fields),
+            func.clock_timestamp().label("finished_at"),
+        )
+        .select_from(q.outerjoin(hit, true()).outerjoin(Material, Material.id == hit.c.material_id))
+        .where(q.c.use_fts.is_(use_fts))
+    )
+
+
+def build_batch_search_query(
+    queries: list[BatchQuery], *, two_stage: bool = False, excerpt_chars: int | None = None
+):
+    """
+    A single statement answering every query: the query vectors and filters go
+    in as a VALUES list, each mode (vector-only, linear hybrid) is a LEFT JOIN
+    LATERAL over it, and rows come back ordered by (query, rank).
+    """
+    types = {
+        "ord": Integer,
+        "embedding": MaterialChunk.embedding.type,
+        "query_text": Text,
+        "course_id": Uuid,
+        "category": String,
+        "language": String,
+        "symbol": String,
+        "top_k": Integer,
+        "use_fts": Boolean,
+    }
+    rows = values(*(column(name) for name in types), name="v").data(
+        [
+            (
+                i,
+                bq.query_embedding,
+                (bq.query_text or "").strip(),
+                bq.course_id,
+                bq.category,
+                (bq.language or "").strip().lower() or None,
+                like_escape((bq.symbol or "").strip()) or None,
+                bq.top_k,
+                bq.use_hybrid and bool((bq.query_text or "").strip()),
+            )
+            for i, bq in enumerate(queries)
+        ]
+    )
+    # Explicit casts: Postgres would type an all-NULL (or untyped) VALUES column as text.
+    q = select(*(cast(rows.c[name], type_).label(name) for name, type_ in types.items())).cte("q")
+    branches = union_all(
+        _batch_branch(q, use_fts=False, two_stage=two_stage, excerpt_chars=excerpt_chars),
+        _batch_branch(q, use_fts=True, two_stage=two_stage, excerpt_chars=excerpt_chars),
+    ).subquery("b")
+    return select(branches, func.statement_timestamp().label("started_at")).order_by(
+        branches.c.ord, branches.c.score.desc()
+    )
+
+
+def run_batch_search(
+    db: Session,
+    queries: list[BatchQuery],
+    *,
+    ef_search: int | None = None,
+    two_stage: bool | None = None,
+    excerpt_chars: int | None = None,
+) -> list[tuple[list[SearchRow], float]]:
+    """
+    Runs vector-only and linear-hybrid queries in one round trip. Returns, per
+    query in input order, its hits and the milliseconds the server spent on it
+    (measured from clock_timestamp() as each query's LATERAL scan finishes).
+    """
+    if not queries:
+        return []
+    if two_stage is None:
+        two_stage = settings.search_two_stage
+    ann_depth = max(bq.top_k for bq in queries)
+    coarse = coarse_stage(two_stage)
+    if coarse is not None:
+        ann_depth *= coarse[1]
+    set_ef_search(db, max(ef_search or settings.hnsw_ef_search, ann_depth))
+
+    hits: list[list[SearchRow]] = [[] for _ in queries]
+    finished: list = [None] * len(queries)
+    started = None
+    for r in db.execute(build_batch_search_query(queries, two_stage=two_stage, excerpt_chars=excerpt_chars)):
+        started = r.started_at
+        if finished[r.ord] is None or r.finished_at > finished[r.ord]:
+            finished[r.ord] = r.finished_at
+        if r.chunk_id is not None:
+            hits[r.ord].append(SearchRow(*(r._mapping[name] for name in SearchRow._fields)))
+
+    # Queries run one after another, so each took from the previous finish to its own.
+    timings = [0.0] * len(queries)
+    prev = started
+    for i in sorted(range(len(queries)), key=lambda i: finished[i]):
+        timings[i] = max(0.0, (finished[i] - prev).total_seconds() * 1000)
+        prev = finished[i]
+    return list(zip(hits, timings, strict=True))
+
+
+# ---------------------------------------------------------------------------
+# Symbol lookup: "jump to definition" without vector scoring
+# ---------------------------------------------------------------------------
+
+
+def build_symbol_lookup(
+    *,
+    symbol: str,
+    mode: str = "prefix",
+    language: str | None = None,
+    course_id: uuid.UUID | None = None,
+    category: str | None = None,
+    limit: int = 20,
+    excerpt_chars: int | None = None,
+    trigram: bool = True,
+):
+    """
+    Code chunks whose symbol_name matches `symbol`, without vector scoring.
+    mode="exact" (case-sensitive equality) and "prefix" are served by the
+    (symbol_name text_pattern_ops, language) b-tree and list shortest names
+    first with score 1.0; "contains" is a case-insensitive substring match
+    served by the pg_trgm GIN index and ranked by trigram similarity. Without
+    pg_trgm (trigram=False) it scans code chunks and ranks like "prefix".
+    """
+    symbol = symbol.strip()
+    name = MaterialChunk.symbol_name
+    if mode == "exact":
+        match, score = name == symbol, literal(1.0, Float)
+    elif mode == "prefix":
+        match, score = name.like(f"{like_escape(symbol)}%", escape="\\"), literal(1.0, Float)
+    else:
+        match = name.ilike(f"%{like_escape(symbol)}%", escape="\\")
+        score = func.similarity(name, symbol) if trigram else literal(1.0, Float)
+
+    def order(cols) -> list:
+        return [cols.score.desc(), func.length(cols.symbol_name), cols.symbol_name, cols.material_id, cols.start_line]
+
+    stmt = select(*_chunk_columns(), score.label("score")).where(name.is_not(None), match)
+    stmt = _apply_filters(stmt, course_id=course_id, category=category, language=language, symbol=None)
+    labelled = stmt.subquery("matched")
+    ranked = select(labelled).order_by(*order(labelled.c)).limit(limit).subquery("ranked")
+    return _with_titles(ranked, excerpt_chars=excerpt_chars).order_by(None).order_by(*order(ranked.c))
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import uuid
+from collections.abc import Hashable
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models import Course, corpus_version_seq
+from app.schemas import SearchRequest, SearchResponse
+from app.services.embedding_cache import embedding_model_key, normalize_text
+from app.services.lru_cache import LRUTTLCache
+
+# Rough per-hit overhead on top of the excerpt text (ids, title, floats, object headers).
+_HIT_OVERHEAD_BYTES = 400
+
+
+def _response_size(resp: SearchResponse) -> int:
+    return sum(len(h.excerpt) + len(h.material_title) + _HIT_OVERHEAD_BYTES for h in resp.hits)
+
+
+search_result_cache: LRUTTLCache[SearchResponse] = LRUTTLCache(
+    settings.search_cache_max_entries,
+    settings.search_cache_ttl_s,
+    max_bytes=settings.search_cache_max_bytes,
+    size_of=_response_size,
+)
+
+
+def bump_corpus_version(db: Session, course_id: uuid.UUID) -> tuple[int, int]:
+    """
+    Marks a course's searchable chunks as changed. Runs in the caller's
+    transaction, so the new version becomes visible together with the change.
+    Returns the (previous, new) version; the course row stays locked until the
+    caller commits, so no other bump lands between the two.
+    """
+    previous = db.execute(select(Course.corpus_version).where(Course.id == course_id).with_for_update()).scalar()
+    version = db.execute(
+        update(Course)
+        .where(Course.id == course_id)
+        .values(corpus_version=corpus_version_seq.next_value())
+        .returning(Course.corpus_version)
+    ).scalar()
+    return previous or 0, version or 0
+
+
+def corpus_version(db: Session, course_id: uuid.UUID | None) -> int:
+    """
+    Version of the corpus a search reads: the course's counter, or for
+    cross-course searches the sum of all counters. Both are committed data, so
+    a version is never visible before the change it stands for. Each bump
+    raises one counter to a new sequence value, so the sum grows with every
+    committed bump, whatever order concurrent writers commit in. (The
+    sequence's position would not do: nextval() is visible before commit.)
+    """
+    if course_id is not None:
+        return db.execute(select(Course.corpus_version).where(Course.id == course_id)).scalar() or 0
+    return int(db.execute(select(func.coalesce(func.sum(Course.corpus_version), 0))).scalar())
+
+
+def search_cache_key(req: SearchRequest, version: int) -> Hashable:
+    return (
+        embedding_model_key(),
+        version,
+        req.course_id,
+        normalize_text(req.query).casefold(),
+        req.category,
+        (req.language or "").strip().lower() or None,
+        (req.symbol or "").strip() or None,
+        req.top_k,
+        req.use_hybrid,
+        req.ef_search,
+        req.fusion,
+        req.candidate_k,
+    )
@@ -107,15 +107,14 @@ class ValidationService:
             return 0.5
 
         try:
-            # Embed the generated content
-            content_embedding = self.gemini.embed([content[:1000]])[0]  # Use first 1000 chars
-
             # Get embeddings of source chunks
             source_texts = [chunk.get("text", "") for chunk in grounding_chunks]
             if not source_texts:
                 return 0.5
 
-            source_embeddings = self.gemini.embed(source_texts)
+            # Embed the generated content (first 1000 chars) and sources in one batched call
+            embeddings = self.gemini.embed([content[:1000]] + source_texts)
+            content_embedding, source_embeddings = embeddings[0], embeddings[1:]
 
             # Calculate cosine similarities
             similarities = []
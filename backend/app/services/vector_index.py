@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import glob
+import logging
+import os
+import threading
+import uuid
+from collections.abc import Iterable
+from dataclasses import dataclass, field, replace
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models import MaterialChunk
+from app.services.search_cache import corpus_version
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    m = np.asarray(m, dtype=np.float32)
+    return m / np.maximum(np.linalg.norm(m, axis=-1, keepdims=True), 1e-12)
+
+
+def _str_array(values: Iterable[str | None]) -> np.ndarray:
+    # Fixed-width unicode, so the arrays round-trip through .npz without pickling.
+    return np.array([v or "" for v in values], dtype=str)
+
+
+@dataclass(frozen=True)
+class CourseIndex:
+    """
+    One course's chunk embeddings as a (n, dim) float32 matrix of unit rows,
+    plus the per-row columns search filters on. Rows loaded from disk are
+    memory-mapped. `version` is the course's corpus_version the rows reflect.
+    """
+
+    course_id: uuid.UUID
+    version: int
+    embeddings: np.ndarray
+    chunk_ids: np.ndarray  # uuid bytes (S16)
+    material_ids: np.ndarray  # uuid bytes (S16)
+    categories: np.ndarray
+    languages: np.ndarray  # "" for prose chunks
+    symbols: np.ndarray  # "" when unset
+    _positions: dict[bytes, int] = field(default_factory=dict, compare=False, repr=False)
+
+    @classmethod
+    def from_rows(cls, course_id: uuid.UUID, version: int, rows: list) -> CourseIndex:
+        """Rows carry id, material_id, category, language, symbol_name and embedding."""
+        dim = settings.embedding_dim
+        return cls(
+            course_id=course_id,
+            version=version,
+            embeddings=_normalize(np.asarray([r.embedding for r in rows], dtype=np.float32).reshape(len(rows), dim)),
+            chunk_ids=np.array([r.id.bytes for r in rows], dtype="S16"),
+            material_ids=np.array([r.material_id.bytes for r in rows], dtype="S16"),
+            categories=_str_array(r.category for r in rows),
+            languages=_str_array(r.language for r in rows),
+            symbols=_str_array(r.symbol_name for r in rows),
+        )
+
+    def __len__(self) -> int:
+        return int(self.chunk_ids.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.embeddings.nbytes)
+
+    def _columns(self) -> dict[str, np.ndarray]:
+        return {
+            "chunk_ids": self.chunk_ids,
+            "material_ids": self.material_ids,
+            "categories": self.categories,
+            "languages": self.languages,
+            "symbols": self.symbols,
+        }
+
+    def replace_material(self, material_id: uuid.UUID, added: CourseIndex) -> CourseIndex:
+        """Drops the rows of `material_id`, appends `added` (its new chunks) and takes its version."""
+        keep = self.material_ids != material_id.bytes
+        columns = {
+            name: np.concatenate([col[keep], getattr(added, name)]) for name, col in self._columns().items()
+        }
+        embeddings = np.concatenate([np.asarray(self.embeddings[keep]), added.embeddings])
+        return replace(self, version=added.version, embeddings=embeddings, _positions={}, **columns)
+
+    def scores(
+        self,
+        query_embedding: list[float],
+        *,
+        category: str | None = None,
+        language: str | None = None,
+        symbol: str | None = None,
+    ) -> np.ndarray:
+        """Cosine similarity of every row to the query; rows failing a filter score -inf."""
+        scores = self.embeddings @ _normalize(np.asarray(query_embedding, dtype=np.float32))
+        masks = []
+        if category is not None:
+            masks.append(self.categories == category)
+        if language is not None and language.strip():
+            masks.append(self.languages == language.strip().lower())
+        if symbol is not None and symbol.strip():
+            masks.append(np.char.find(np.char.lower(self.symbols), symbol.strip().lower()) >= 0)
+        if not masks:
+            return scores
+        return np.where(np.logical_and.reduce(masks), scores, -np.inf)
+
+    @staticmethod
+    def top(scores: np.ndarray, k: int) -> np.ndarray:
+        """Row positions of the k best finite scores, best first (argpartition, then sort only those)."""
+        k = min(k, scores.shape[0])
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        idx = np.argpartition(-scores, k - 1)[:k]
+        idx = idx[np.argsort(-scores[idx], kind="stable")]
+        return idx[np.isfinite(scores[idx])]
+
+    def chunk_id(self, position: int) -> uuid.UUID:
+        return uuid.UUID(bytes=bytes(self.chunk_ids[position]))
+
+    def position(self, chunk_id: uuid.UUID) -> int | None:
+        if not self._positions and len(self):
+            self._positions.update((bytes(b), i) for i, b in enumerate(self.chunk_ids))
+        return self._positions.get(chunk_id.bytes)
+
+
+def _chunk_rows(db: Session, *conditions) -> list:
+    return db.execute(
+        select(
+            MaterialChunk.id,
+            MaterialChunk.material_id,
+            MaterialChunk.category,
+            MaterialChunk.language,
+            MaterialChunk.symbol_name,
+            MaterialChunk.embedding,
+        )
+        .where(MaterialChunk.embedding.is_not(None), *conditions)
+        .order_by(MaterialChunk.material_id, MaterialChunk.chunk_index)
+    ).all()
+
+
+class VectorIndexStore:
+    """
+    Per-course CourseIndex cache for SEARCH_BACKEND=numpy, persisted under
+    `directory` as `<course>-<version>.npy` (embeddings, memory-mapped on load)
+    and `<course>-<version>.meta.npz`. An index is valid while its version
+    equals the course's corpus_version; otherwise it is loaded from disk or
+    rebuilt from material_chunks. Ingest and delete refresh it incrementally.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.builds = 0
+        self.loads = 0
+        self.refreshes = 0
+        self._indexes: dict[uuid.UUID, CourseIndex] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, course_id: uuid.UUID, version: int) -> str:
+        return os.path.join(self.directory, f"{course_id}-{version}")
+
+    def get(self, db: Session, course_id: uuid.UUID) -> CourseIndex:
+        version = corpus_version(db, course_id)
+        index = self._cached(course_id, version)
+        if index is None:
+            index = self._build(db, course_id, version)
+        return index
+
+    def _cached(self, course_id: uuid.UUID, version: int) -> CourseIndex | None:
+        """The index at `version` from memory or disk, if there is one."""
+        with self._lock:
+            index = self._indexes.get(course_id)
+        if index is not None and index.version == version:
+            return index
+        index = self._load(course_id, version)
+        if index is not None:
+            with self._lock:
+                self._indexes[course_id] = index
+        return index
+
+    def _load(self, course_id: uuid.UUID, version: int) -> CourseIndex | None:
+        base = self._path(course_id, version)
+        # The .npy is written last, so its presence means both files are complete.
+        if not os.path.exists(base + ".npy"):
+            return None
+        try:
+            embeddings = np.load(base + ".npy", mmap_mode="r")
+            with np.load(base + ".meta.npz") as meta:
+                columns = {name: meta[name] for name in meta.files}
+        except (OSError, ValueError):
+            logger.exception("Unreadable vector index %s; rebuilding", base)
+            return None
+        if embeddings.ndim != 2 or embeddings.shape[1] != settings.embedding_dim:
+            return None
+        self.loads += 1
+        return CourseIndex(course_id=course_id, version=version, embeddings=embeddings, **columns)
+
+    def _build(self, db: Session, course_id: uuid.UUID, version: int) -> CourseIndex:
+        index = CourseIndex.from_rows(course_id, version, _chunk_rows(db, MaterialChunk.course_id == course_id))
+        self.builds += 1
+        logger.info("Built vector index for course %s (%d chunks, version %d)", course_id, len(index), version)
+        self._store(index)
+        return index
+
+    def refresh_material(
+        self,
+        db: Session,
+        course_id: uuid.UUID,
+        material_id: uuid.UUID,
+        bumps: list[tuple[int, int]],
+    ) -> None:
+        """
+        Applies a committed re-ingest or deletion of one material: its rows are
+        replaced by its current chunks (none after a delete). `bumps` are the
+        (previous, new) versions its transactions' bump_corpus_version calls
+        returned. An index at the first previous version is patched only when
+        no other writer committed in between: the bumps follow each other and
+        the course is still at the last one both before and after its rows are
+        read (every chunk change bumps the version in the same transaction).
+        Otherwise the in-memory index is dropped and the next search rebuilds it.
+        """
+        if not bumps:
+            return
+        previous, version = bumps[0][0], bumps[-1][1]
+        chained = all(a[1] == b[0] for a, b in zip(bumps, bumps[1:]))
+        base = self._cached(course_id, previous) if chained else None
+        rows = None
+        if base is not None and corpus_version(db, course_id) == version:
+            rows = _chunk_rows(db, MaterialChunk.material_id == material_id)
+            if corpus_version(db, course_id) != version:
+                rows = None
+        if rows is None:
+            self._forget(course_id, version)
+            return
+        added = CourseIndex.from_rows(course_id, version, rows)
+        self.refreshes += 1
+        self._store(base.replace_material(material_id, added))
+
+    def _forget(self, course_id: uuid.UUID, version: int) -> None:
+        with self._lock:
+            current = self._indexes.get(course_id)
+            if current is not None and current.version <= version:
+                del self._indexes[course_id]
+
+    def _store(self, index: CourseIndex) -> None:
+        with self._lock:
+            current = self._indexes.get(index.course_id)
+            if current is None or current.version <= index.version:
+                self._indexes[index.course_id] = index
+        try:
+            self._save(index)
+        except OSError:
+            logger.exception("Failed to persist vector index for course %s", index.course_id)
+
+    def _save(self, index: CourseIndex) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        base = self._path(index.course_id, index.version)
+        with open(base + ".meta.npz.tmp", "wb") as f:
+            np.savez(f, **index._columns())
+        os.replace(base + ".meta.npz.tmp", base + ".meta.npz")
+        with open(base + ".npy.tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(index.embeddings, dtype=np.float32))
+        os.replace(base + ".npy.tmp", base + ".npy")
+        for path in glob.glob(os.path.join(self.directory, f"{index.course_id}-*")):
+            if not path.startswith(base + "."):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # still memory-mapped elsewhere (Windows); removed on a later save
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            indexes = list(self._indexes.values())
+        return {
+            "courses": len(indexes),
+            "rows": sum(len(i) for i in indexes),
+            "bytes": sum(i.nbytes for i in indexes),
+            "builds": self.builds,
+            "loads": self.loads,
+            "refreshes": self.refreshes,
+        }
+
+
+_store: VectorIndexStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_vector_index() -> VectorIndexStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = VectorIndexStore(settings.vector_index_dir or os.path.join(settings.storage_dir, "vector_index"))
+    return _store
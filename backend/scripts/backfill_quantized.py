@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+# Add backend directory to Python path so we can import app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.db import SessionLocal, init_extensions, init_search_schema
+from app.services.quantization import compact_columns, fill_quantized
+
+
+def main() -> None:
+    """Fill compact embedding copies (halfvec / binary / two-stage coarse) for already-ingested chunks."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "--columns",
+        nargs="+",
+        choices=["embedding_half", "embedding_bits", "embedding_coarse"],
+        default=None,
+        help="copies to compute (default: those VECTOR_QUANTIZATION / SEARCH_TWO_STAGE use)",
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    columns = args.columns or compact_columns()
+    if not columns:
+        print("VECTOR_QUANTIZATION is 'none' and SEARCH_TWO_STAGE is off; pass --columns to backfill anyway.")
+        return
+
+    init_extensions()
+    init_search_schema()
+
+    t0 = time.perf_counter()
+    with SessionLocal() as db:
+        updated = fill_quantized(db, columns=columns, batch_size=args.batch_size)
+    print(f"Backfilled {updated} chunks ({', '.join(columns)}) in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark: full-precision vs halfvec vs binary-quantized HNSW search with exact re-rank.
+
+Loads synthetic clustered vectors into a scratch table (bench_quantization) in the
+DATABASE_URL database, builds one HNSW index per representation and reports
+recall@k against brute-force ground truth, median query latency, and on-disk
+index/column sizes. The scratch table is dropped afterwards.
+
+    python -m scripts.bench_quantization --rows 50000 --dim 768 --queries 200
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+# Add backend directory to Python path so we can import app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db import engine, init_extensions
+
+TABLE = "bench_quantization"
+
+
+def _synthetic(rows: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assign = rng.integers(0, clusters, rows)
+    data = centers[assign] + 0.35 * rng.standard_normal((rows, dim)).astype(np.float32)
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+def _vec_literal(v: np.ndarray) -> str:
+    return "[" + ",".join(f"{x:.6f}" for x in v) + "]"
+
+
+def _bits_literal(v: np.ndarray) -> str:
+    return "".join("1" if x > 0 else "0" for x in v)
+
+
+def _load(conn, data: np.ndarray, dim: int) -> None:
+    conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    conn.execute(
+        text(
+            f"CREATE TABLE {TABLE} (id int PRIMARY KEY, embedding vector({dim}), "
+            f"embedding_half halfvec({dim}), embedding_bits bit({dim}))"
+        )
+    )
+    with conn.connection.cursor() as cur:
+        with cur.copy(f"COPY {TABLE} (id, embedding) FROM STDIN") as copy:
+            for i, v in enumerate(data):
+                copy.write_row((i, _vec_literal(v)))
+    conn.execute(
+        text(
+            f"UPDATE {TABLE} SET embedding_half = embedding::halfvec({dim}), "
+            f"embedding_bits = binary_quantize(embedding)::bit({dim})"
+        )
+    )
+    conn.execute(text(f"ANALYZE {TABLE}"))
+
+
+MODES = {
+    # mode: (indexed column, opclass, coarse distance SQL)
+    "full": ("embedding", "vector_cosine_ops", "embedding <=> CAST(:q AS vector)"),
+    "halfvec": ("embedding_half", "halfvec_cosine_ops", "embedding_half <=> CAST(:q AS halfvec)"),
+    "binary": ("embedding_bits", "bit_hamming_ops", "embedding_bits <~> CAST(:bits AS bit)"),
+}
+
+
+def _run_mode(conn, mode: str, queries: np.ndarray, truth: list[set[int]], k: int, factor: int, ef: int) -> dict:
+    column, opclass, coarse = MODES[mode]
+    index = f"{TABLE}_{column}_hnsw"
+    t0 = time.perf_counter()
+    conn.execute(
+        text(
+            f"CREATE INDEX {index} ON {TABLE} USING hnsw ({column} {opclass}) "
+            f"WITH (m = {settings.hnsw_m}, ef_construction = {settings.hnsw_ef_construction})"
+        )
+    )
+    build_s = time.perf_counter() - t0
+    shortlist = k if mode == "full" else k * factor
+    conn.execute(text("SELECT set_config('hnsw.ef_search', :ef, false)"), {"ef": str(max(ef, shortlist))})
+
+    sql = text(
+        f"SELECT id FROM {TABLE} WHERE id IN "
+        f"(SELECT id FROM {TABLE} ORDER BY {coarse} LIMIT :shortlist) "
+        f"ORDER BY embedding <=> CAST(:q AS vector) LIMIT :k"
+    )
+    latencies: list[float] = []
+    recalls: list[float] = []
+    for q, expected in zip(queries, truth, strict=True):
+        params = {"q": _vec_literal(q), "bits": _bits_literal(q), "shortlist": shortlist, "k": k}
+        t0 = time.perf_counter()
+        got = set(conn.execute(sql, params).scalars())
+        latencies.append(time.perf_counter() - t0)
+        recalls.append(len(got & expected) / k)
+
+    index_bytes = conn.execute(text("SELECT pg_relation_size(CAST(:i AS regclass))"), {"i": index}).scalar()
+    column_bytes = conn.execute(text(f"SELECT sum(pg_column_size({column})) FROM {TABLE}")).scalar()
+    conn.execute(text(f"DROP INDEX {index}"))
+    return {
+        "mode": mode,
+        "recall": statistics.mean(recalls),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "index_mb": index_bytes / 2**20,
+        "column_mb": float(column_bytes or 0) / 2**20,
+        "build_s": build_s,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=settings.embedding_dim)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--rerank-factor", type=int, default=settings.quantized_rerank_factor)
+    parser.add_argument("--ef-search", type=int, default=settings.hnsw_ef_search)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    data = _synthetic(args.rows, args.dim, args.clusters, rng)
+    queries = _synthetic(args.queries, args.dim, args.clusters, rng)
+    truth = [set(np.argsort(-(data @ q))[: args.k].tolist()) for q in queries]
+
+    init_extensions()
+    results = []
+    with engine.connect() as conn:
+        try:
+            _load(conn, data, args.dim)
+            conn.commit()
+            for mode in MODES:
+                results.append(_run_mode(conn, mode, queries, truth, args.k, args.rerank_factor, args.ef_search))
+                conn.commit()
+        finally:
+            conn.rollback()
+            conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+            conn.commit()
+
+    print(f"rows={args.rows} dim={args.dim} queries={args.queries} k={args.k} rerank_factor={args.rerank_factor}")
+    print(f"{'mode':<9}{'recall@k':>10}{'p50 ms':>9}{'index MB':>10}{'column MB':>11}{'build s':>9}")
+    for r in results:
+        print(
+            f"{r['mode']:<9}{r['recall']:>10.3f}{r['p50_ms']:>9.2f}"
+            f"{r['index_mb']:>10.1f}{r['column_mb']:>11.1f}{r['build_s']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
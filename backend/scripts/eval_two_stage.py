@@ -0,0 +1,127 @@
+"""
+Recall evaluation for two-stage (Matryoshka) vector search.
+
+Reads ingested chunk embeddings from material_chunks, uses a sample of them as
+queries (each excluded from its own results), and compares exact full-dimension
+top-k against two-stage search: shortlist top_k * factor on the first D
+components, re-score the shortlist at full dimension. Reports recall@k and the
+per-query distance cost relative to an exact full-dimension scan.
+
+    python -m scripts.eval_two_stage --dims 64 128 256 512 --k 10 --factor 8
+    python -m scripts.eval_two_stage --live   # also time run_search with two_stage on/off
+
+--live needs SEARCH_TWO_STAGE=true with embedding_coarse filled and indexed
+(python -m scripts.backfill_quantized, then start the API once); the "full"
+run then scans the full-dimension vectors.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+import numpy as np
+
+# Add backend directory to Python path so we can import app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db import SessionLocal
+from app.models import MaterialChunk
+from app.services.search import run_search
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    return m / np.maximum(np.linalg.norm(m, axis=1, keepdims=True), 1e-12)
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[0])
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+def _load(course_id: uuid.UUID | None) -> tuple[list[uuid.UUID], np.ndarray]:
+    stmt = select(MaterialChunk.id, MaterialChunk.embedding).where(MaterialChunk.embedding.is_not(None))
+    if course_id is not None:
+        stmt = stmt.where(MaterialChunk.course_id == course_id)
+    with SessionLocal() as db:
+        rows = db.execute(stmt).all()
+    ids = [r.id for r in rows]
+    return ids, np.asarray([r.embedding for r in rows], dtype=np.float32)
+
+
+def evaluate(full: np.ndarray, queries: np.ndarray, dims: list[int], k: int, factor: int) -> list[dict]:
+    full_n = _normalize(full)
+    results = []
+    for dim in dims:
+        coarse_n = _normalize(full[:, :dim])
+        recalls = []
+        for qi in queries:
+            exact_scores = full_n @ full_n[qi]
+            exact_scores[qi] = -np.inf
+            truth = set(_top(exact_scores, k).tolist())
+
+            coarse_scores = coarse_n @ coarse_n[qi]
+            coarse_scores[qi] = -np.inf
+            shortlist = _top(coarse_scores, k * factor)
+            rescored = shortlist[_top(full_n[shortlist] @ full_n[qi], k)]
+            recalls.append(len(truth & set(rescored.tolist())) / k)
+        n, d = full.shape
+        cost = (n * dim + k * factor * d) / (n * d)
+        results.append({"dim": dim, "recall": statistics.mean(recalls), "cost": cost})
+    return results
+
+
+def _live(ids: list[uuid.UUID], full: np.ndarray, queries: np.ndarray, k: int) -> None:
+    if not settings.search_two_stage:
+        # embedding_coarse is only maintained while two-stage search is configured.
+        print("live timing skipped: set SEARCH_TWO_STAGE=true and run scripts.backfill_quantized first")
+        return
+    for two_stage in (False, True):
+        latencies = []
+        with SessionLocal() as db:
+            for qi in queries:
+                t0 = time.perf_counter()
+                run_search(db, query_embedding=full[qi].tolist(), top_k=k, use_hybrid=False, two_stage=two_stage)
+                latencies.append(time.perf_counter() - t0)
+                db.rollback()
+        label = "two-stage" if two_stage else "full"
+        print(f"live {label:<10} p50 {statistics.median(latencies) * 1000:.2f} ms over {len(queries)} queries")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--course-id", type=uuid.UUID, default=None)
+    parser.add_argument("--dims", type=int, nargs="+", default=[64, 128, settings.embedding_coarse_dim, 512])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--factor", type=int, default=settings.two_stage_rerank_factor)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--live", action="store_true", help="also time run_search against the database")
+    args = parser.parse_args()
+
+    ids, full = _load(args.course_id)
+    if len(ids) <= args.k:
+        print(f"Need more than {args.k} embedded chunks, found {len(ids)}.")
+        return
+    rng = np.random.default_rng(args.seed)
+    queries = rng.choice(len(ids), size=min(args.queries, len(ids)), replace=False)
+    dims = sorted({d for d in args.dims if 0 < d <= full.shape[1]})
+
+    print(f"chunks={len(ids)} dim={full.shape[1]} queries={len(queries)} k={args.k} factor={args.factor}")
+    print(f"{'coarse dim':>10}{'recall@k':>10}{'cost vs exact':>15}")
+    for r in evaluate(full, queries, dims, args.k, args.factor):
+        print(f"{r['dim']:>10}{r['recall']:>10.3f}{r['cost']:>15.2f}")
+
+    if args.live:
+        _live(ids, full, queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
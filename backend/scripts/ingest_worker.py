@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sys
+import threading
+
+# Add backend directory to Python path so we can import app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.config import settings
+from app.db import engine, init_extensions, init_search_schema
+from app.models import Base
+from app.services.ingest_jobs import get_ingest_workers
+
+
+def main() -> None:
+    """Run ingest workers outside the API process (set INGEST_WORKERS=0 on the API)."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--workers", type=int, default=max(1, settings.ingest_workers))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    init_extensions()
+    Base.metadata.create_all(bind=engine)
+    init_search_schema()
+
+    pool = get_ingest_workers()
+    pool.start(args.workers)
+    print(f"{args.workers} ingest workers running; Ctrl-C stops after the current jobs")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,25 +2,21 @@ from __future__ import annotations
 
 import os
 import sys
-import uuid
 
 # Add backend directory to Python path so we can import app
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from sqlalchemy import text
 
-from app.core.config import settings
 from app.db import SessionLocal, engine, init_extensions
 from app.models import Base, Course, Material
+from app.services.blob_store import add_blob_ref, blob_path, stage_upload, store_blob
 
 
 def main() -> None:
     init_extensions()
     Base.metadata.create_all(bind=engine)
 
-    storage_dir = settings.storage_dir
-    os.makedirs(storage_dir, exist_ok=True)
-
     sample_path = os.path.join(os.path.dirname(__file__), "..", "samples", "intro_note.md")
     sample_path = os.path.abspath(sample_path)
     if not os.path.exists(sample_path):
@@ -32,19 +28,19 @@ def main() -> None:
         db.commit()
         db.refresh(course)
 
-        # Copy sample file into storage so the download endpoint works.
-        material_id = uuid.uuid4()
-        dest_path = os.path.join(storage_dir, f"{material_id}_intro_note.md")
-        with open(sample_path, "rb") as src, open(dest_path, "wb") as dst:
-            dst.write(src.read())
+        # Store the sample file like an upload so the download endpoint works.
+        with open(sample_path, "rb") as src:
+            staged = stage_upload(src, max_bytes=0)
+        key = add_blob_ref(db, staged, "intro_note.md")
 
         mat = Material(
-            id=material_id,
             course_id=course.id,
             category="theory",
             title="Week 1: Course Overview (sample)",
             type="note",
-            storage_path=dest_path,
+            storage_path=blob_path(key),
+            blob_key=key,
+            filename="intro_note.md",
             week=1,
             topic="overview",
             tags=["demo", "week1"],
@@ -52,6 +48,7 @@ def main() -> None:
         )
         db.add(mat)
         db.commit()
+        store_blob(staged, key)
 
         # Helpful message for teammates
         print("Seeded:")
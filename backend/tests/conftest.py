@@ -0,0 +1,28 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+@pytest.fixture
+def pg_session():
+    """A session on the app schema inside a transaction that is rolled back."""
+    from app.db import create_trigram_index, engine
+    from app.models import Base
+
+    try:
+        conn = engine.connect()
+    except Exception:
+        pytest.skip("no database at DATABASE_URL")
+    trans = conn.begin()
+    try:
+        try:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        except Exception:
+            pytest.skip("pgvector / pg_trgm extensions not available")
+        Base.metadata.create_all(conn)
+        create_trigram_index(conn)
+        yield Session(bind=conn, join_transaction_mode="create_savepoint")
+    finally:
+        trans.rollback()
+        conn.close()
@@ -0,0 +1,115 @@
+import hashlib
+import io
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.models import StorageBlob
+from app.services.blob_store import (
+    UploadTooLarge,
+    add_blob_ref,
+    blob_key,
+    blob_path,
+    release_blob,
+    remove_blob,
+    stage_upload,
+    store_blob,
+)
+
+
+@pytest.fixture(autouse=True)
+def storage_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "storage_dir", str(tmp_path))
+    return tmp_path
+
+
+def _blobs(storage_dir) -> list[str]:
+    return os.listdir(storage_dir / "blobs")
+
+
+def test_stage_hashes_across_block_boundaries(storage_dir):
+    data = os.urandom(10_000)
+    for block_size in (1, 4096, 10_000, 1 << 20):
+        staged = stage_upload(io.BytesIO(data), max_bytes=0, block_size=block_size)
+        assert staged.sha256 == hashlib.sha256(data).hexdigest() and staged.size == len(data)
+        with open(staged.tmp_path, "rb") as f:
+            assert f.read() == data
+        os.remove(staged.tmp_path)
+    assert _blobs(storage_dir) == []
+
+
+def test_stage_rejects_oversized_upload_and_removes_partial_copy(storage_dir):
+    read = []
+
+    class Source(io.BytesIO):
+        def read(self, size=-1):
+            read.append(size)
+            return super().read(size)
+
+    with pytest.raises(UploadTooLarge):
+        stage_upload(Source(b"x" * 100_000), max_bytes=5000, block_size=1024)
+    assert len(read) == 5  # stops at the first block past the limit
+    assert _blobs(storage_dir) == []
+
+    staged = stage_upload(io.BytesIO(b"x" * 5000), max_bytes=5000, block_size=1024)
+    assert staged.size == 5000
+
+
+def test_blob_key_is_content_addressed_and_keeps_extension():
+    sha = hashlib.sha256(b"heap").hexdigest()
+    assert blob_key(sha, "Week 1/Heaps.PDF") == f"{sha[:2]}/{sha}.pdf"
+    assert blob_key(sha, "notes") == f"{sha[:2]}/{sha}"
+    assert blob_key(sha, "evil.p/../df") == f"{sha[:2]}/{sha}"
+    assert blob_key(sha, "a.tar.gz") == f"{sha[:2]}/{sha}.gz"
+
+
+class _RecheckDb:
+    """Answers remove_blob's recheck: whether an upload re-created the blob row meanwhile."""
+
+    def __init__(self, revived: bool):
+        self.revived = revived
+
+    def execute(self, stmt):
+        return SimpleNamespace(first=lambda: ("key",) if self.revived else None)
+
+    def commit(self):
+        pass
+
+
+@pytest.mark.parametrize("revived", [False, True])
+def test_remove_keeps_the_file_when_an_upload_revived_the_blob(storage_dir, revived):
+    staged = stage_upload(io.BytesIO(b"heap"))
+    key = blob_key(staged.sha256, "heap.txt")
+    store_blob(staged, key)
+    remove_blob(_RecheckDb(revived), key)
+    assert os.path.exists(blob_path(key)) == revived
+    assert os.listdir(os.path.dirname(blob_path(key))) == ([os.path.basename(key)] if revived else [])
+    remove_blob(_RecheckDb(False), key)  # already gone: no error
+
+
+def test_identical_uploads_share_one_blob_until_released(pg_session, storage_dir):
+    data = b"def heappush(heap, item): ...\n"
+    keys = []
+    for name in ("heap.py", "copy.py"):
+        staged = stage_upload(io.BytesIO(data))
+        keys.append(add_blob_ref(pg_session, staged, name))
+        assert not os.path.exists(blob_path(keys[-1]))  # only stored once committed
+        pg_session.commit()
+        store_blob(staged, keys[-1])
+    assert keys[0] == keys[1]
+    key = keys[0]
+    assert pg_session.get(StorageBlob, key).refcount == 2
+    with open(blob_path(key), "rb") as f:
+        assert f.read() == data
+    assert _blobs(storage_dir) == [key[:2]]
+
+    assert release_blob(pg_session, key) is None
+    assert release_blob(pg_session, key) == key
+    assert os.path.exists(blob_path(key))  # until the caller has committed
+    pg_session.commit()
+    remove_blob(pg_session, key)
+    pg_session.expire_all()
+    assert pg_session.get(StorageBlob, key) is None
+    assert not os.path.exists(blob_path(key))
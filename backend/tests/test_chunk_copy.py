@@ -0,0 +1,77 @@
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.models import MaterialChunk
+from app.services.chunk_copy import COPY_COLUMNS, build_copy_sql, copy_rows, insert_chunks
+
+COMPACT_COLUMNS = {"embedding_half", "embedding_bits", "embedding_coarse"}
+
+
+def test_copy_covers_every_written_column():
+    table = MaterialChunk.__table__
+    written = {c.name for c in table.columns if c.computed is None} - COMPACT_COLUMNS
+    assert {name for name, _ in COPY_COLUMNS} == written
+
+
+def test_copy_sql_is_binary():
+    sql = build_copy_sql()
+    assert sql.startswith("COPY material_chunks (id, material_id,")
+    assert sql.endswith("FROM STDIN (FORMAT BINARY)")
+
+
+def test_copy_rows_fill_defaults_in_column_order():
+    material_id = uuid.uuid4()
+    rows = copy_rows([{"material_id": material_id, "chunk_index": 3, "text": "heap"}, {"text": "tree"}])
+    names = [name for name, _ in COPY_COLUMNS]
+    first = dict(zip(names, rows[0], strict=True))
+    assert isinstance(first["id"], uuid.UUID) and first["id"] != rows[1][0]
+    assert first["material_id"] == material_id and first["chunk_index"] == 3 and first["text"] == "heap"
+    assert first["created_at"].tzinfo is not None
+    assert first["embedding"] is None
+
+
+def test_insert_rejects_columns_copy_would_drop():
+    with pytest.raises(ValueError, match="heading"):
+        insert_chunks(None, [{"text": "heap", "heading": "Heaps"}])
+
+
+@pytest.mark.parametrize("use_copy", [True, False])
+def test_insert_round_trips_embeddings(pg_session, monkeypatch, use_copy):
+    from app.models import Course, Material
+
+    monkeypatch.setattr(settings, "ingest_copy", use_copy)
+    course = Course(title="Algorithms")
+    pg_session.add(course)
+    pg_session.flush()
+    material = Material(course_id=course.id, title="Heaps", category="lab", type="code")
+    pg_session.add(material)
+    pg_session.flush()
+    embedding = [i / settings.embedding_dim for i in range(settings.embedding_dim)]
+    insert_chunks(
+        pg_session,
+        [
+            dict(
+                material_id=material.id,
+                course_id=course.id,
+                category="lab",
+                chunk_index=i,
+                text=f"def push_{i}(heap, item): ...",
+                content_hash=f"{i:064x}",
+                language="python",
+                symbol_name=f"push_{i}",
+                start_line=i + 1,
+                end_line=i + 1,
+                embedding=embedding,
+            )
+            for i in range(3)
+        ],
+    )
+    rows = pg_session.execute(
+        select(MaterialChunk).where(MaterialChunk.material_id == material.id).order_by(MaterialChunk.chunk_index)
+    ).scalars().all()
+    assert [r.symbol_name for r in rows] == ["push_0", "push_1", "push_2"]
+    assert list(rows[2].embedding) == pytest.approx(embedding, abs=1e-6)
+    assert rows[0].text_tsv  # generated column still computed for COPY rows
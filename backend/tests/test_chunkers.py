@@ -0,0 +1,178 @@
+import pytest
+
+from app.services.ingest import (
+    _line_to_offset,
+    _offset_to_line,
+    chunk_code_structure,
+    chunk_python_ast,
+    chunk_theory_improved,
+    estimate_tokens,
+    iter_prose_chunks,
+)
+from scripts.bench_chunkers import _best, synthetic_c, synthetic_comment_block, synthetic_python
+
+
+def test_line_offsets_count_characters_not_bytes():
+    text = "a\nbé\n\n€c"
+    starts = _line_to_offset(text)
+    assert starts == [0, 2, 5, 6]
+    assert [text[s] for s in starts] == ["a", "b", "\n", "€"]
+    assert [_offset_to_line(starts, o) for o in (0, 1, 2, 4, 5, 7)] == [0, 0, 1, 1, 2, 3]
+
+
+def test_code_chunk_line_ranges():
+    # A boundary match starts at the newline before `function`/`class`, i.e. on the blank line above it.
+    text = (
+        "import { heappush } from './heap.js';\n\n\n"
+        "function push(heap, item) {\n  heappush(heap, item);\n}\n\n\n"
+        "class MinHeap {\n  size() { return 0; }\n}\n"
+    )
+    chunks = chunk_code_structure(text, "heap.js")
+    assert [(c.symbol_name, c.start_line, c.end_line) for c in chunks] == [
+        (None, 1, 2),
+        ("push", 3, 7),
+        ("MinHeap", 8, 11),
+    ]
+
+
+PY_SOURCE = '''"""Heaps."""
+import heapq
+
+LIMIT = 10
+
+
+@dataclass
+class MinHeap:
+    """A min-heap."""
+
+    items: list
+
+    def push(self, x):
+        heapq.heappush(self.items, x)
+
+    # Removes the smallest item
+    async def pop(self):
+        return heapq.heappop(self.items)
+
+    class Node:
+        def walk(self):
+            pass
+
+
+def helper():
+    return 1
+'''
+
+
+def test_python_chunks_are_per_method_with_exact_lines():
+    chunks = chunk_code_structure(PY_SOURCE, "heap.py")
+    assert [(c.symbol_name, c.start_line, c.end_line) for c in chunks] == [
+        (None, 1, 4),
+        ("MinHeap", 7, 11),
+        ("MinHeap.push", 13, 14),
+        ("MinHeap.pop", 16, 18),
+        ("MinHeap.Node", 20, 20),
+        ("MinHeap.Node.walk", 21, 22),
+        ("helper", 25, 26),
+    ]
+    lines = PY_SOURCE.split("\n")
+    for c in chunks:
+        assert c.text == "\n".join(lines[c.start_line - 1 : c.end_line])
+    assert chunks[1].text.startswith("@dataclass\nclass MinHeap:")
+    assert chunks[3].text.startswith("    # Removes the smallest item")
+
+
+def test_python_oversized_method_is_split_at_statements():
+    body = "".join(f"        total += {i}\n" for i in range(600))
+    source = f"class Big:\n    def run(self):\n        total = 0\n{body}        return total\n"
+    chunks = chunk_python_ast(source, max_chars=2000)
+    assert chunks[0].symbol_name == "Big"
+    parts = chunks[1:]
+    assert len(parts) > 1 and {c.symbol_name for c in parts} == {"Big.run"}
+    assert all(len(c.text) <= 2000 for c in parts)
+    assert [c.start_line for c in parts[1:]] == [c.end_line + 1 for c in parts[:-1]]
+    assert parts[-1].end_line == 604
+
+
+def test_python_syntax_error_falls_back_to_patterns():
+    source = "def broken(:\n    pass\n\ndef ok():\n    return 1\n"
+    assert chunk_python_ast(source) is None
+    assert [c.symbol_name for c in chunk_code_structure(source, "broken.py")] == ["broken", "ok"]
+
+
+def test_code_chunks_cover_large_files_in_order():
+    text = synthetic_python(3000)
+    chunks = chunk_code_structure(text, "heaps.py")
+    lines = text.split("\n")
+    assert [c.start_line for c in chunks] == sorted(c.start_line for c in chunks)
+    for c in chunks[:: len(chunks) // 20]:
+        assert c.text.split("\n")[0].strip() in lines[c.start_line - 1 : c.end_line]
+
+
+@pytest.mark.parametrize("filename", ["heap.c", "heap.cpp", "Heap.java"])
+def test_long_comments_chunk_in_linear_time(filename):
+    # 8x the lines: ~8x the time when linear, ~64x if a pattern rescans past line ends.
+    small, large = synthetic_comment_block(2_000), synthetic_comment_block(16_000)
+    ratio = _best(lambda: chunk_code_structure(large, filename), 3) / _best(
+        lambda: chunk_code_structure(small, filename), 3
+    )
+    assert ratio < 24
+
+
+def test_c_return_type_may_precede_the_name_line():
+    text = "#include <heap.h>\n\nstatic int\nheap_pop (int *a)\n{\n    return a[0];\n}\n"
+    chunks = [c for c in chunk_code_structure(text, "heap.c") if c.symbol_name]
+    assert [c.symbol_name for c in chunks] == ["heap_pop"]
+    assert chunks[0].text.lstrip().startswith("static int\nheap_pop (")
+
+
+def test_keyword_captures_are_not_symbols():
+    chunks = chunk_code_structure(synthetic_c(24), "heap.c")
+    assert "sift_down_0" in {c.symbol_name for c in chunks}
+    assert "static" not in {c.symbol_name for c in chunks}
+
+
+def test_markdown_splits_on_second_and_third_level_headings():
+    text = "# Notes\nintro\n## Heaps\n" + "x" * 1300 + "\n### Sift\n" + "y" * 1300 + "\n#### Detail\nz"
+    parts = chunk_theory_improved(text, "notes.md")
+    assert [p.split("\n")[0] for p in parts] == ["# Notes", "## Heaps", "### Sift"]
+    assert parts[2].endswith("#### Detail\nz")
+
+
+def _sentences(n: int, words: int = 12) -> list[str]:
+    return [" ".join(["heap"] * words).capitalize() + f" number {i}." for i in range(n)]
+
+
+def test_estimate_tokens_counts_words_and_punctuation():
+    assert estimate_tokens("A binary heap is a complete binary tree.") == 10
+    assert estimate_tokens("") == 0
+
+
+def test_prose_chunks_are_whole_sentences_within_budget():
+    page = " ".join(_sentences(40))
+    chunks = list(iter_prose_chunks([page], max_tokens=60, overlap_tokens=0))
+    assert len(chunks) > 1
+    assert all(estimate_tokens(c.text) <= 60 for c in chunks)
+    assert all(c.text.startswith("Heap") and c.text.endswith(".") for c in chunks)
+    assert " ".join(c.text for c in chunks) == page
+
+
+def test_prose_chunks_prefer_paragraph_breaks_and_track_pages():
+    paragraphs = [" ".join(_sentences(3)), " ".join(_sentences(3)), " ".join(_sentences(3))]
+    pages = ["\n\n".join(paragraphs[:2]), paragraphs[2]]
+    chunks = list(iter_prose_chunks(pages, max_tokens=100, overlap_tokens=20))
+    # Each paragraph is 48 tokens: a chunk takes two and ends on the break, with no overlap.
+    assert [c.text for c in chunks] == ["\n\n".join(paragraphs[:2]), paragraphs[2]]
+    assert [(c.page_start, c.page_end) for c in chunks] == [(1, 1), (2, 2)]
+
+
+def test_prose_chunks_overlap_when_a_paragraph_is_split():
+    sentences = _sentences(10)
+    chunks = list(iter_prose_chunks([" ".join(sentences)], max_tokens=64, overlap_tokens=20))
+    first, second = chunks[0].text, chunks[1].text
+    assert first.endswith(sentences[3]) and second.startswith(sentences[3])
+
+
+def test_prose_chunks_split_over_budget_sentences():
+    chunks = list(iter_prose_chunks(["word " * 300 + "end."], max_tokens=100, overlap_tokens=0))
+    assert [estimate_tokens(c.text) for c in chunks] == [100, 100, 100, 2]
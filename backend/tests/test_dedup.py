@@ -0,0 +1,64 @@
+import random
+import uuid
+
+from app.services.dedup import FingerprintIndex, hamming, simhash
+
+LICENSE = (
+    "This program is free software: you can redistribute it and/or modify it under the terms of the "
+    "GNU General Public License as published by the Free Software Foundation, either version 3 of the "
+    "License, or (at your option) any later version. This program is distributed in the hope that it "
+    "will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY."
+)
+
+
+def _flip(fingerprint: int, bits: list[int]) -> int:
+    value = fingerprint & ((1 << 64) - 1)
+    for b in bits:
+        value ^= 1 << b
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def test_simhash_is_stable_and_fits_bigint():
+    # Stored fingerprints must not change between processes or releases.
+    assert simhash("A binary heap stores a complete binary tree in an array.") == 7851611348849476606
+    assert simhash("a BINARY heap stores a complete binary tree, in an array") == simhash(
+        "A binary heap stores a complete binary tree in an array."
+    )
+    assert simhash("") is None and simhash("-- ...") is None
+    assert all(-(1 << 63) <= simhash(t) < 1 << 63 for t in (LICENSE, "x", "heap sort"))
+
+
+def test_simhash_separates_edits_from_unrelated_text():
+    edited = LICENSE.replace("version 3", "version 2")
+    rng = random.Random(5)
+    words = LICENSE.split()
+    shuffled = " ".join(rng.sample(words, len(words)))
+    assert hamming(simhash(LICENSE), simhash(edited)) <= 10
+    assert hamming(simhash(LICENSE), simhash(shuffled)) > 16
+
+
+def test_index_matches_exact_then_near():
+    index = FingerprintIndex(max_distance=6)
+    exact_id, near_id = uuid.uuid4(), uuid.uuid4()
+    fp = simhash(LICENSE)
+    index.add(exact_id, "hash-a", fp)
+    index.add(near_id, "hash-b", _flip(fp, [1, 17, 40]))
+
+    assert index.match("hash-a", None, 50) == (exact_id, "exact")
+    assert index.match("hash-c", _flip(fp, [1, 17, 40, 63]), 50) == (near_id, "near")
+    assert index.match("hash-c", _flip(fp, [2]), 50) == (exact_id, "near")  # closest wins
+    # Short texts only match exactly.
+    assert index.match("hash-c", fp, 3) is None
+
+
+def test_index_finds_every_fingerprint_within_distance():
+    rng = random.Random(11)
+    for max_distance in (0, 3, 6, 9):
+        index = FingerprintIndex(max_distance=max_distance)
+        base = rng.getrandbits(64) - (1 << 63)
+        chunk_id = uuid.uuid4()
+        index.add(chunk_id, None, base)
+        for _ in range(50):
+            d = rng.randint(0, max_distance)
+            assert index.match("", _flip(base, rng.sample(range(64), d)), 50) == (chunk_id, "near")
+        assert index.match("", _flip(base, rng.sample(range(64), max_distance + 1)), 50) is None
@@ -0,0 +1,140 @@
+import pytest
+
+from app.services.embedding_cache import EmbeddingCacheStore, text_hash
+from app.services.gemini import EmbeddingBatchError, GeminiService, plan_embed_batches
+
+
+class _Embedding:
+    def __init__(self, values):
+        self.values = values
+
+
+class _Response:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+
+class _FakeModels:
+    def __init__(self, fail_on_call: int | None = None):
+        self.calls: list[list[str]] = []
+        self.fail_on_call = fail_on_call
+
+    def embed_content(self, *, model, contents, config=None):
+        self.calls.append(list(contents))
+        if self.fail_on_call is not None and len(self.calls) - 1 == self.fail_on_call:
+            raise RuntimeError("429 RESOURCE_EXHAUSTED")
+        return _Response([_Embedding([float(len(t))]) for t in contents])
+
+
+class _FakeClient:
+    def __init__(self, models):
+        self.models = models
+
+
+def test_plan_embed_batches_respects_item_and_char_limits():
+    texts = ["a" * 10] * 5 + ["b" * 50] + ["c"]
+    assert plan_embed_batches(texts, max_items=2, max_chars=1000) == [(0, 2), (2, 4), (4, 6), (6, 7)]
+    assert plan_embed_batches(texts, max_items=100, max_chars=30) == [(0, 3), (3, 5), (5, 6), (6, 7)]
+    assert plan_embed_batches([], max_items=10, max_chars=10) == []
+
+
+def test_embed_batches_and_preserves_order(monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(settings, "gemini_embed_batch_size", 3)
+    models = _FakeModels()
+    texts = ["x" * n for n in range(1, 8)]
+    out = GeminiService(client=_FakeClient(models)).embed(texts)
+    assert out == [[float(n)] for n in range(1, 8)]
+    assert [len(c) for c in models.calls] == [3, 3, 1]
+
+
+def test_embed_reports_failing_batch(monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(settings, "gemini_embed_batch_size", 2)
+    svc = GeminiService(client=_FakeClient(_FakeModels(fail_on_call=1)))
+    with pytest.raises(EmbeddingBatchError) as exc:
+        svc.embed(["a", "b", "c", "d", "e"])
+    assert (exc.value.batch_index, exc.value.start, exc.value.end) == (1, 2, 4)
+
+
+def test_executor_retries_retryable_errors(monkeypatch):
+    from app.services import embedding_executor
+
+    monkeypatch.setattr(embedding_executor.time, "sleep", lambda s: None)
+    executor = embedding_executor.EmbeddingExecutor(
+        max_workers=2,
+        requests_per_min=0,
+        tokens_per_min=0,
+        max_retries=3,
+        backoff_base_s=0.1,
+        backoff_max_s=1.0,
+    )
+
+    class _QuotaError(Exception):
+        code = 429
+
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise _QuotaError("RESOURCE_EXHAUSTED")
+        return "ok"
+
+    assert executor.call(flaky, tokens=10) == "ok"
+    assert len(attempts) == 3
+
+    progress = []
+    out = executor.map_batches(lambda i: i * 10, 5, on_done=lambda i, r: progress.append(i))
+    assert out == [0, 10, 20, 30, 40]
+    assert sorted(progress) == [0, 1, 2, 3, 4]
+
+
+class _MemoryCache(EmbeddingCacheStore):
+    def __init__(self):
+        super().__init__("test-model")
+        self.rows: dict[str, list[float]] = {}
+
+    def get_many(self, hashes):
+        found = {h: self.rows[h] for h in hashes if h in self.rows}
+        self.hits += sum(1 for h in hashes if h in found)
+        self.misses += sum(1 for h in hashes if h not in found)
+        return found
+
+    def put_many(self, items):
+        self.rows.update(items)
+
+
+def test_embed_only_sends_unique_cache_misses():
+    cache = _MemoryCache()
+    cache.rows[text_hash("cached")] = [42.0]
+    models = _FakeModels()
+    svc = GeminiService(client=_FakeClient(models), cache=cache)
+
+    out = svc.embed(["cached", "new one", "new  one ", "other"])
+    assert out == [[42.0], [7.0], [7.0], [5.0]]
+    assert models.calls == [["new one", "other"]]
+    assert text_hash("other") in cache.rows
+
+    assert svc.embed(["other", "cached"]) == [[5.0], [42.0]]
+    assert len(models.calls) == 1
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (3, 3)
+
+
+def test_embed_queries_sends_one_call_for_uncached_queries(monkeypatch):
+    from app.core.config import settings
+    from app.services.gemini import query_embedding_cache
+
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    query_embedding_cache.clear()
+    models = _FakeModels()
+    svc = GeminiService(client=_FakeClient(models))
+    assert svc.embed_query("heap") == [4.0]
+    out = svc.embed_queries(["Heap ", "trie", "graph"])
+    assert out == [[4.0], [4.0], [5.0]]
+    assert models.calls == [["heap"], ["trie", "graph"]]
+    query_embedding_cache.clear()
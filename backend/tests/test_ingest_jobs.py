@@ -0,0 +1,248 @@
+import uuid
+from collections import defaultdict, deque
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.services.dedup import FingerprintIndex, simhash
+from app.services.ingest import extract_text_from_path
+from app.services.ingest_jobs import (
+    ExistingChunk,
+    JobCancelled,
+    JobProgress,
+    JobSuperseded,
+    PlannedChunk,
+    build_claim_query,
+    build_fence_query,
+    chunk_hash,
+    claim_next_job,
+    embed_batches,
+    mark_duplicates,
+    plan_chunks,
+    retry_job,
+)
+
+
+class _Progress:
+    def __init__(self, cancel_after: int | None = None):
+        self.updates: list[dict] = []
+        self.cancel_after = cancel_after
+
+    def update(self, force=False, **values):
+        self.updates.append(values)
+        if self.cancel_after is not None and len(self.updates) > self.cancel_after:
+            raise JobCancelled()
+
+    def check(self):
+        self.update(force=True)
+
+
+class _Gemini:
+    def __init__(self):
+        self.calls: list[list[str]] = []
+
+    def embed(self, texts, on_progress=None):
+        self.calls.append(list(texts))
+        if on_progress:
+            on_progress(len(texts), len(texts))
+        return [[float(len(t))] for t in texts]
+
+
+def test_claim_query_skips_rows_locked_by_other_workers():
+    sql = str(build_claim_query().compile(dialect=postgresql.dialect()))
+    assert "WHERE ingest_jobs.status = " in sql
+    assert "ORDER BY ingest_jobs.created_at" in sql
+    assert sql.endswith("FOR UPDATE SKIP LOCKED")
+
+
+def test_fence_query_matches_only_the_claiming_attempt():
+    sql = str(build_fence_query(uuid.uuid4(), 2).compile(dialect=postgresql.dialect()))
+    assert "ingest_jobs.attempts = " in sql
+    assert "ingest_jobs.status = " in sql
+    assert sql.endswith("FOR UPDATE")
+
+
+def _planned(*texts):
+    return [PlannedChunk(i, {"text": t}) for i, t in enumerate(texts)]
+
+
+def _existing(*rows):
+    existing = defaultdict(deque)
+    for index, text in enumerate(rows):
+        existing[chunk_hash(text)].append(ExistingChunk(uuid.uuid4(), index, None, None, None, None))
+    return existing
+
+
+def test_embed_batches_reports_cumulative_progress():
+    gemini, progress = _Gemini(), _Progress()
+    out = list(embed_batches(gemini, [_planned("a", "bb"), _planned("ccc")], progress))
+    assert [e for _, e in out] == [[[1.0], [2.0]], [[3.0]]]
+    assert gemini.calls == [["a", "bb"], ["ccc"]]
+    assert [u["chunks_embedded"] for u in progress.updates if "chunks_embedded" in u] == [2, 3, 3]
+    assert progress.updates[-1]["stage"] == "write"
+
+
+def test_embed_batches_stops_when_cancelled():
+    gemini = _Gemini()
+    batches = [_planned("a"), _planned("b"), _planned("c")]
+    with pytest.raises(JobCancelled):
+        list(embed_batches(gemini, batches, _Progress(cancel_after=2)))
+    assert gemini.calls == [["a"]]
+
+
+def test_embed_batches_skips_kept_chunks():
+    gemini = _Gemini()
+    batch = _planned("a", "bb", "ccc")
+    batch[1].existing_id = uuid.uuid4()
+    out = list(embed_batches(gemini, [batch], _Progress()))
+    assert gemini.calls == [["a", "ccc"]]
+    assert out[0][1] == [[1.0], [3.0]]
+
+
+def test_plan_chunks_keeps_unchanged_rows():
+    existing = _existing("intro", "heaps", "old", "dup", "dup")
+    ids = {text: [r.id for r in existing[chunk_hash(text)]] for text in ("intro", "heaps", "dup")}
+    chunks = [{"text": t} for t in ("intro", "new", "heaps", "dup", "dup", "dup")]
+    plan = list(plan_chunks(chunks, existing))
+
+    assert [p.existing_id for p in plan] == [ids["intro"][0], None, ids["heaps"][0], *ids["dup"], None]
+    assert [p.moved for p in plan] == [False, False, True, False, False, False]
+    assert all(p.values["content_hash"] == chunk_hash(p.values["text"]) for p in plan)
+    # Unclaimed rows are the ones the write stage deletes.
+    assert [r.chunk_index for rows in existing.values() for r in rows] == [2]
+
+
+def test_plan_chunks_treats_new_line_range_as_moved():
+    existing = _existing("def f(): pass")
+    plan = list(plan_chunks([{"text": "def f(): pass", "start_line": 3, "end_line": 3}], existing))
+    assert plan[0].existing_id is not None and plan[0].moved
+
+
+def test_extract_reports_page_progress(tmp_path):
+    path = tmp_path / "notes.md"
+    path.write_text("## Heaps\nA binary heap is a complete binary tree.")
+    seen = []
+    doc = extract_text_from_path(str(path), on_progress=lambda done, total: seen.append((done, total)))
+    assert doc.text.startswith("## Heaps")
+    assert seen == [(1, 1)]
+
+
+def test_plan_chunks_treats_new_page_range_as_moved():
+    existing = _existing("Heaps are trees.")
+    plan = list(plan_chunks([{"text": "Heaps are trees.", "page_start": 2, "page_end": 2}], existing))
+    assert plan[0].existing_id is not None and plan[0].moved
+
+
+def test_duplicates_reuse_embeddings_or_are_skipped():
+    license_text = "Licensed under the Apache License, Version 2.0; you may not use this file except in compliance."
+    source_id, gone_id = uuid.uuid4(), uuid.uuid4()
+
+    def course_index():  # fresh per job: a job adds its own chunks
+        index = FingerprintIndex()
+        index.add(source_id, chunk_hash(license_text), simhash(license_text))
+        index.add(gone_id, chunk_hash("Heaps are trees."), simhash("Heaps are trees."))
+        return index
+
+    chunks = [{"text": license_text}, {"text": "Heaps are trees."}, {"text": "Sift the new key up."}]
+
+    planned = list(mark_duplicates(plan_chunks(chunks, _existing()), course_index(), "reuse"))
+    assert [(p.duplicate, p.duplicate_of) for p in planned] == [
+        ("exact", source_id),
+        ("exact", gone_id),
+        (None, None),
+    ]
+    gemini = _Gemini()
+    out = list(embed_batches(gemini, [planned], _Progress(), lambda ids: {source_id: [0.5]}))
+    # The deleted source's duplicate is embedded after all.
+    assert gemini.calls == [["Heaps are trees.", "Sift the new key up."]]
+    assert out[0][1] == [[0.5], [16.0], [20.0]]
+
+    skipped = list(mark_duplicates(plan_chunks(chunks, _existing()), course_index(), "skip"))
+    assert [p.is_new for p in skipped] == [False, False, True]
+    gemini = _Gemini()
+    out = list(embed_batches(gemini, [skipped], _Progress(), lambda ids: {}))
+    assert gemini.calls == [["Sift the new key up."]] and out[0][1] == [[20.0]]
+
+
+def test_near_duplicates_within_one_material():
+    heap = "A binary heap keeps the smallest key at the root of a complete binary tree stored in an array."
+    near = "A binary heap keeps the smallest key at the root of a complete binary tree stored in one array."
+    chunks = [{"text": heap}, {"text": "Sift the new key up."}, {"text": near}, {"text": heap}]
+
+    planned = list(mark_duplicates(plan_chunks(chunks, _existing()), FingerprintIndex(), "reuse"))
+    first_id = planned[0].values["id"]
+    assert [(p.duplicate, p.duplicate_of) for p in planned] == [
+        (None, None),
+        (None, None),
+        ("near", first_id),
+        ("exact", first_id),
+    ]
+    assert all(p.is_new for p in planned)
+
+    skipped = list(mark_duplicates(plan_chunks(chunks, _existing()), FingerprintIndex(), "skip"))
+    assert [p.is_new for p in skipped] == [True, True, False, False]
+
+    # A chunk the material keeps is a source as well, with its committed row and embedding.
+    existing = _existing(heap)
+    kept_id = existing[chunk_hash(heap)][0].id
+    planned = list(mark_duplicates(plan_chunks(chunks[:3], existing), FingerprintIndex(), "reuse"))
+    assert planned[0].existing_id == kept_id
+    assert (planned[2].duplicate, planned[2].duplicate_of) == ("near", kept_id)
+
+
+def test_one_active_job_per_material(pg_session):
+    from sqlalchemy.exc import IntegrityError
+
+    from app.models import Course, IngestJob, Material
+
+    course = Course(title="Algorithms")
+    pg_session.add(course)
+    pg_session.flush()
+    material = Material(course_id=course.id, title="Heaps", category="lab", type="code")
+    pg_session.add(material)
+    pg_session.flush()
+    failed = IngestJob(material_id=material.id, status="failed")
+    running = IngestJob(material_id=material.id, status="running")
+    pg_session.add_all([failed, running])
+    pg_session.flush()
+
+    # Retrying while another job runs hands back that job instead of starting a second one.
+    assert retry_job(pg_session, failed) is running
+    assert failed.status == "failed"
+    assert retry_job(pg_session, running) is None
+
+    with pytest.raises(IntegrityError), pg_session.begin_nested():
+        pg_session.add(IngestJob(material_id=material.id, status="queued"))
+        pg_session.flush()
+
+
+def test_requeued_job_fences_out_its_stale_runner(pg_session):
+    import datetime as dt
+
+    from app.core.config import settings
+    from app.models import Course, IngestJob, Material
+
+    course = Course(title="Algorithms")
+    pg_session.add(course)
+    pg_session.flush()
+    material = Material(course_id=course.id, title="Heaps", category="lab", type="code")
+    pg_session.add(material)
+    pg_session.flush()
+    job = IngestJob(material_id=material.id)
+    pg_session.add(job)
+    pg_session.commit()
+
+    first = claim_next_job(pg_session, "w1")
+    assert first.id == job.id and first.attempt == 1
+    # w1 stalls past INGEST_JOB_STALE_S; w2 requeues and claims the job.
+    pg_session.execute(
+        IngestJob.__table__.update()
+        .where(IngestJob.id == job.id)
+        .values(heartbeat_at=dt.datetime.now(dt.timezone.utc) - dt.timedelta(seconds=settings.ingest_job_stale_s + 1))
+    )
+    second = claim_next_job(pg_session, "w2")
+    assert second == (job.id, 2)
+
+    with pytest.raises(JobSuperseded):
+        JobProgress(first.id, first.attempt).fence(pg_session)
+    JobProgress(second.id, second.attempt).fence(pg_session)
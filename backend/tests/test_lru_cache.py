@@ -0,0 +1,38 @@
+from app.services import lru_cache
+from app.services.lru_cache import LRUTTLCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache: LRUTTLCache[int] = LRUTTLCache(max_entries=2, ttl_s=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    stats = cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"], stats["evictions"]) == (2, 3, 1, 1)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(lru_cache.time, "monotonic", lambda: now[0])
+    cache: LRUTTLCache[str] = LRUTTLCache(max_entries=10, ttl_s=5)
+    cache.put("q", "v")
+    now[0] += 4
+    assert cache.get("q") == "v"
+    now[0] += 2
+    assert cache.get("q") is None
+    assert len(cache) == 0
+
+
+def test_byte_budget_evicts_oldest_entries():
+    cache: LRUTTLCache[str] = LRUTTLCache(max_entries=100, ttl_s=60, max_bytes=10, size_of=len)
+    cache.put("a", "xxxx")
+    cache.put("b", "yyyy")
+    cache.put("c", "zzzz")
+    assert cache.get("a") is None
+    assert cache.get("b") == "yyyy" and cache.get("c") == "zzzz"
+    assert cache.stats()["bytes"] == 8
+    cache.put("huge", "w" * 11)  # larger than the whole budget: not cached
+    assert cache.get("huge") is None and len(cache) == 2
@@ -0,0 +1,49 @@
+import fitz
+import pytest
+
+from app.core.config import settings
+from app.services import ingest
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "doc.pdf"
+    doc = fitz.open()
+    for i in range(9):
+        doc.new_page().insert_text((72, 72), f"page {i} binary heap")
+    doc.save(path)
+    return str(path)
+
+
+def test_page_ranges_cover_pages_in_order():
+    assert ingest.pdf_page_ranges(10, 4) == [(0, 3), (3, 6), (6, 8), (8, 10)]
+    assert ingest.pdf_page_ranges(2, 8) == [(0, 1), (1, 2)]
+    assert ingest.pdf_page_ranges(0, 4) == []
+
+
+def test_parallel_extraction_matches_serial(pdf, monkeypatch):
+    monkeypatch.setattr(settings, "pdf_extract_min_pages", 1)
+    serial = ingest.extract_pdf_pages(pdf, workers=1)
+    seen = []
+    parallel = ingest.extract_pdf_pages(pdf, workers=2, on_progress=lambda done, total: seen.append((done, total)))
+    assert parallel == serial
+    assert [p.split()[1] for p in parallel] == [str(i) for i in range(9)]
+    assert seen[-1] == (9, 9) and seen == sorted(seen)
+
+
+def test_pool_is_sized_by_workers_argument():
+    try:
+        two, three = ingest.get_pdf_pool(2), ingest.get_pdf_pool(3)
+        assert (two._max_workers, three._max_workers) == (2, 3)
+        assert ingest.get_pdf_pool(2) is two
+    finally:
+        ingest.shutdown_pdf_pools()
+    assert ingest.get_pdf_pool(2) is not two
+    ingest.shutdown_pdf_pools()
+
+
+def test_page_offsets_point_at_page_starts(pdf):
+    doc = ingest.extract_text_from_path(pdf)
+    assert len(doc.page_offsets) == 9
+    for i, off in enumerate(doc.page_offsets):
+        assert doc.text[off:].startswith(f"page {i} ")
@@ -0,0 +1,60 @@
+import threading
+import time
+
+import pytest
+
+from app.services.ingest import PAGE_SEPARATOR, iter_simple_chunks, simple_chunk
+from app.services.pipeline import batched, prefetch
+
+
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(batched([], 3)) == []
+
+
+def test_prefetch_bounds_how_far_the_producer_runs_ahead():
+    produced = []
+
+    def source():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    it = prefetch(source(), maxsize=2)
+    assert next(it) == 0
+    time.sleep(0.3)
+    # One item handed over, two queued, one held by the blocked producer.
+    assert len(produced) <= 4
+    assert list(it) == list(range(1, 10))
+
+
+def test_prefetch_reraises_producer_errors_and_closes_on_early_exit():
+    def failing():
+        yield 1
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        list(prefetch(failing(), maxsize=1))
+
+    closed = threading.Event()
+
+    def endless():
+        try:
+            i = 0
+            while True:
+                yield i
+                i += 1
+        finally:
+            closed.set()
+
+    it = prefetch(endless(), maxsize=1)
+    next(it)
+    it.close()
+    assert closed.is_set()
+
+
+@pytest.mark.parametrize("max_chars,overlap", [(40, 10), (7, 3), (1800, 200)])
+def test_streaming_chunks_match_simple_chunk(max_chars, overlap):
+    pages = ["  \n", "Binary heaps keep the smallest key at the root.  ", "", "\n sift up / sift down " * 9, "  "]
+    expected = simple_chunk(PAGE_SEPARATOR.join(pages), max_chars=max_chars, overlap=overlap)
+    assert list(iter_simple_chunks(pages, max_chars=max_chars, overlap=overlap)) == expected
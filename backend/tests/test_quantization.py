@@ -0,0 +1,111 @@
+import random
+
+import pytest
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.models import MaterialChunk
+from app.services.quantization import compact_columns, fill_quantized, quantize_bits, quantize_material
+from app.services.search import coarse_stage
+
+
+def test_quantize_bits_sets_only_positive_components():
+    # binary_quantize() maps x > 0 to 1; zero (either sign) and negatives are 0.
+    assert quantize_bits([0.5, -0.5, 0.0, -0.0, 1e-30, -1e-30]) == "100010"
+    assert quantize_bits([]) == ""
+
+
+@pytest.mark.parametrize(
+    ("quantization", "two_stage", "expected"),
+    [
+        ("none", False, []),
+        ("halfvec", False, ["embedding_half"]),
+        ("binary", False, ["embedding_bits"]),
+        ("none", True, ["embedding_coarse"]),
+        ("binary", True, ["embedding_coarse"]),
+    ],
+)
+def test_compact_columns_follow_settings(monkeypatch, quantization, two_stage, expected):
+    monkeypatch.setattr(settings, "vector_quantization", quantization)
+    monkeypatch.setattr(settings, "search_two_stage", two_stage)
+    assert compact_columns() == expected
+    compact_columns().append("embedding")  # callers get a copy
+    assert compact_columns() == expected
+
+
+@pytest.mark.parametrize("quantization", ["none", "halfvec", "binary"])
+@pytest.mark.parametrize("two_stage_setting", [False, True])
+@pytest.mark.parametrize("two_stage", [False, True])
+def test_coarse_stage_only_uses_maintained_columns(monkeypatch, quantization, two_stage_setting, two_stage):
+    monkeypatch.setattr(settings, "vector_quantization", quantization)
+    monkeypatch.setattr(settings, "search_two_stage", two_stage_setting)
+    stage = coarse_stage(two_stage)
+    column = {"coarse": "embedding_coarse", "halfvec": "embedding_half", "binary": "embedding_bits"}
+    assert stage is None or column[stage[0]] in compact_columns()
+    if two_stage and two_stage_setting:
+        assert stage[0] == "coarse"
+
+
+def test_fill_without_columns_does_nothing():
+    assert fill_quantized(None, columns=[]) == 0
+
+
+def test_quantize_material_without_columns_does_nothing(monkeypatch):
+    monkeypatch.setattr(settings, "vector_quantization", "none")
+    monkeypatch.setattr(settings, "search_two_stage", False)
+    assert quantize_material(None, None) == 0
+
+
+def test_fill_bits_match_binary_quantize(pg_session):
+    from app.models import Course, Material
+
+    course = Course(title="Algorithms")
+    pg_session.add(course)
+    pg_session.flush()
+    material = Material(course_id=course.id, title="Heaps", category="lab", type="code")
+    pg_session.add(material)
+    pg_session.flush()
+    rng = random.Random(3)
+    embedding = [rng.uniform(-1, 1) for _ in range(settings.embedding_dim)]
+    embedding[:2] = [0.0, -0.0]
+    pg_session.add(
+        MaterialChunk(material_id=material.id, course_id=course.id, category="lab", text="heap", embedding=embedding)
+    )
+    pg_session.flush()
+
+    assert fill_quantized(pg_session, columns=["embedding_bits"], material_id=material.id) == 1
+    bits = pg_session.execute(
+        select(func.cast(MaterialChunk.embedding_bits, MaterialChunk.text.type)).where(
+            MaterialChunk.material_id == material.id
+        )
+    ).scalar_one()
+    assert bits == quantize_bits(embedding)
+    assert fill_quantized(pg_session, columns=["embedding_bits"], material_id=material.id) == 0
+
+
+def test_quantize_material_fills_in_callers_transaction(pg_session, monkeypatch):
+    from app.models import Course, Material
+
+    monkeypatch.setattr(settings, "vector_quantization", "binary")
+    monkeypatch.setattr(settings, "search_two_stage", False)
+    course = Course(title="Algorithms")
+    pg_session.add(course)
+    pg_session.flush()
+    material = Material(course_id=course.id, title="Heaps", category="lab", type="code")
+    pg_session.add(material)
+    pg_session.flush()
+    embedding = [0.5] * settings.embedding_dim
+    pg_session.add(
+        MaterialChunk(material_id=material.id, course_id=course.id, category="lab", text="heap", embedding=embedding)
+    )
+    pg_session.flush()
+
+    savepoint = pg_session.begin_nested()
+    assert quantize_material(pg_session, material.id) == 1
+    assert pg_session.execute(
+        select(MaterialChunk.embedding_bits.is_not(None)).where(MaterialChunk.material_id == material.id)
+    ).scalar_one()
+    savepoint.rollback()  # nothing was committed on its own
+    assert pg_session.execute(
+        select(MaterialChunk.embedding_bits.is_(None)).where(MaterialChunk.material_id == material.id)
+    ).scalar_one()
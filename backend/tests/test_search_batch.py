@@ -0,0 +1,31 @@
+import uuid
+
+from sqlalchemy.dialects import postgresql
+
+from app.services.search import BatchQuery, build_batch_search_query
+
+
+def _sql(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+def test_batch_query_is_one_statement_with_lateral_per_mode():
+    queries = [
+        BatchQuery([0.1] * 4, "binary heap", course_id=uuid.uuid4(), top_k=3),
+        BatchQuery([0.2] * 4, "", category="lab", language=" Python", use_hybrid=False),
+    ]
+    sql = _sql(build_batch_search_query(queries))
+    assert sql.count("LEFT OUTER JOIN LATERAL") == 2
+    assert "UNION ALL" in sql
+    assert "FROM (VALUES" in sql and sql.count("FROM (VALUES") == 1
+    assert "CAST(v.course_id AS UUID)" in sql
+    assert "LIMIT q.top_k" in sql
+
+
+def test_batch_query_binds_normalized_filters():
+    queries = [BatchQuery([0.1] * 4, "  trees ", language=" Python", symbol=" Node ")]
+    params = build_batch_search_query(queries).compile(dialect=postgresql.dialect()).params
+    values = set(map(repr, params.values()))
+    assert repr("python") in values
+    assert repr("Node") in values
+    assert repr("trees") in values
@@ -0,0 +1,32 @@
+import uuid
+
+from app.schemas import SearchRequest
+from app.services.search_cache import bump_corpus_version, corpus_version, search_cache_key
+
+
+def test_key_normalizes_query_and_filters():
+    course = uuid.uuid4()
+    a = SearchRequest(query="  Binary   Search ", course_id=course, language="Python")
+    b = SearchRequest(query="binary search", course_id=course, language="python ")
+    assert search_cache_key(a, 3) == search_cache_key(b, 3)
+
+
+def test_key_changes_with_corpus_version_and_options():
+    req = SearchRequest(query="heaps", top_k=5)
+    assert search_cache_key(req, 1) != search_cache_key(req, 2)
+    assert search_cache_key(req, 1) != search_cache_key(SearchRequest(query="heaps", top_k=6), 1)
+    assert search_cache_key(req, 1) != search_cache_key(SearchRequest(query="heaps", top_k=5, category="lab"), 1)
+
+
+def test_global_version_moves_with_every_committed_bump(pg_session):
+    from app.models import Course
+
+    courses = [Course(title="Algorithms"), Course(title="Compilers")]
+    pg_session.add_all(courses)
+    pg_session.flush()
+    seen = [corpus_version(pg_session, None)]
+    for course in (courses[1], courses[0], courses[1]):
+        bump_corpus_version(pg_session, course.id)
+        seen.append(corpus_version(pg_session, None))
+    assert seen == sorted(set(seen))
+    assert corpus_version(pg_session, courses[0].id) < corpus_version(pg_session, courses[1].id)
@@ -0,0 +1,134 @@
+import uuid
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app.core.config import settings
+from app.services.search import build_details_query, build_fts_candidates, build_search_query, build_symbol_lookup
+
+QUERY = [0.01] * settings.embedding_dim
+
+
+def _sql(stmt) -> str:
+    try:
+        return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    except Exception:
+        # REGCONFIG (the tsquery config argument) has no literal renderer; keep those binds.
+        return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+class _Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, stmt):
+        self.stmt = stmt
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN " + compiler.process(element.stmt, **kw)
+
+
+def test_ranking_subquery_does_not_join_materials():
+    sql = _sql(
+        build_search_query(
+            query_embedding=QUERY,
+            query_text="",
+            course_id=uuid.uuid4(),
+            category="lab",
+            top_k=5,
+            use_hybrid=False,
+        )
+    )
+    ranked, outer = sql.split("FROM (", 1)[1].split(") AS ranked", 1)
+    assert "materials" not in ranked
+    assert "material_chunks.course_id = " in ranked
+    assert "material_chunks.category = 'lab'" in ranked
+    assert "JOIN materials" in outer
+
+
+def test_excerpt_is_cut_in_sql_after_ranking():
+    stmt = build_search_query(
+        query_embedding=QUERY, query_text="binary heap", course_id=None, category=None, top_k=5, excerpt_chars=200
+    )
+    sql = _sql(stmt)
+    assert "ts_headline" not in sql.split("FROM (", 1)[1]
+    assert "left(ts_headline(CAST(CASE WHEN (ranked.language IS NULL)" in sql
+    assert 201 in stmt.compile(dialect=postgresql.dialect()).params.values()
+
+
+def test_vector_only_excerpt_is_a_prefix_and_none_keeps_full_text():
+    kwargs = dict(query_embedding=QUERY, query_text="", course_id=None, category=None, top_k=5, use_hybrid=False)
+    sql = _sql(build_search_query(**kwargs, excerpt_chars=200))
+    assert "left(btrim(ranked.text), 201) AS text" in sql and "ts_headline" not in sql
+    assert "ranked.text AS text" in _sql(build_search_query(**kwargs))
+
+
+def test_fused_rows_carry_only_the_excerpt():
+    # rrf / normalized fusion and the numpy backend fetch their top-k rows here.
+    stmt = build_details_query([uuid.uuid4()], excerpt_chars=200, headline_query="binary heap")
+    assert "text" not in stmt.selected_columns.keys() and "excerpt" in stmt.selected_columns.keys()
+    assert "material_chunks.text AS" not in _sql(stmt)
+
+
+def test_symbol_lookup_matches_underscores_literally():
+    sql = _sql(build_symbol_lookup(symbol="heap_push", mode="prefix", language="Python"))
+    assert "LIKE 'heap\\_push%" in sql
+    assert "material_chunks.language = 'python'" in sql
+    assert "vector" not in sql and "<=>" not in sql
+
+
+def test_symbol_contains_ranks_without_pg_trgm():
+    assert "similarity(" in _sql(build_symbol_lookup(symbol="heap", mode="contains"))
+    sql = _sql(build_symbol_lookup(symbol="heap", mode="contains", trigram=False))
+    assert "ILIKE '%%heap%%'" in sql and "similarity(" not in sql
+
+
+@pytest.fixture
+def pg(pg_session):
+    """pg_session's connection, set up to show which indexes can serve each query on the empty tables."""
+    conn = pg_session.connection()
+    conn.execute(text("SET LOCAL enable_seqscan = off"))
+    return conn
+
+
+def _plan(conn, stmt) -> str:
+    return "\n".join(conn.execute(_Explain(stmt)).scalars())
+
+
+def test_category_filter_uses_partial_hnsw_index(pg):
+    if settings.vector_quantization != "none" or settings.search_two_stage or not settings.hnsw_partial_by_category:
+        pytest.skip("needs the full-precision per-category HNSW indexes")
+    stmt = build_search_query(
+        query_embedding=QUERY, query_text="", course_id=None, category="lab", top_k=5, use_hybrid=False
+    )
+    plan = _plan(pg, stmt)
+    assert "ix_material_chunks_embedding_lab_hnsw" in plan
+
+
+def test_hybrid_course_filter_uses_composite_index(pg):
+    stmt = build_search_query(
+        query_embedding=QUERY, query_text="heap", course_id=uuid.uuid4(), category="theory", top_k=5
+    )
+    plan = _plan(pg, stmt)
+    assert "ix_material_chunks_course_category" in plan
+    assert "Seq Scan on material_chunks" not in plan
+
+
+def test_fts_candidates_use_gin_index(pg):
+    plan = _plan(pg, build_fts_candidates(query_text="binary heap", limit=20, course_id=uuid.uuid4()))
+    assert "ix_material_chunks_text_tsv" in plan
+    assert "materials" not in plan.replace("material_chunks", "")
+
+
+def test_exact_symbol_lookup_uses_pattern_index(pg):
+    plan = _plan(pg, build_symbol_lookup(symbol="BinaryHeap", mode="exact", language="python"))
+    assert "ix_material_chunks_symbol_name_language" in plan
+
+
+def test_symbol_substring_filter_uses_trigram_index(pg):
+    plan = _plan(pg, build_symbol_lookup(symbol="heap", mode="contains"))
+    assert "ix_material_chunks_symbol_name_trgm" in plan
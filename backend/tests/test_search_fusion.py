@@ -0,0 +1,19 @@
+import uuid
+
+from app.services.search import normalized_score_fusion, reciprocal_rank_fusion
+
+A, B, C = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+
+def test_rrf_rewards_documents_ranked_in_both_lists():
+    scores = reciprocal_rank_fusion([[A, B], [C, B]], k=60)
+    assert scores[B] == 1 / 62 + 1 / 62
+    assert max(scores, key=scores.get) == B
+    assert scores[A] == scores[C] == 1 / 61
+
+
+def test_normalized_fusion_scales_fts_rank_by_best_candidate():
+    scores = normalized_score_fusion({A: 0.8, B: 0.6}, {B: 0.2, C: 0.1})
+    assert scores[A] == 0.7 * 0.8
+    assert scores[B] == 0.7 * 0.6 + 0.3 * 1.0
+    assert C not in scores  # only candidates with known vector scores are ranked
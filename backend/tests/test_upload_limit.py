@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.core.upload_limit import FORM_OVERHEAD_BYTES, upload_body_limit
+from app.main import create_app
+
+BOUNDARY = "limit-test"
+
+
+def _call(app, headers, receive):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/materials/upload",
+        "raw_path": b"/materials/upload",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()), *headers],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+    asyncio.run(app(scope, receive, send))
+    return next(m["status"] for m in messages if m["type"] == "http.response.start")
+
+
+@pytest.fixture
+def small_limit(monkeypatch):
+    monkeypatch.setattr(settings, "max_upload_bytes", 256 * 1024)
+
+
+def test_limit_follows_max_upload_bytes(monkeypatch):
+    monkeypatch.setattr(settings, "max_upload_bytes", 0)
+    assert upload_body_limit() == 0
+    monkeypatch.setattr(settings, "max_upload_bytes", 10)
+    assert upload_body_limit() == 10 + FORM_OVERHEAD_BYTES
+
+
+def test_oversized_content_length_is_refused_unread(small_limit):
+    reads = []
+
+    async def receive():
+        reads.append(1)
+        return {"type": "http.request", "body": b"x" * 1024, "more_body": True}
+
+    length = str(upload_body_limit() + 1).encode()
+    assert _call(create_app(), [(b"content-length", length)], receive) == 413
+    assert reads == []
+
+
+def test_oversized_streamed_body_is_cut_off(small_limit):
+    block = 64 * 1024
+    head = (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="big.pdf"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode()
+    reads = []
+
+    async def receive():  # a chunked 100 MiB upload, no Content-Length
+        reads.append(1)
+        body = head if len(reads) == 1 else b"x" * block
+        return {"type": "http.request", "body": body, "more_body": len(reads) < 1600}
+
+    assert _call(create_app(), [], receive) == 413
+    assert len(reads) <= upload_body_limit() // block + 2
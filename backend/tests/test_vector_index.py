@@ -0,0 +1,104 @@
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.vector_index import CourseIndex, VectorIndexStore
+
+
+@pytest.fixture(autouse=True)
+def _small_dim(monkeypatch):
+    monkeypatch.setattr(settings, "embedding_dim", 4)
+
+
+def _row(material_id, embedding, category="theory", language=None, symbol=None):
+    return SimpleNamespace(
+        id=uuid.uuid4(),
+        material_id=material_id,
+        category=category,
+        language=language,
+        symbol_name=symbol,
+        embedding=np.asarray(embedding, dtype=np.float32),
+    )
+
+
+def _index(version=1):
+    course, m1, m2 = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    rows = [
+        _row(m1, [1, 0, 0, 0]),
+        _row(m1, [3, 1, 0, 0]),
+        _row(m2, [0, 1, 0, 0], category="lab", language="python", symbol="BinaryHeap.push"),
+        _row(m2, [0, 0, 2, 0], category="lab", language="c", symbol="heap_pop"),
+    ]
+    return CourseIndex.from_rows(course, version, rows), rows, m1, m2
+
+
+def test_top_k_matches_full_sort_and_filters():
+    index, rows, _, _ = _index()
+    scores = index.scores([1, 0.2, 0, 0])
+    assert [index.chunk_id(i) for i in CourseIndex.top(scores, 2)] == [rows[1].id, rows[0].id]
+    assert np.isclose(scores[0], 1 / np.sqrt(1.04))
+
+    lab = index.scores([1, 0.2, 0, 0], category="lab")
+    assert [index.chunk_id(i) for i in CourseIndex.top(lab, 10)] == [rows[2].id, rows[3].id]
+    sym = index.scores([0, 0, 1, 0], symbol="HEAP", language="Python")
+    assert [index.chunk_id(i) for i in CourseIndex.top(sym, 10)] == [rows[2].id]
+
+
+def test_replace_material_drops_and_appends_rows():
+    index, rows, m1, _ = _index()
+    added = CourseIndex.from_rows(index.course_id, 2, [_row(m1, [0, 0, 0, 1])])
+    patched = index.replace_material(m1, added)
+    assert patched.version == 2
+    assert len(patched) == 3
+    assert patched.position(rows[0].id) is None
+    assert patched.chunk_id(CourseIndex.top(patched.scores([0, 0, 0, 1]), 1)[0]) == added.chunk_id(0)
+
+
+def test_store_persists_memory_mapped_index(tmp_path):
+    index, rows, _, _ = _index(version=7)
+    VectorIndexStore(str(tmp_path))._store(index)
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        f"{index.course_id}-7.meta.npz",
+        f"{index.course_id}-7.npy",
+    ]
+
+    loaded = VectorIndexStore(str(tmp_path))._cached(index.course_id, 7)
+    assert isinstance(loaded.embeddings, np.memmap)
+    assert loaded.position(rows[3].id) == 3
+    assert list(loaded.symbols) == ["", "", "BinaryHeap.push", "heap_pop"]
+    assert VectorIndexStore(str(tmp_path))._cached(index.course_id, 8) is None
+
+
+def _refresh(tmp_path, monkeypatch, bumps, versions):
+    """refresh_material on an index stored at version 1 while the course reads `versions` in turn."""
+    import app.services.vector_index as vector_index
+
+    index, _, m1, _ = _index(version=1)
+    store = VectorIndexStore(str(tmp_path))
+    store._store(index)
+    reads = iter(versions)
+    monkeypatch.setattr(vector_index, "corpus_version", lambda db, course_id: next(reads))
+    monkeypatch.setattr(vector_index, "_chunk_rows", lambda db, *conditions: [_row(m1, [0, 0, 0, 1])])
+    store.refresh_material(None, index.course_id, m1, bumps)
+    return store._indexes.get(index.course_id)
+
+
+def test_refresh_patches_only_its_own_consecutive_bumps(tmp_path, monkeypatch):
+    patched = _refresh(tmp_path, monkeypatch, [(1, 5), (5, 6)], [6, 6])
+    assert patched.version == 6 and len(patched) == 3
+
+
+@pytest.mark.parametrize(
+    ("bumps", "versions"),
+    [
+        ([(1, 5)], [9]),  # another job committed after this one
+        ([(1, 5)], [5, 9]),  # ... while its rows were read
+        ([(1, 5), (6, 7)], [7, 7]),  # ... between its two transactions
+        ([(3, 5)], [5, 5]),  # ... before it (the base at 1 misses that change)
+    ],
+)
+def test_refresh_drops_index_when_another_writer_interleaved(tmp_path, monkeypatch, bumps, versions):
+    assert _refresh(tmp_path, monkeypatch, bumps, versions) is None
@@ -248,15 +248,54 @@ export async function deleteMaterial(id: string, token?: string): Promise<void>
   await apiFetch(`/materials/${id}`, { method: "DELETE" }, token);
 }
 
+export type IngestJob = {
+  id: string;
+  material_id: string;
+  status: "queued" | "running" | "succeeded" | "failed" | "cancelled";
+  stage: "extract" | "embed" | "write";
+  pages_total: number;
+  pages_extracted: number;
+  chunks_total: number;
+  chunks_embedded: number;
+  rows_written: number;
+  chunks_kept: number;
+  chunks_added: number;
+  chunks_removed: number;
+  duplicates_exact: number;
+  duplicates_near: number;
+  duplicates_skipped: number;
+  attempts: number;
+  error?: string | null;
+  cancel_requested: boolean;
+  created_at: string;
+  started_at?: string | null;
+  finished_at?: string | null;
+};
+
+export async function getIngestJob(id: string, token?: string): Promise<IngestJob> {
+  return apiFetch<IngestJob>(`/ingest/jobs/${id}`, undefined, token);
+}
+
+/** Queues an ingest and polls its job until it finishes; `onProgress` sees each poll. */
 export async function ingestMaterial(
   materialId: string,
   token?: string,
+  onProgress?: (job: IngestJob) => void,
 ): Promise<{ chunks_added: number }> {
-  return apiFetch<{ chunks_added: number }>(
+  let job = await apiFetch<IngestJob>(
     `/materials/${materialId}/ingest`,
     { method: "POST" },
     token,
   );
+  while (job.status === "queued" || job.status === "running") {
+    onProgress?.(job);
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+    job = await getIngestJob(job.id, token);
+  }
+  if (job.status !== "succeeded") {
+    throw new Error(job.error || `Ingest ${job.status}`);
+  }
+  return { chunks_added: job.chunks_added };
 }
 
 /** Returns URL to fetch file with auth. Call fetch(url, { headers: { Authorization: `Bearer ${token}` } }) then blob. */